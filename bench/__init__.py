@@ -0,0 +1,6 @@
+"""
+Benchmark offline untuk Bangsa Bacol Bot.
+
+Handler asli di main.py dijalankan lewat client Telegram palsu (tanpa jaringan)
+dengan latensi RPC yang bisa diatur. Lihat bench/run.py untuk cara pakai.
+"""
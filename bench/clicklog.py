@@ -0,0 +1,91 @@
+"""
+Bandingkan click log JSONL vs biner: ukuran file dan waktu scan dashboard.
+
+Log sintetis ditulis sebagai clicks.jsonl, dikonversi ke clicks.bin (convert_clicks_jsonl),
+lalu summarize_clicks dijalankan di kedua format. Kalau NumPy terpasang, scan kolomnar
+lewat BinaryClickLog.to_numpy ikut diukur.
+
+Contoh:
+    python -m bench.clicklog --clicks 500000 --codes 5000 --users 50000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from bench.run import load_bot, print_table
+
+
+def _timed(fn, repeat: int) -> tuple[float, object]:
+    best, out = float("inf"), None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, out
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Ukuran & waktu scan click log JSONL vs biner.")
+    ap.add_argument("--clicks", type=int, default=200_000)
+    ap.add_argument("--codes", type=int, default=2000)
+    ap.add_argument("--users", type=int, default=20_000)
+    ap.add_argument("--periods", default="1,7", help="periode dashboard (hari)")
+    ap.add_argument("--repeat", type=int, default=3, help="ambil waktu terbaik dari N kali")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workdir", help="folder data sementara (default: tempdir baru)")
+    return ap.parse_args(argv)
+
+
+def main(argv=None):
+    from bench import datagen
+
+    args = parse_args(argv)
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="bacolclicks-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    bot = load_bot(workdir)
+    rng = random.Random(args.seed)
+    periods = tuple(int(p) for p in args.periods.split(",") if p.strip())
+
+    codes = sorted(datagen.make_stream_map(args.codes))
+    datagen.write_click_log(bot, args.clicks, codes, datagen.user_ids(args.users), bot.RETENTION_DAYS, rng)
+    t_convert, _ = _timed(bot.convert_clicks_jsonl, 1)
+
+    results = []
+    for fmt, path in (("jsonl", bot.CLICKS_JSONL), ("binary", bot.CLICKS_BIN)):
+        bot.CLICK_LOG_FORMAT = fmt
+        scan, _ = _timed(lambda: bot.summarize_clicks(periods), args.repeat)
+        size = path.stat().st_size + (bot.CLICKS_CODES.stat().st_size if fmt == "binary" else 0)
+        results.append({"format": fmt, "size_mb": round(size / 1e6, 2), "scan_ms": round(scan * 1000, 1)})
+
+    arr = bot.click_log_bin.to_numpy()
+    if arr is not None:
+        import numpy as np
+        cutoff = time.time() - max(periods) * 86400
+
+        def numpy_scan():
+            window = arr[int(np.searchsorted(arr["ts"], cutoff)):]
+            return np.bincount(window["code"]), np.unique(window["user_id"]).size
+
+        scan, _ = _timed(numpy_scan, args.repeat)
+        results.append({"format": "binary+numpy", "size_mb": results[-1]["size_mb"], "scan_ms": round(scan * 1000, 1)})
+
+    # periode yang mencakup seluruh log → perbandingan tidak terganggu cutoff yang bergeser antar scan
+    whole = bot.RETENTION_DAYS + 1
+    checks = []
+    for fmt in ("jsonl", "binary"):
+        bot.CLICK_LOG_FORMAT = fmt
+        checks.append(bot.summarize_clicks((whole,))[whole])
+    same = all(checks[0][k] == checks[1][k] for k in ("total_clicks", "unique_users", "by_code", "by_day"))
+    print(f"{args.clicks} klik, konversi {t_convert:.2f}s, hasil kedua format {'sama' if same else 'BERBEDA'}\n")
+    base = results[0]
+    for r in results:
+        r["size_x"] = round(base["size_mb"] / r["size_mb"], 1) if r["size_mb"] else "-"
+        r["scan_x"] = round(base["scan_ms"] / r["scan_ms"], 1) if r["scan_ms"] else "-"
+    print_table(results, ["format", "size_mb", "size_x", "scan_ms", "scan_x"])
+
+
+if __name__ == "__main__":
+    main()
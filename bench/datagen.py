@@ -0,0 +1,83 @@
+"""
+Generator data sintetis untuk benchmark: STREAM_MAP, user + XP, click log, badwords.
+
+Semua file ditulis ke working directory saat ini (runner sudah chdir ke folder
+sementara), jadi data produksi tidak tersentuh.
+"""
+import json
+import string
+from datetime import datetime, timedelta
+
+USER_ID_BASE = 10_000_000
+
+
+def user_ids(count: int) -> list[int]:
+    return [USER_ID_BASE + i for i in range(count)]
+
+
+def make_stream_map(count: int) -> dict:
+    return {
+        f"koleksi{i:05d}": {"link": f"https://koleksi{i:05d}.netlify.app/", "thumbnail": f"koleksi{i:05d}.jpg"}
+        for i in range(count)
+    }
+
+
+def _badge(main, xp: int) -> str:
+    if xp >= 150:
+        return main.BADGE_STARLORD
+    if xp >= 80:
+        return main.BADGE_STELLAR
+    if xp >= 20:
+        return main.BADGE_SHIMMER
+    return main.BADGE_STRANGER
+
+
+def make_user_data(main, uids: list[int], rng) -> dict:
+    data = {}
+    for uid in uids:
+        xp = int(rng.paretovariate(1.2) * 10) - 10   # kebanyakan XP kecil, sedikit yang tinggi
+        data[str(uid)] = {
+            "username": f"user{uid}", "xp": xp, "badge": _badge(main, xp),
+            "last_seen": None, "last_xp_dates": {},
+        }
+    return data
+
+
+def write_click_log(main, count: int, codes: list[str], uids: list[int], days: int, rng):
+    now = datetime.now(main.JAKARTA_TZ)
+    span = days * 86400
+    with open(main.CLICKS_JSONL, "w", encoding="utf-8") as f:
+        for _ in range(count):
+            code = rng.choice(codes)
+            uid = rng.choice(uids)
+            ts = now - timedelta(seconds=rng.uniform(0, span))
+            f.write(json.dumps({
+                "ts": ts.isoformat(), "user_id": uid, "username": f"user{uid}",
+                "code": code, "link": f"https://{code}.netlify.app/",
+            }) + "\n")
+
+
+def make_badwords(count: int, rng) -> set[str]:
+    words = {"tolol", "goblok", "anjing"}
+    while len(words) < count:
+        words.add("".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9))))
+    return words
+
+
+def install(main, *, codes: int, users: int, clicks: int, badwords: int, rng) -> dict:
+    """Tulis semua data sintetis lalu muat ke state global main. Return konteks untuk skenario."""
+    stream_map = make_stream_map(codes)
+    with open(main.STREAM_MAP_FILE, "w", encoding="utf-8") as f:
+        json.dump(stream_map, f)
+    main.load_stream_map()
+
+    uids = user_ids(users)
+    main.save_user_data(make_user_data(main, uids, rng))
+
+    code_list = sorted(stream_map)
+    write_click_log(main, clicks, code_list, uids, main.RETENTION_DAYS, rng)
+
+    main.BAD_WORDS = make_badwords(badwords, rng)
+    main.BAD_WORDS_RE = main._build_badwords_regex(main.BAD_WORDS)
+
+    return {"codes": code_list, "users": uids, "badwords": sorted(main.BAD_WORDS)}
@@ -0,0 +1,133 @@
+"""
+Client Telegram palsu + pembuat update untuk benchmark/replay.
+
+FakeTelegramClient meniru method pyrogram.Client yang dipakai handler bot
+(get_chat_member, send_message, send_photo, answer_callback_query, ...).
+Setiap panggilan "RPC" cukup tidur sesuai latensi yang dikonfigurasi, lalu
+mengembalikan objek pyrogram asli supaya kode handler berjalan apa adanya.
+"""
+import asyncio
+import itertools
+import random
+from collections import Counter
+
+from pyrogram.enums import ChatMemberStatus, ChatType
+from pyrogram.errors import UserNotParticipant
+from pyrogram.types import CallbackQuery, Chat, ChatMember, Message, User
+
+GROUP_CHAT_ID = -1001234567890
+
+
+class FakeTelegramClient:
+    """Stub pyrogram.Client: latensi RPC tetap + jitter, membership deterministik per user."""
+
+    def __init__(self, latency_ms: float = 50.0, jitter_ms: float = 10.0,
+                 member_ratio: float = 0.9, seed: int | None = None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.member_ratio = member_ratio
+        self.rng = random.Random(seed)
+        self.calls: Counter = Counter()
+        self._ids = itertools.count(1)
+
+    async def _rpc(self, method: str):
+        self.calls[method] += 1
+        delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+        if delay:
+            await asyncio.sleep(delay)
+
+    def is_member(self, user_id: int) -> bool:
+        # hash multiplikatif → hasil sama untuk user yang sama di semua chat
+        return (user_id * 2654435761) % 1000 < self.member_ratio * 1000
+
+    def _message(self, chat_id, text=None) -> Message:
+        chat_type = ChatType.SUPERGROUP if isinstance(chat_id, str) or chat_id < 0 else ChatType.PRIVATE
+        return Message(client=self, id=next(self._ids), chat=Chat(id=chat_id, type=chat_type), text=text)
+
+    # --- method yang dipakai handler ---
+
+    async def get_chat_member(self, chat_id, user_id):
+        await self._rpc("get_chat_member")
+        if not self.is_member(user_id):
+            raise UserNotParticipant()
+        return ChatMember(status=ChatMemberStatus.MEMBER, user=User(id=user_id))
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._rpc("send_message")
+        return self._message(chat_id, text)
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        await self._rpc("send_photo")
+        return self._message(chat_id, caption)
+
+    async def send_video(self, chat_id, video, caption=None, **kwargs):
+        await self._rpc("send_video")
+        return self._message(chat_id, caption)
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._rpc("copy_message")
+        return self._message(chat_id, kwargs.get("caption"))
+
+    async def edit_message_text(self, chat_id, message_id, text, **kwargs):
+        await self._rpc("edit_message_text")
+        return self._message(chat_id, text)
+
+    async def answer_callback_query(self, callback_query_id, text=None, show_alert=None, **kwargs):
+        await self._rpc("answer_callback_query")
+        return True
+
+    async def delete_messages(self, chat_id, message_ids, revoke=True):
+        await self._rpc("delete_messages")
+        return len(message_ids) if isinstance(message_ids, list) else 1
+
+    async def restrict_chat_member(self, chat_id, user_id, permissions, until_date=None):
+        await self._rpc("restrict_chat_member")
+        return True
+
+    async def ban_chat_member(self, chat_id, user_id, until_date=None):
+        await self._rpc("ban_chat_member")
+        return True
+
+    async def unban_chat_member(self, chat_id, user_id):
+        await self._rpc("unban_chat_member")
+        return True
+
+
+class UpdateFactory:
+    """Bangun objek Message/CallbackQuery pyrogram yang terikat ke client palsu."""
+
+    def __init__(self, client: FakeTelegramClient, group_id: int = GROUP_CHAT_ID):
+        self.client = client
+        self.group_id = group_id
+        self._ids = itertools.count(1_000_000)
+
+    def _user(self, user_id: int) -> User:
+        return User(client=self.client, id=user_id, first_name=f"user{user_id}", username=f"user{user_id}")
+
+    def private_text(self, user_id: int, text: str) -> Message:
+        msg = Message(
+            client=self.client, id=next(self._ids), from_user=self._user(user_id),
+            chat=Chat(client=self.client, id=user_id, type=ChatType.PRIVATE), text=text,
+        )
+        if text.startswith("/"):
+            # sama seperti filters.command: ["cmd", "arg1", ...]
+            parts = text[1:].split()
+            msg.command = [parts[0].split("@")[0].lower()] + parts[1:]
+        return msg
+
+    def group_text(self, user_id: int, text: str) -> Message:
+        return Message(
+            client=self.client, id=next(self._ids), from_user=self._user(user_id),
+            chat=Chat(client=self.client, id=self.group_id, type=ChatType.SUPERGROUP, title="Bench Group"),
+            text=text,
+        )
+
+    def callback(self, user_id: int, data: str) -> CallbackQuery:
+        origin = Message(
+            client=self.client, id=next(self._ids),
+            chat=Chat(client=self.client, id=user_id, type=ChatType.PRIVATE),
+        )
+        return CallbackQuery(
+            client=self.client, id=str(next(self._ids)), from_user=self._user(user_id),
+            chat_instance="bench", message=origin, data=data,
+        )
@@ -0,0 +1,210 @@
+"""
+Replay trafik asli dari logs/clicks.jsonl ke handler bot (client Telegram palsu).
+
+Setiap event klik diubah jadi dua update seperti alur user sebenarnya:
+`/start <kode>` pada waktu event, lalu callback `verify_<kode>` beberapa detik kemudian.
+Jadwal mengikuti timestamp asli (jeda idle panjang bisa dipadatkan dengan --max-gap),
+dipercepat N× lewat --speed. Beberapa kecepatan sekaligus (mis. --speed 1,5,20,50)
+menghasilkan tabel untuk mencari titik jenuh: kecepatan pertama yang p99-nya melewati
+--slo-ms atau yang event loop-nya tertinggal lebih dari --slo-ms saat menjadwalkan update.
+Tiap kecepatan jalan di proses baru dengan workdir sendiri (<workdir>/speed-<N>x), jadi
+state bot, cache, dan click log tidak terbawa dari kecepatan sebelumnya.
+
+Contoh:
+    python -m bench.replay logs/clicks.jsonl --speed 1,10,50,100 --max-gap 30
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from bench.run import load_bot, print_table
+
+
+def load_events(path: Path, limit: int | None = None) -> list[tuple[float, int, str, str]]:
+    """[(epoch, user_id, code, link)] terurut waktu; baris rusak dilewati."""
+    events = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                row = json.loads(line)
+                ts = datetime.fromisoformat(row["ts"].replace("Z", "+00:00")).timestamp()
+                events.append((ts, int(row["user_id"]), str(row["code"]), row.get("link") or ""))
+            except (ValueError, KeyError, TypeError):
+                continue
+    events.sort()
+    return events[:limit] if limit else events
+
+
+def build_schedule(events, speed: float, max_gap: float, think_s: float) -> list[tuple[float, str, int, str]]:
+    """Offset (detik wall-clock replay) untuk tiap update; jeda > max_gap dipadatkan."""
+    schedule = []
+    offset, prev = 0.0, None
+    for ts, uid, code, _ in events:
+        if prev is not None:
+            offset += min(ts - prev, max_gap) if max_gap > 0 else ts - prev
+        prev = ts
+        schedule.append((offset / speed, "start", uid, code))
+        schedule.append(((offset + think_s) / speed, "verify", uid, code))
+    schedule.sort(key=lambda x: x[0])
+    return schedule
+
+
+async def replay(bot, client, factory, schedule, speed: float, slo_ms: float) -> dict:
+    from pyrogram import ContinuePropagation, StopPropagation
+
+    loop = asyncio.get_running_loop()
+    latencies: list[float] = []
+    errors = 0
+    in_flight = max_in_flight = 0
+    max_dispatch_lag = 0.0
+
+    async def run_one(kind: str, uid: int, code: str, scheduled: float):
+        nonlocal errors, in_flight
+        if kind == "start":
+            handler, update = bot.start_command, factory.private_text(uid, f"/start {code}")
+        else:
+            handler, update = bot.handle_callback, factory.callback(uid, f"verify_{code}")
+        try:
+            await handler(client, update)
+        except (StopPropagation, ContinuePropagation):
+            pass
+        except Exception:
+            errors += 1
+        finally:
+            in_flight -= 1
+            # latensi dihitung dari waktu terjadwal → termasuk antre kalau bot tertinggal
+            latencies.append(loop.time() - scheduled)
+
+    t0 = loop.time()
+    tasks = []
+    for offset, kind, uid, code in schedule:
+        scheduled = t0 + offset
+        delay = scheduled - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        max_dispatch_lag = max(max_dispatch_lag, loop.time() - scheduled)
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        tasks.append(asyncio.create_task(run_one(kind, uid, code, scheduled)))
+    await asyncio.gather(*tasks)
+    elapsed = loop.time() - t0
+
+    span = schedule[-1][0] if schedule else 0.0
+    offered = len(schedule) / span if span > 0 else float("inf")
+    achieved = len(schedule) / elapsed if elapsed > 0 else 0.0
+    p99 = bot._percentile(latencies, 99) * 1000
+    # latensi dihitung dari waktu terjadwal, jadi antrean yang menumpuk langsung terlihat di p99;
+    # dispatch lag besar berarti event loop sendiri sudah tidak sempat menjadwalkan update tepat waktu
+    saturated = p99 > slo_ms or max_dispatch_lag * 1000 > slo_ms
+    return {
+        "speed": f"{speed:g}x",
+        "updates": len(schedule),
+        "errors": errors,
+        "offered_per_s": round(offered, 1) if offered != float("inf") else "max",
+        "achieved_per_s": round(achieved, 1),
+        "p50_ms": round(bot._percentile(latencies, 50) * 1000, 1),
+        "p99_ms": round(p99, 1),
+        "max_in_flight": max_in_flight,
+        "dispatch_lag_ms": round(max_dispatch_lag * 1000, 1),
+        "saturated": "YA" if saturated else "-",
+    }
+
+
+def install_stream_map(bot, events):
+    """STREAM_MAP dibangun dari kode yang ada di log supaya semua /start valid."""
+    stream_map = {}
+    for _, _, code, link in events:
+        stream_map.setdefault(code, {"link": link or f"https://{code}.netlify.app/"})
+    with open(bot.STREAM_MAP_FILE, "w", encoding="utf-8") as f:
+        json.dump(stream_map, f)
+    bot.load_stream_map()
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Replay clicks.jsonl ke handler bot dengan client palsu.")
+    ap.add_argument("log", help="path clicks.jsonl")
+    ap.add_argument("--speed", default="1", help="kelipatan kecepatan, bisa daftar: 1,5,20")
+    ap.add_argument("--max-gap", type=float, default=60.0, help="padatkan jeda idle > N detik (0 = asli)")
+    ap.add_argument("--think-s", type=float, default=3.0, help="jeda /start → verify_ (detik waktu asli)")
+    ap.add_argument("--limit", type=int, help="batasi jumlah event")
+    ap.add_argument("--slo-ms", type=float, default=1000.0, help="batas p99 sebelum dianggap jenuh")
+    ap.add_argument("--rpc-latency-ms", type=float, default=50.0)
+    ap.add_argument("--rpc-jitter-ms", type=float, default=10.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workdir", help="folder data sementara (default: tempdir baru)")
+    ap.add_argument("--json", help="simpan hasil ke file JSON")
+    ap.add_argument("--verbose", action="store_true", help="tampilkan log bot")
+    return ap.parse_args(argv)
+
+
+async def replay_speed(args, events, speed: float, workdir: Path) -> dict:
+    from bench.fake_telegram import FakeTelegramClient, UpdateFactory
+
+    bot = load_bot(workdir, args.verbose)
+    install_stream_map(bot, events)
+    random.seed(args.seed)
+    # semua user lolos membership: event di log hanya tercatat setelah verifikasi berhasil
+    client = FakeTelegramClient(args.rpc_latency_ms, args.rpc_jitter_ms, member_ratio=1.0, seed=args.seed)
+    factory = UpdateFactory(client)
+    schedule = build_schedule(events, speed, args.max_gap, args.think_s)
+    return await replay(bot, client, factory, schedule, speed, args.slo_ms)
+
+
+def run_speed(args, events, speed: float, workdir: str) -> dict:
+    """Entry point proses anak: modul bot diimport ulang dari nol di workdir kosong."""
+    return asyncio.run(replay_speed(args, events, speed, Path(workdir)))
+
+
+def replay_speeds(args) -> list[dict]:
+    events = load_events(Path(args.log), args.limit)
+    if not events:
+        raise SystemExit(f"tidak ada event valid di {args.log}")
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="bacolreplay-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    real_span = events[-1][0] - events[0][0]
+    print(f"{len(events)} event, {len({e[1] for e in events})} user, {len({e[2] for e in events})} kode, "
+          f"rentang asli {real_span / 3600:.1f} jam (workdir {workdir})")
+
+    results = []
+    ctx = multiprocessing.get_context("spawn")
+    for speed in [float(s) for s in args.speed.split(",") if s.strip()]:
+        run_dir = workdir / f"speed-{speed:g}x"
+        if run_dir.exists():
+            shutil.rmtree(run_dir)
+        run_dir.mkdir()
+        t0 = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=1, mp_context=ctx) as pool:
+            res = pool.submit(run_speed, args, events, speed, str(run_dir)).result()
+        print(f"  {res['speed']}: selesai {time.perf_counter() - t0:.1f}s, p99 {res['p99_ms']}ms")
+        results.append(res)
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.log = os.path.abspath(args.log)
+    if args.json:
+        args.json = os.path.abspath(args.json)
+    results = replay_speeds(args)
+    print()
+    print_table(results, list(results[0].keys()))
+    first = next((r["speed"] for r in results if r["saturated"] == "YA"), None)
+    print(f"\ntitik jenuh: {first or 'tidak tercapai pada kecepatan yang diuji'}")
+    if args.json:
+        meta = {k: v for k, v in vars(args).items() if k not in ("json", "verbose")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": meta, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""
+Benchmark handler bot dengan client Telegram palsu.
+
+Contoh:
+    python -m bench.run
+    python -m bench.run --scenarios start,verify --updates 5000 --concurrency 64 --rpc-latency-ms 80
+    python -m bench.run --codes 5000 --users 50000 --clicks 500000 --json hasil.json
+
+Setiap skenario memanggil handler asli dari main.py (start_command, handle_callback
+verify_, random_command, moderation_guard, search_command, dashboard_command) dan
+melaporkan updates/detik serta latensi p50/p99 per update.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+CLEAN_TEXTS = [
+    "halo semua, ada rekomendasi koleksi malam ini?",
+    "mantap updatenya min",
+    "kode yang kemarin masih bisa dibuka kan?",
+    "siap, makasih infonya",
+]
+LINK_TEXTS = [
+    "cek https://t.me/BangsaBacol ya",
+    "mampir ke https://contoh-spam.example.com/promo",
+]
+
+
+def _scenario_builders(main, factory, ctx, rng):
+    codes, users = ctx["codes"], ctx["users"]
+    owner = main.OWNER_ID
+
+    def start(i):
+        code = rng.choice(codes) if rng.random() < 0.95 else f"tidakada{i}"
+        return main.start_command, factory.private_text(rng.choice(users), f"/start {code}")
+
+    def verify(i):
+        return main.handle_callback, factory.callback(rng.choice(users), f"verify_{rng.choice(codes)}")
+
+    def random_(i):
+        return main.random_command, factory.private_text(rng.choice(users), "/random")
+
+    def moderation(i):
+        roll = rng.random()
+        if roll < 0.8:
+            text = rng.choice(CLEAN_TEXTS)
+        elif roll < 0.9:
+            text = f"dasar {rng.choice(ctx['badwords'])} kamu"
+        else:
+            text = rng.choice(LINK_TEXTS)
+        return main.moderation_guard, factory.group_text(rng.choice(users), text)
+
+    def search(i):
+        code = rng.choice(codes)
+        start_at = rng.randint(0, max(0, len(code) - 4))
+        return main.search_command, factory.private_text(owner, f"/search {code[start_at:start_at + 4]}")
+
+    def dashboard(i):
+        return main.dashboard_command, factory.private_text(owner, "/dashboard")
+
+    return {
+        "start": start, "verify": verify, "random": random_,
+        "moderation": moderation, "search": search, "dashboard": dashboard,
+    }
+
+
+async def run_scenario(main, client, name: str, build, updates: int, concurrency: int) -> dict:
+    from pyrogram import ContinuePropagation, StopPropagation
+
+    counter = itertools.count()
+    latencies: list[float] = []
+    errors = 0
+    calls_before = sum(client.calls.values())
+
+    async def worker():
+        nonlocal errors
+        while True:
+            i = next(counter)
+            if i >= updates:
+                return
+            handler, update = build(i)
+            t0 = time.perf_counter()
+            try:
+                await handler(client, update)
+            except (StopPropagation, ContinuePropagation):
+                pass
+            except Exception as e:
+                errors += 1
+                if errors <= 3:
+                    print(f"  ! {name}: {type(e).__name__}: {e}", file=sys.stderr)
+            latencies.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - t0
+    return {
+        "scenario": name,
+        "updates": updates,
+        "errors": errors,
+        "elapsed_s": round(elapsed, 3),
+        "updates_per_s": round(updates / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(main._percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(main._percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2) if latencies else 0.0,
+        "rpc_calls": sum(client.calls.values()) - calls_before,
+    }
+
+
+def load_bot(workdir: Path, verbose: bool = False):
+    """Import main.py dengan cwd = workdir supaya semua file data/log bot ada di sana."""
+    os.chdir(workdir)
+    for key, value in {"API_ID": "1", "API_HASH": "bench", "BOT_TOKEN": "1:bench",
+                       "CHANNEL_USERNAME": "BenchChannel", "GROUP_USERNAME": "BenchGroup",
+                       "EXTRA_CHANNEL": "BenchExtra", "OWNER_ID": "1"}.items():
+        os.environ.setdefault(key, value)
+    sys.path.insert(0, str(REPO_ROOT))
+    import main
+    main.setup_runtime()
+    if not verbose:
+        main.logger.setLevel(logging.WARNING)
+    return main
+
+
+def print_table(results: list[dict], cols: list[str] | None = None):
+    if not results:
+        return
+    cols = cols or ["scenario", "updates", "errors", "updates_per_s", "p50_ms", "p99_ms", "max_ms", "rpc_calls"]
+    widths = {c: max(len(c), *(len(str(r[c])) for r in results)) for c in cols}
+    print("  ".join(c.ljust(widths[c]) for c in cols))
+    for r in results:
+        print("  ".join(str(r[c]).ljust(widths[c]) for c in cols))
+
+
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Benchmark handler Bangsa Bacol Bot dengan client Telegram palsu.")
+    ap.add_argument("--scenarios", default="start,verify,random,moderation,search,dashboard")
+    ap.add_argument("--updates", type=int, default=2000, help="jumlah update per skenario")
+    ap.add_argument("--concurrency", type=int, default=32, help="update yang diproses bersamaan")
+    ap.add_argument("--rpc-latency-ms", type=float, default=50.0)
+    ap.add_argument("--rpc-jitter-ms", type=float, default=10.0)
+    ap.add_argument("--member-ratio", type=float, default=0.9, help="porsi user yang lolos cek membership")
+    ap.add_argument("--codes", type=int, default=500, help="ukuran STREAM_MAP")
+    ap.add_argument("--users", type=int, default=5000)
+    ap.add_argument("--clicks", type=int, default=50000, help="jumlah event di clicks.jsonl")
+    ap.add_argument("--badwords", type=int, default=200)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workdir", help="folder data sementara (default: tempdir baru)")
+    ap.add_argument("--json", help="simpan hasil ke file JSON")
+    ap.add_argument("--verbose", action="store_true", help="tampilkan log bot")
+    return ap.parse_args(argv)
+
+
+async def main_async(args) -> list[dict]:
+    from bench import datagen
+    from bench.fake_telegram import FakeTelegramClient, UpdateFactory
+
+    workdir = Path(args.workdir or tempfile.mkdtemp(prefix="bacolbench-")).resolve()
+    workdir.mkdir(parents=True, exist_ok=True)
+    bot = load_bot(workdir, args.verbose)
+    rng = random.Random(args.seed)
+
+    t0 = time.perf_counter()
+    ctx = datagen.install(bot, codes=args.codes, users=args.users, clicks=args.clicks,
+                          badwords=args.badwords, rng=rng)
+    print(f"data sintetis siap di {workdir} ({time.perf_counter() - t0:.1f}s): "
+          f"{args.codes} kode, {args.users} user, {args.clicks} klik, {args.badwords} badwords")
+
+    client = FakeTelegramClient(args.rpc_latency_ms, args.rpc_jitter_ms, args.member_ratio, seed=args.seed)
+    factory = UpdateFactory(client)
+    builders = _scenario_builders(bot, factory, ctx, rng)
+
+    results = []
+    for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        if name not in builders:
+            raise SystemExit(f"skenario tidak dikenal: {name} (pilihan: {', '.join(builders)})")
+        results.append(await run_scenario(bot, client, name, builders[name], args.updates, args.concurrency))
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.json:
+        args.json = os.path.abspath(args.json)   # runner pindah cwd ke workdir
+    results = asyncio.run(main_async(args))
+    print()
+    print_table(results)
+    if args.json:
+        meta = {k: v for k, v in vars(args).items() if k not in ("json", "verbose")}
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"params": meta, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,346 @@
 
 import logging
-import colorlog
 import os
 from pathlib import Path
 import asyncio
 import json
 import re
 from statistics import mean
-from collections import defaultdict
-from logging.handlers import RotatingFileHandler
+from collections import OrderedDict, defaultdict, deque
+from logging.handlers import QueueListener, RotatingFileHandler
 from urllib.parse import urlparse
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 try:
     from zoneinfo import ZoneInfo  # Python 3.9+
 except ImportError:
     ZoneInfo = None
+try:
+    import fcntl   # kunci sidecar kode antar proses (POSIX)
+except ImportError:
+    fcntl = None
 
 from dotenv import load_dotenv
-from pyrogram.errors import UserNotParticipant
-from pyrogram import Client, filters, idle
+from pyrogram.errors import UserNotParticipant, FloodWait
+from pyrogram import Client, filters, idle, raw, utils as pyrogram_utils, StopPropagation, ContinuePropagation
 from pyrogram.types import Message
-from pyrogram.enums import ChatMemberStatus, ParseMode
+from pyrogram.enums import ChatMemberStatus, ChatType, ParseMode
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery, ChatPermissions
 from pyrogram.errors import MessageNotModified
-import aiohttp
+from pyrogram.handlers import MessageHandler, CallbackQueryHandler
 import time
 import random
-import urllib.request
+import functools
+import contextvars
+import threading
+import atexit
+import bisect
+import copy
+import csv
+import gzip
+import heapq
+import inspect
+import io
+import math
+import mmap
+import queue
+import shutil
+import signal
+import sqlite3
+import struct
+import sys
+import traceback
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from html import escape as html_escape
+
+# ================================
+# Metrics (format Prometheus)
+# ================================
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _fmt_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    inner = ",".join('%s="%s"' % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")) for k, v in labels)
+    return "{" + inner + "}"
+
+class Counter:
+    def __init__(self, name: str, help_: str):
+        self.name, self.help, self.kind = name, help_, "counter"
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = tuple(sorted(labels.items()))
+        self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self):
+        for key, v in self.values.items():
+            yield self.name, key, v
+
+class Gauge(Counter):
+    def __init__(self, name: str, help_: str, fn=None, kind: str = "gauge"):
+        super().__init__(name, help_)
+        self.kind = kind
+        self.fn = fn   # opsional: callable → float atau {labels_tuple: float}
+
+    def set(self, value: float, **labels):
+        self.values[tuple(sorted(labels.items()))] = value
+
+    def samples(self):
+        if self.fn is None:
+            yield from super().samples()
+            return
+        try:
+            out = self.fn()
+        except Exception:
+            return
+        if isinstance(out, dict):
+            for key, v in out.items():
+                yield self.name, key, v
+        else:
+            yield self.name, (), out
+
+class Histogram:
+    def __init__(self, name: str, help_: str, buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.kind = name, help_, "histogram"
+        self.buckets = tuple(buckets)
+        self.values: dict[tuple, list] = {}   # labels -> [bucket_counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        rec = self.values.get(key)
+        if rec is None:
+            rec = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, b in enumerate(self.buckets):
+            if value <= b:
+                rec[i] += 1
+                break
+        rec[-2] += value
+        rec[-1] += 1
+
+    def time(self, **labels):
+        return _HistTimer(self, labels)
+
+    def samples(self):
+        for key, rec in self.values.items():
+            cum = 0
+            for b, n in zip(self.buckets, rec):
+                cum += n
+                yield f"{self.name}_bucket", key + (("le", repr(b)),), cum
+            yield f"{self.name}_bucket", key + (("le", "+Inf"),), rec[-1]
+            yield f"{self.name}_sum", key, rec[-2]
+            yield f"{self.name}_count", key, rec[-1]
+
+class _HistTimer:
+    def __init__(self, hist: Histogram, labels: dict):
+        self.hist, self.labels = hist, labels
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.observe(time.perf_counter() - self.t0, **self.labels)
+        return False
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: dict[str, object] = {}
+
+    def _add(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help_):
+        return self._add(Counter(name, help_))
+
+    def gauge(self, name, help_, fn=None, kind="gauge"):
+        return self._add(Gauge(name, help_, fn, kind))
+
+    def histogram(self, name, help_, buckets=LATENCY_BUCKETS):
+        return self._add(Histogram(name, help_, buckets))
+
+    def render(self) -> str:
+        out = []
+        for m in self.metrics.values():
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            for name, labels, value in m.samples():
+                out.append(f"{name}{_fmt_labels(labels)} {value}")
+        return "\n".join(out) + "\n"
+
+metrics = MetricsRegistry()
+HANDLER_LATENCY = metrics.histogram("bot_handler_latency_seconds", "Durasi eksekusi handler per command/callback")
+HANDLER_ERRORS = metrics.counter("bot_handler_errors_total", "Exception tak tertangani per handler")
+RPC_LATENCY = metrics.histogram("bot_telegram_rpc_latency_seconds", "Latensi RPC Telegram per method raw API")
+RPC_ERRORS = metrics.counter("bot_telegram_rpc_errors_total", "RPC Telegram yang gagal per method & error")
+PERSIST_LATENCY = metrics.histogram("bot_persist_flush_seconds", "Durasi tulis state ke disk per store")
+CACHE_REQUESTS = metrics.counter("bot_cache_requests_total", "Lookup cache per cache & hasil (hit/miss)")
+LOOP_LAG = metrics.gauge("bot_event_loop_lag_seconds", "Keterlambatan penjadwalan event loop (sampel terakhir)")
+OUTBOX_LATENCY = metrics.histogram("bot_outbox_queue_latency_seconds", "Waktu tunggu kiriman di outbound queue")
+LOOP_LAG_HIST = metrics.histogram("bot_event_loop_lag_seconds_dist", "Distribusi keterlambatan event loop")
+
+DISK_READ_LATENCY = metrics.histogram("bot_disk_read_seconds", "Durasi baca state dari disk per sumber")
+
+# Trace handler yang sedang berjalan (diisi wrapper handler, lihat instrument_handlers)
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("bot_trace", default=None)
+
+def _trace_add(field: str, seconds: float):
+    tr = _current_trace.get()
+    if tr is not None:
+        setattr(tr, field, getattr(tr, field) + seconds)
+
+def _timed_io(hist: Histogram, label: str, value: str):
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dt = time.perf_counter() - t0
+                hist.observe(dt, **{label: value})
+                _trace_add("io", dt)
+        return wrapper
+    return deco
+
+def timed_persist(store: str):
+    """Decorator: catat durasi fungsi simpan/flush ke PERSIST_LATENCY (+ waktu disk di trace handler)."""
+    return _timed_io(PERSIST_LATENCY, "store", store)
+
+def timed_read(source: str):
+    """Decorator: catat durasi fungsi baca disk ke DISK_READ_LATENCY (+ waktu disk di trace handler)."""
+    return _timed_io(DISK_READ_LATENCY, "source", source)
+
+def observe_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+# ================================
+# Cache (TTL + LRU)
+# ================================
+CACHE_EVICTIONS = metrics.counter("bot_cache_evictions_total", "Entri cache yang dibuang per cache & alasan")
+_MISSING = object()
+
+class TTLCache:
+    """
+    Cache in-process: TTL per entri + batas ukuran dengan eviction LRU.
+    get_or_load() memakai loader async dengan single-flight: miss bersamaan untuk key yang sama
+    hanya memanggil loader sekali, pemanggil lain menunggu hasil yang sama.
+    Semua cache terdaftar di TTLCache.registry (untuk /cachestats & metrics).
+    """
+    registry: dict[str, "TTLCache"] = {}
+
+    def __init__(self, name: str, maxsize: int = 1024, ttl: float = 60.0):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict = OrderedDict()   # key -> (value, expires_at monotonic)
+        self._inflight: dict = {}                 # key -> Future loader yang sedang jalan
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0, "loads": 0}
+        TTLCache.registry[name] = self
+
+    def __len__(self):
+        return len(self._data)
+
+    def _evicted(self, reason: str, n: int = 1):
+        self.stats["evictions" if reason == "lru" else reason] += n
+        CACHE_EVICTIONS.inc(n, cache=self.name, reason=reason)
+
+    def _lookup(self, key):
+        rec = self._data.get(key)
+        if rec is None:
+            return _MISSING
+        if rec[1] <= time.monotonic():
+            del self._data[key]
+            self._evicted("expired")
+            return _MISSING
+        self._data.move_to_end(key)
+        return rec[0]
+
+    def _record(self, hit: bool):
+        self.stats["hits" if hit else "misses"] += 1
+        observe_cache(self.name, hit)
+
+    def get(self, key, default=None):
+        value = self._lookup(key)
+        self._record(value is not _MISSING)
+        return default if value is _MISSING else value
+
+    def set(self, key, value, ttl: float | None = None):
+        self._data[key] = (value, time.monotonic() + (self.ttl if ttl is None else ttl))
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self._evicted("lru")
+
+    def invalidate(self, key=_MISSING):
+        """Hapus satu key, atau seluruh isi cache kalau key tidak diberikan."""
+        if key is _MISSING:
+            n = len(self._data)
+            self._data.clear()
+        else:
+            n = 1 if self._data.pop(key, None) is not None else 0
+        if n:
+            self._evicted("invalidations", n)
+
+    def get_or_compute(self, key, fn, ttl: float | None = None):
+        """Versi sinkron: fn() dipanggil saat miss, hasilnya disimpan."""
+        value = self._lookup(key)
+        self._record(value is not _MISSING)
+        if value is _MISSING:
+            value = fn()
+            self.stats["loads"] += 1
+            self.set(key, value, ttl)
+        return value
+
+    async def get_or_load(self, key, loader, ttl: float | None = None, cache_if=None):
+        """
+        loader: callable tanpa argumen → awaitable. cache_if(value) → False berarti hasil
+        tidak disimpan (mis. hanya cache hasil positif), tapi tetap dibagi ke penunggu yang sama.
+        """
+        value = self._lookup(key)
+        self._record(value is not _MISSING)
+        if value is not _MISSING:
+            return value
+        while (fut := self._inflight.get(key)) is not None:
+            try:
+                return await asyncio.shield(fut)
+            except asyncio.CancelledError:
+                if not fut.cancelled():
+                    raise   # penunggu ini sendiri yang di-cancel
+                # pemanggil yang menjalankan loader di-cancel: penunggu lain tidak ikut batal,
+                # cek cache lagi lalu ambil alih load (atau ikut loader baru)
+                value = self._lookup(key)
+                if value is not _MISSING:
+                    return value
+        fut = self._inflight[key] = asyncio.get_running_loop().create_future()
+        try:
+            value = await loader()
+        except BaseException as e:
+            if isinstance(e, asyncio.CancelledError):
+                fut.cancel()
+            else:
+                fut.set_exception(e)
+                fut.exception()   # tandai sudah diambil: tidak ada warning kalau tak ada penunggu
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self.stats["loads"] += 1
+        if cache_if is None or cache_if(value):
+            self.set(key, value, ttl)
+        fut.set_result(value)
+        return value
+
+    def snapshot(self) -> dict:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "size": len(self._data), "maxsize": self.maxsize, "ttl": self.ttl,
+            "hit_rate": (self.stats["hits"] / lookups) if lookups else 0.0,
+            **self.stats,
+        }
+
+metrics.gauge("bot_cache_entries", "Jumlah entri per cache",
+              fn=lambda: {(("cache", name),): len(c) for name, c in TTLCache.registry.items()})
 
 USER_DATA_FILE = Path("data/user_data.json")
 VOTES_FILE = "votes.json"
@@ -46,70 +360,65 @@ def normalize_badge(name: str) -> str:
     return fixed.strip()
 
 def load_user_data():
-    if USER_DATA_FILE.exists():
-        with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+    """Semua user {uid: record} dari state store (lihat STATE_BACKEND)."""
+    return state.all_users()
 
 def save_user_data(data):
-    USER_DATA_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(USER_DATA_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    state.replace_users(data)
+    USER_RECORD_CACHE.invalidate()
+
+# Record user untuk cek badge/akses; TTL pendek supaya update dari proses bot lain ikut terlihat
+USER_RECORD_CACHE = TTLCache("user_record", maxsize=20_000, ttl=60)
 
-def grant_xp_for_command(message, invoked_command: str):
+async def get_user_record(user_id) -> dict:
+    async def load():
+        return await state_call(state.get_user, user_id) or {}
+    return await USER_RECORD_CACHE.get_or_load(str(user_id), load)
+
+async def grant_xp_for_command(message, invoked_command: str):
     """Tambahkan XP ke user tiap kali pakai command."""
     if not message.from_user:
         return
     user_id = message.from_user.id
     username = message.from_user.username or "-"
+    if "dashboard" in features:
+        engagement.mark(user_id)
     try:
-        update_user_xp(user_id, username, invoked_command, xp_increment=1)
+        await update_user_xp(user_id, username, invoked_command, xp_increment=1)
     except Exception as e:
         logger.error(f"Gagal menambahkan XP untuk {user_id}: {e}")
 
-def update_user_xp(user_id: int, username: str, invoked_command: str, xp_increment: int = 1) -> dict:
-    data = load_user_data()
-    user = data.setdefault(str(user_id), {
-        "username": username or "-",
-        "xp": 0,
-        "badge": BADGE_STRANGER,
-        "last_seen": None,
-        "last_xp_dates": {}
-    })
-
-    user["username"] = username or user.get("username") or "-"
+async def update_user_xp(user_id: int, username: str, invoked_command: str, xp_increment: int = 1) -> dict:
     now = datetime.now(JAKARTA_TZ)
     today = now.date().isoformat()
 
-    last = user.setdefault("last_xp_dates", {})
-
-    # cek apakah sudah dapat XP command ini hari ini
-    if last.get(invoked_command) == today:
+    def apply(user: dict):
+        user["username"] = username or user.get("username") or "-"
         user["last_seen"] = now.isoformat()
-        save_user_data(data)
-        return user
+        last = user.setdefault("last_xp_dates", {})
 
-    # tambahkan XP
-    user["xp"] = int(user.get("xp", 0)) + xp_increment
-    user["last_seen"] = now.isoformat()
-    last[invoked_command] = today
+        # cek apakah sudah dapat XP command ini hari ini
+        if last.get(invoked_command) == today:
+            return
 
-    xp = user["xp"]
-    if xp >= 150:
-        user["badge"] = BADGE_STARLORD
-    elif xp >= 80:
-        user["badge"] = BADGE_STELLAR
-    elif xp >= 20:
-        user["badge"] = BADGE_SHIMMER
-    else:
-        user["badge"] = BADGE_STRANGER
+        # tambahkan XP
+        user["xp"] = int(user.get("xp", 0)) + xp_increment
+        last[invoked_command] = today
+        user["badge"] = _badge_by_xp(user["xp"])
 
-    save_user_data(data)
+    # satu transaksi per user: aman walau beberapa proses bot berbagi state store
+    user = await state_call(state.update_user, user_id, apply, default={
+        "username": username or "-",
+        "xp": 0,
+        "badge": BADGE_STRANGER,
+        "last_seen": None,
+        "last_xp_dates": {}
+    })
+    USER_RECORD_CACHE.set(str(user_id), user)
     return user
 
-def has_stellar_or_higher(user_id):
-    data = load_user_data()
-    user = data.get(str(user_id))
+async def has_stellar_or_higher(user_id):
+    user = await get_user_record(user_id)
     if not user:
         return False
     badge = user.get("badge", "")
@@ -118,21 +427,8 @@ def has_stellar_or_higher(user_id):
 def is_admin(message) -> bool:
     return bool(getattr(message, "from_user", None)) and message.from_user.id in ADMIN_IDS
 
-def is_starlord(user_id: int) -> bool:
-    data = load_user_data()
-    return data.get(str(user_id), {}).get("badge") == "Starlord 🥇"
-
-# Helper load/save
-def load_votes():
-    try:
-        with open(VOTES_FILE, "r") as f:
-            return json.load(f)
-    except:
-        return {}
-
-def save_votes(data):
-    with open(VOTES_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+async def is_starlord(user_id: int) -> bool:
+    return (await get_user_record(user_id)).get("badge") == "Starlord 🥇"
 
 # ============== JATAH /random ==============
 JAKARTA_TZ = ZoneInfo("Asia/Jakarta") if ZoneInfo else None
@@ -148,6 +444,7 @@ _quota_lock = asyncio.Lock()
 def _ensure_parent_dir(p: Path):
     p.parent.mkdir(parents=True, exist_ok=True)
 
+@timed_read("random_quota")
 def _load_quota() -> dict:
     if not QUOTA_FILE.exists():
         return {}
@@ -157,6 +454,7 @@ def _load_quota() -> dict:
     except Exception:
         return {}
 
+@timed_persist("random_quota")
 def _save_quota(data: dict) -> None:
     _ensure_parent_dir(QUOTA_FILE)
     with QUOTA_FILE.open("w", encoding="utf-8") as f:
@@ -179,56 +477,29 @@ def _format_eta(seconds: int) -> str:
 
 async def get_random_quota_status(user_id: int):
     async with _quota_lock:
-        data = _load_quota()
-        today = _today_key()
-        if set(data.keys()) - {today}:
-            data = {today: data.get(today, {})}
-            _save_quota(data)
-        used = int(data.get(today, {}).get(str(user_id), 0))
+        used = await state_call(state.quota_used, _today_key(), user_id)
         limit = RANDOM_DAILY_LIMIT
         remaining = max(0, limit - used)
         return used, remaining, limit, _seconds_until_midnight_jkt()
 
 async def consume_random_quota(user_id: int):
     async with _quota_lock:
-        data = _load_quota()
-        today = _today_key()
-        if set(data.keys()) - {today}:
-            data = {today: data.get(today, {})}
-        daymap = data.setdefault(today, {})
-        used = int(daymap.get(str(user_id), 0))
-        if used >= RANDOM_DAILY_LIMIT:
-            _save_quota(data)
+        ok, used = await state_call(state.quota_consume, _today_key(), user_id, RANDOM_DAILY_LIMIT)
+        if not ok:
             return False, 0, RANDOM_DAILY_LIMIT, _seconds_until_midnight_jkt()
-        daymap[str(user_id)] = used + 1
-        _save_quota(data)
-        remaining_after = max(0, RANDOM_DAILY_LIMIT - (used + 1))
+        remaining_after = max(0, RANDOM_DAILY_LIMIT - used)
         return True, remaining_after, RANDOM_DAILY_LIMIT, _seconds_until_midnight_jkt()
 
 # ================================
 # Utilitas
 # ================================
-USER_ACTIVITY_FILE = Path("data/user_activity.json")
-
-def load_user_activity():
-    if USER_ACTIVITY_FILE.exists():
-        with open(USER_ACTIVITY_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
-def save_user_activity(data):
-    with open(USER_ACTIVITY_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-
-def log_user_activity(user_id, username):
-    data = load_user_activity()
-    user = str(user_id)
-    if user not in data:
-        data[user] = {"username": username, "count": 0}
-    data[user]["count"] += 1
-    data[user]["username"] = username  # update username jika berubah
-    save_user_activity(data)
-
+def _percentile(values, q: float) -> float:
+    """Persentil sederhana (nearest-rank) dari list angka; 0 jika kosong."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))
+    return ordered[idx]
 
 def _safe_parse_ts(ts: str):
     """
@@ -250,14 +521,11 @@ def _safe_parse_ts(ts: str):
 # ======================
 # LOGGER SETUP
 # ======================
-import logging
-import colorlog
-from pathlib import Path
-from logging.handlers import RotatingFileHandler
 
-# Direktori log & data
-LOG_DIR = Path("logs"); LOG_DIR.mkdir(exist_ok=True)
-DATA_DIR = Path("data"); DATA_DIR.mkdir(exist_ok=True)
+# Direktori log & data (dibuat oleh setup_runtime, bukan saat import)
+LOG_DIR = Path("logs")
+DATA_DIR = Path("data")
+CONFIG_DIR = Path("config")
 
 # File log
 ACTIVITY_LOG = LOG_DIR / "bot_activity.log"
@@ -272,43 +540,230 @@ LOG_LEVEL = logging.INFO
 MAX_LOG_SIZE = 10 * 1024 * 1024  # 10 MB
 BACKUP_COUNT = 5
 
-# Formatter warna utk console
-console_formatter = colorlog.ColoredFormatter(
-    "%(log_color)s[%(asctime)s] [%(levelname)s]%(reset)s - %(message)s",
-    datefmt="%H:%M:%S",
-    log_colors={
-        "DEBUG": "cyan",
-        "INFO": "green",
-        "WARNING": "yellow",
-        "ERROR": "red",
-        "CRITICAL": "bold_red"
-    }
-)
+# Logger utama (handler dipasang oleh setup_logging)
+logger = logging.getLogger("BangsaBacolBot")
+logger.setLevel(LOG_LEVEL)
 
-# Handler console
-console_handler = colorlog.StreamHandler()
-console_handler.setFormatter(console_formatter)
+# Logging non-blocking: handler di event loop cuma memasukkan record ke antrean; tulis file,
+# rotasi, dan render console dikerjakan thread QueueListener.
+try:
+    LOG_QUEUE_SIZE = max(1, int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+except ValueError:
+    LOG_QUEUE_SIZE = 10000
+LOG_JSON = os.getenv("LOG_JSON", "0").strip().lower() in ("1", "true", "yes")   # file log jadi JSON lines
+LOG_DROPPED = metrics.counter("bot_log_dropped_total", "Record log yang dibuang karena antrean penuh")
 
-# Handler file (rotate otomatis)
-file_handler = RotatingFileHandler(
-    ACTIVITY_LOG, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT, encoding="utf-8"
-)
-file_formatter = logging.Formatter(
-    "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-)
-file_handler.setFormatter(file_formatter)
+class DroppingQueueHandler(logging.Handler):
+    """
+    Seperti logging.handlers.QueueHandler, tapi tidak pernah memblokir/melempar saat antrean
+    penuh: record dibuang dan dihitung (lebih baik kehilangan log daripada handler macet).
+    Pesan diformat di sini (args bisa berubah setelah dilepas), sisanya dirender listener.
+    """
 
-# Logger utama
-logger = logging.getLogger("BangsaBacolBot")
-logger.setLevel(LOG_LEVEL)
-logger.addHandler(console_handler)
-logger.addHandler(file_handler)
+    def __init__(self, q):
+        super().__init__()
+        self.queue = q
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        # konteks handler hanya terbaca di thread/task pemanggil, bukan di listener
+        trace = _current_trace.get()
+        if trace is not None:
+            record.handler, record.user_id = trace.handler, trace.user_id
+        return record
+
+    def emit(self, record):
+        try:
+            self.queue.put_nowait(self.prepare(record))
+        except queue.Full:
+            self.dropped += 1
+            LOG_DROPPED.inc()
+        except Exception:
+            self.handleError(record)
+
+class JsonLineFormatter(logging.Formatter):
+    """Satu objek JSON per baris: ts, level, logger, msg (+ exc, handler & user_id bila ada)."""
+
+    def format(self, record):
+        out = {
+            "ts": datetime.fromtimestamp(record.created).astimezone().isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        if getattr(record, "handler", None):
+            out["handler"], out["user_id"] = record.handler, record.user_id
+        return json.dumps(out, ensure_ascii=False)
+
+_log_queue_handler: DroppingQueueHandler | None = None
+_log_listener = None
+
+def setup_logging():
+    """Pasang pipeline log: antrean → listener (console berwarna + file rotate). Aman dipanggil berulang."""
+    global _log_queue_handler, _log_listener
+    if logger.handlers:
+        return
+    import colorlog   # lazy: baru dimuat saat pipeline log dipasang
+
+    # Formatter warna utk console
+    console_formatter = colorlog.ColoredFormatter(
+        "%(log_color)s[%(asctime)s] [%(levelname)s]%(reset)s - %(message)s",
+        datefmt="%H:%M:%S",
+        log_colors={
+            "DEBUG": "cyan",
+            "INFO": "green",
+            "WARNING": "yellow",
+            "ERROR": "red",
+            "CRITICAL": "bold_red"
+        }
+    )
+    console_handler = colorlog.StreamHandler()
+    console_handler.setFormatter(console_formatter)
+
+    # Handler file (rotate otomatis)
+    file_handler = RotatingFileHandler(
+        ACTIVITY_LOG, maxBytes=MAX_LOG_SIZE, backupCount=BACKUP_COUNT, encoding="utf-8"
+    )
+    file_handler.setFormatter(JsonLineFormatter() if LOG_JSON else logging.Formatter(
+        "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+    ))
+
+    class _Listener(QueueListener):
+        def enqueue_sentinel(self):
+            self.queue.put(self._sentinel)   # tunggu ada slot: antrean bisa penuh saat shutdown
+
+    _log_queue_handler = DroppingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    _log_listener = _Listener(_log_queue_handler.queue, console_handler, file_handler,
+                              respect_handler_level=True)
+    _log_listener.start()
+    atexit.register(stop_logging)
+    logger.addHandler(_log_queue_handler)
+
+    # Biar Pyrogram gak spam
+    logging.getLogger("pyrogram").setLevel(logging.WARNING)
+    logger.info("🚀 Logger initialized!" + (" (file: JSON lines)" if LOG_JSON else ""))
+
+def stop_logging():
+    """
+    Kosongkan antrean log ke file/console lalu hentikan thread listener (dipanggil saat shutdown).
+    Log sesudahnya ditulis langsung (sinkron) supaya pesan penutup tidak hilang.
+    """
+    global _log_listener
+    listener, _log_listener = _log_listener, None
+    if listener is None:
+        return
+    listener.stop()
+    logger.removeHandler(_log_queue_handler)
+    for h in listener.handlers:
+        h.flush()
+        logger.addHandler(h)
+
+def logging_health_lines() -> list[str]:
+    h = _log_queue_handler
+    if h is None:
+        return []
+    return [f"📝 Log queue {h.queue.qsize()}/{LOG_QUEUE_SIZE}, dibuang {h.dropped}"
+            + (" (JSON)" if LOG_JSON else "")]
+
+# --- Sampling log hot path ---
+# Aturan per jenis event (record dengan extra={"event": ...}); event lain selalu lolos.
+#   every:N → hanya event ke-1, N+1, 2N+1, ... yang ditulis
+#   rate:N  → maks N per detik; sisanya ditahan lalu diringkas dalam satu baris
+LOG_SAMPLING = os.getenv("LOG_SAMPLING", "start=rate:5,click=rate:5,tick=every:10")
+
+class LogSampler(logging.Filter):
+    """Filter logger: sampling 1-dari-N atau batas per detik per event, dengan hitungan yang ditahan."""
+
+    def __init__(self, spec: str = ""):
+        super().__init__()
+        self.rules: dict[str, tuple[str, int]] = {}
+        self.seen: dict[str, int] = defaultdict(int)
+        self.suppressed: dict[str, int] = defaultdict(int)      # total sejak start
+        self._window: dict[str, list] = {}                      # event -> [detik, lolos, ditahan, level]
+        for part in spec.split(","):
+            if "=" in part:
+                event, rule = part.split("=", 1)
+                try:
+                    self.set_rule(event.strip(), rule.strip())
+                except ValueError as e:
+                    logger.warning(f"LOG_SAMPLING diabaikan: {e}")
+
+    def set_rule(self, event: str, rule: str):
+        if rule in ("off", ""):
+            self.rules.pop(event, None)
+            return
+        mode, _, n = rule.partition(":")
+        if mode not in ("every", "rate") or not n.isdigit() or int(n) < 1:
+            raise ValueError(f"aturan '{event}={rule}' tidak valid (pakai every:N, rate:N, atau off)")
+        self.rules[event] = (mode, int(n))
+
+    def flush(self, force: bool = False):
+        """
+        Tulis ringkasan "N ditahan" untuk jendela rate yang sudah lewat (semua kalau force).
+        Dipanggil tiap detik oleh run(), jadi hitungan spike yang sudah berhenti tetap
+        dilaporkan tepat waktu, bukan menunggu record berikutnya dari event yang sama.
+        """
+        now = int(time.time())
+        for event, win in list(self._window.items()):
+            if win[2] and (force or win[0] != now):
+                held, win[2] = win[2], 0
+                at = datetime.fromtimestamp(win[0]).strftime("%H:%M:%S")
+                n = self.rules.get(event, ("rate", win[1]))[1]
+                logger.log(win[3], f"⏭️ {held} log '{event}' lain ditahan pada {at} (batas {n}/detik)")
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(1)
+            self.flush()
+
+    def describe(self) -> list[str]:
+        self.flush(force=True)
+        return [f"{ev}={mode}:{n} (lihat {self.seen[ev]}, ditahan {self.suppressed[ev]})"
+                for ev, (mode, n) in sorted(self.rules.items())]
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        event = getattr(record, "event", None)
+        rule = self.rules.get(event) if event else None
+        if rule is None:
+            return True
+        mode, n = rule
+        self.seen[event] += 1
+        if mode == "every":
+            if (self.seen[event] - 1) % n == 0:
+                if n > 1:
+                    record.msg = f"{record.msg} [sampel 1/{n}]"
+                return True
+            self.suppressed[event] += 1
+            return False
+        now = int(time.time())
+        win = self._window.get(event)
+        if win is None or win[0] != now:
+            if win and win[2]:
+                self.flush()   # ringkasan detik sebelumnya, kalau run() belum sempat menulisnya
+            win = self._window[event] = [now, 0, 0, record.levelno]
+        if win[1] < n:
+            win[1] += 1
+            return True
+        win[2] += 1
+        self.suppressed[event] += 1
+        return False
 
-# Biar Pyrogram gak spam
-logging.getLogger("pyrogram").setLevel(logging.WARNING)
+log_sampler = LogSampler(LOG_SAMPLING)
+logger.addFilter(log_sampler)
 
-# Contoh log awal
-logger.info("🚀 Logger initialized!")
+def setup_runtime():
+    """Side effect startup yang dulu jalan saat import: buat folder kerja lalu pasang logging."""
+    for d in (LOG_DIR, DATA_DIR, CONFIG_DIR):
+        d.mkdir(exist_ok=True)
+    setup_logging()
 
 # ================================
 # Konfigurasi Lingkungan
@@ -333,19 +788,18 @@ def is_admin(message) -> bool:
     uid = message.from_user.id if message.from_user else 0
     return (uid == OWNER_ID) or (uid in ADMIN_IDS)
 
-def is_starlord(user_id: int) -> bool:
-    data = load_user_data()
-    badge = normalize_badge(data.get(str(user_id), {}).get("badge", ""))
+async def is_starlord(user_id: int) -> bool:
+    badge = normalize_badge((await get_user_record(user_id)).get("badge", ""))
     return badge == BADGE_STARLORD
 
-def has_stellar_or_higher(user_id: int) -> bool:
-    data = load_user_data()
-    badge = normalize_badge(data.get(str(user_id), {}).get("badge", ""))
+async def has_stellar_or_higher(user_id: int) -> bool:
+    badge = normalize_badge((await get_user_record(user_id)).get("badge", ""))
     return badge in (BADGE_STELLAR, BADGE_STARLORD)
 
 # ================================
 # Daftar Bot Mirror
 # ================================
+# Tiap mirror bisa menjalankan subset fitur lewat env BOT_FEATURES (lihat FEATURES).
 BOT_MIRRORS = [
     {"role": "Bot Utama", "name": "🤖 Bangsa Bacol Bot", "username": "BangsaBacolBot"},
     {"role": "Bot Mirror", "name": "🤖 Koleksi Bangsa | Stephander", "username": "Bangsa_BacolBot"},
@@ -359,19 +813,133 @@ except ValueError:
     RETENTION_DAYS = 7
 
 # ================================
-# Config Loader: Badwords & Interaction
+# Fitur per Deployment
 # ================================
-import re, json, urllib.request
-from pathlib import Path
-from urllib.parse import urlparse
+# Handler tidak langsung menempel ke `app`; dikumpulkan per fitur lalu dipasang saat startup
+# sesuai BOT_FEATURES, mis. bot mirror "Bot Lapor" cukup BOT_FEATURES=lapor.
+FEATURES = {
+    "core": "/start, /help, /panduan, /helper, /about, /bot, /ping, /joinvip, fallback",
+    "catalog": "verifikasi koleksi, /list, /random, /trending, /quota, /search, /add, /delete",
+    "moderation": "/warn, /mute, /ban, /kick, /del, /modlog, anti-link & badwords, sambutan member baru",
+    "xp": "/profile, /top, /reset_top",
+    "lapor": "/lapor, /batal, /lapor_flush + antrian laporan",
+    "polls": "/request, vote, /hasil_request",
+    "dashboard": "/stats, /log, /dashboard, /report, /cohort, /funnel, /prune_logs",
+    "health": "/healthcheck, /outbox, /perf, /cachestats, /loglevel, /logsample, endpoint metrics & watchdog event loop",
+    "interaction": "pesan periodik ke grup, /reload_interaction",
+}
+
+class FeatureRegistry:
+    """
+    Kumpulan handler per fitur. Dekoratornya meniru app.on_message / app.on_callback_query,
+    tapi handler baru didaftarkan ke client lewat install() untuk fitur yang aktif saja.
+    Urutan definisi dipertahankan (penting untuk handler di group yang sama).
+    """
+
+    def __init__(self, names):
+        self.names = tuple(names)
+        self.enabled: set[str] = set(self.names)
+        self.handlers: list[tuple[str, object, int]] = []   # (fitur, handler pyrogram, group)
+
+    def _add(self, feature: str, handler, group: int):
+        if feature not in self.names:
+            raise ValueError(f"Fitur tidak dikenal: {feature}")
+        self.handlers.append((feature, handler, group))
+
+    def on_message(self, feature: str, filters_=None, group: int = 0):
+        def decorator(func):
+            self._add(feature, MessageHandler(func, filters_), group)
+            return func
+        return decorator
+
+    def on_callback_query(self, feature: str, filters_=None, group: int = 0):
+        def decorator(func):
+            self._add(feature, CallbackQueryHandler(func, filters_), group)
+            return func
+        return decorator
+
+    def configure(self, spec: str | None) -> set[str]:
+        """spec: "all" (default) atau daftar dipisah koma. "core" selalu aktif."""
+        spec = (spec or "all").strip().lower()
+        if spec in ("", "all", "*"):
+            self.enabled = set(self.names)
+            return self.enabled
+        wanted = {x.strip() for x in spec.split(",") if x.strip()}
+        unknown = wanted - set(self.names)
+        if unknown:
+            logger.warning(f"BOT_FEATURES: fitur tidak dikenal diabaikan: {', '.join(sorted(unknown))}")
+        self.enabled = (wanted & set(self.names)) | {"core"}
+        return self.enabled
+
+    def __contains__(self, feature: str) -> bool:
+        return feature in self.enabled
+
+    def install(self, client) -> int:
+        n = 0
+        for feature, handler, group in self.handlers:
+            if feature in self.enabled:
+                client.add_handler(handler, group)
+                n += 1
+        return n
+
+    def summary(self) -> str:
+        return ", ".join(f for f in self.names if f in self.enabled)
+
+    def lazy(self, feature: str, factory) -> "FeatureObject":
+        """Objek milik satu fitur, baru dibuat saat pertama dipakai. Fitur nonaktif tidak pernah membayar."""
+        if feature not in self.names:
+            raise ValueError(f"Fitur tidak dikenal: {feature}")
+        return FeatureObject(self, feature, factory)
+
+class FeatureObject:
+    """
+    Proxy tipis: atribut diteruskan ke objek asli yang dibangun factory pada akses pertama
+    (thread-safe, karena sebagian dipakai dari to_thread). `loaded` dipakai flush/shutdown
+    supaya tidak membangun objek hanya untuk menyimpannya. Akses saat fiturnya nonaktif
+    ditolak (RuntimeError): call site di fitur lain wajib cek `"<fitur>" in features` dulu.
+    """
+
+    __slots__ = ("registry", "feature", "_factory", "_obj", "_lock")
+
+    def __init__(self, registry: FeatureRegistry, feature: str, factory):
+        self.registry = registry
+        self.feature = feature
+        self._factory = factory
+        self._obj = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._obj is not None
+
+    def get(self):
+        obj = self._obj
+        if obj is None:
+            if self.feature not in self.registry:
+                raise RuntimeError(f"Fitur '{self.feature}' nonaktif di deployment ini")
+            with self._lock:
+                if self._obj is None:
+                    self._obj = self._factory()
+                obj = self._obj
+        return obj
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+features = FeatureRegistry(FEATURES)
 
+# ================================
+# Config Loader: Badwords & Interaction
+# ================================
 # --- Variabel global ---
-CONFIG_DIR = Path("config")
-CONFIG_DIR.mkdir(exist_ok=True)
 
 BADWORDS_CONFIG_URL = os.getenv("BADWORDS_CONFIG_URL")
 BADWORDS_FILE = CONFIG_DIR / "badwords.json"
 INTERACTION_FILE = CONFIG_DIR / "interaction.json"
+# Salinan terakhir config remote yang berhasil di-fetch (last-known-good), dipakai saat startup
+BADWORDS_CACHE_FILE = CONFIG_DIR / "badwords.remote.json"
+INTERACTION_CACHE_FILE = CONFIG_DIR / "interaction.remote.json"
+REMOTE_CONFIG_TIMEOUT = 10
 
 BAD_WORDS: set[str] = set()
 BAD_WORDS_RE: re.Pattern = re.compile(r"(?!x)x")  # dummy regex
@@ -383,7 +951,13 @@ INTERACTION_CONFIG: dict = {
 }
 
 # --- Helper ---
+# Regex hasil kompilasi per isi daftar kata: refresh config yang isinya tidak berubah tidak compile ulang
+CONFIG_CACHE = TTLCache("config", maxsize=8, ttl=24 * 3600)
+
 def _build_badwords_regex(words: set[str]) -> re.Pattern:
+    return CONFIG_CACHE.get_or_compute(("badwords_re", frozenset(words)), lambda: _compile_badwords_regex(words))
+
+def _compile_badwords_regex(words: set[str]) -> re.Pattern:
     cleaned = [w.strip() for w in words if isinstance(w, str) and w.strip()]
     if not cleaned:
         return re.compile(r"(?!x)x")  # selalu false
@@ -404,28 +978,59 @@ def is_allowed_domain(url: str) -> bool:
         return False
 
 # --- Loader ---
-def load_badwords_config():
+def fetch_remote_config(url: str, cache_file: Path) -> dict | None:
+    """GET config JSON remote; kalau valid, simpan sebagai last-known-good di cache_file."""
+    import urllib.request   # lazy: hanya dipakai kalau config remote di-set
+    try:
+        logger.info(f"🔄 Fetching config dari {url}")
+        with urllib.request.urlopen(url, timeout=REMOTE_CONFIG_TIMEOUT) as resp:
+            data = json.loads(resp.read().decode("utf-8"))
+    except Exception as e:
+        logger.warning(f"Gagal fetch remote config {url}: {e}")
+        return None
+    if not isinstance(data, dict):
+        logger.warning(f"Config remote {url} bukan objek JSON, diabaikan.")
+        return None
+    try:
+        tmp = cache_file.with_suffix(".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, cache_file)
+    except Exception as e:
+        logger.warning(f"Gagal simpan cache {cache_file}: {e}")
+    return data
+
+def read_local_config(*paths: Path | None) -> dict | None:
+    """Isi file JSON pertama yang ada & valid dari daftar path (None dilewati)."""
+    for path in paths:
+        if path is None or not path.exists():
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if isinstance(data, dict):
+                return data
+        except Exception as e:
+            logger.warning(f"Gagal baca {path}: {e}")
+    return None
+
+def load_badwords_config(remote: bool = True):
+    """
+    Urutan sumber: remote → cache remote terakhir → file lokal → bawaan.
+    remote=False melewati fetch jaringan (dipakai saat startup; refresh jalan di background).
+    """
     global BAD_WORDS, BAD_WORDS_RE, ALLOWED_LINK_DOMAINS
 
     remote_url = os.getenv("BADWORDS_CONFIG_URL", "").strip()
     data = None
 
     # 1) Remote
-    if remote_url:
-        try:
-            logger.info(f"🔄 Fetching badwords config dari {remote_url}")
-            with urllib.request.urlopen(remote_url, timeout=10) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
-        except Exception as e:
-            logger.warning(f"Gagal fetch remote config: {e}. Coba lokal...")
+    if remote and remote_url:
+        data = fetch_remote_config(remote_url, BADWORDS_CACHE_FILE)
 
-    # 2) Lokal
-    if data is None and BADWORDS_FILE.exists():
-        try:
-            with open(BADWORDS_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
-        except Exception as e:
-            logger.warning(f"Gagal baca {BADWORDS_FILE}: {e}")
+    # 2) Cache remote / lokal
+    if data is None:
+        data = read_local_config(BADWORDS_CACHE_FILE if remote_url else None, BADWORDS_FILE)
 
     # 3) Default
     if data is None:
@@ -483,18 +1088,15 @@ INTERACTION_FILE = Path("config") / "interaction.json"
 INTERACTION_MESSAGES = [...]
 INTERACTION_INTERVAL_MINUTES = 180
 
-def load_interaction_config():
-    """Load pesan periodik dari URL remote atau file lokal"""
+def load_interaction_config(remote: bool = True):
+    """Load pesan periodik: URL remote → cache remote terakhir → file lokal (remote=False: tanpa fetch)."""
     global INTERACTION_MESSAGES, INTERACTION_INTERVAL_MINUTES
-    data = {}
+    data = None
     try:
-        if INTERACTION_CONFIG_URL:
-            logger.info(f"🔄 Fetching interaction config dari {INTERACTION_CONFIG_URL}")
-            with urllib.request.urlopen(INTERACTION_CONFIG_URL, timeout=10) as resp:
-                data = json.loads(resp.read().decode("utf-8"))
-        elif INTERACTION_FILE.exists():
-            with open(INTERACTION_FILE, "r", encoding="utf-8") as f:
-                data = json.load(f)
+        if remote and INTERACTION_CONFIG_URL:
+            data = fetch_remote_config(INTERACTION_CONFIG_URL, INTERACTION_CACHE_FILE)
+        if data is None:
+            data = read_local_config(INTERACTION_CACHE_FILE if INTERACTION_CONFIG_URL else None, INTERACTION_FILE) or {}
 
         msgs = data.get("interaction_messages", [])
         if msgs and isinstance(msgs, list):
@@ -549,6 +1151,7 @@ def load_warn_db():
     else:
         WARN_DB = {}
 
+@timed_persist("warnings")
 def save_warn_db():
     try:
         with open(WARN_DB_FILE, "w", encoding="utf-8") as f:
@@ -558,23 +1161,15 @@ def save_warn_db():
 
 async def add_warn(chat_id: int, user_id: int, by_id: int, reason: str = "") -> int:
     async with WARN_LOCK:
-        chat = str(chat_id); user = str(user_id)
-        WARN_DB.setdefault(chat, {}).setdefault(user, {"count": 0, "history": []})
-        rec = WARN_DB[chat][user]
-        rec["count"] += 1
-        rec["history"].append({"ts": datetime.now(JAKARTA_TZ).isoformat(), "by": by_id, "reason": reason or "-"})
-        return rec["count"]
+        entry = {"ts": datetime.now(JAKARTA_TZ).isoformat(), "by": by_id, "reason": reason or "-"}
+        return await state_call(state.warn_add, chat_id, user_id, entry)
 
-def get_warn_count(chat_id: int, user_id: int) -> int:
-    chat = str(chat_id); user = str(user_id)
-    return WARN_DB.get(chat, {}).get(user, {}).get("count", 0)
+async def get_warn_count(chat_id: int, user_id: int) -> int:
+    return await state_call(state.warn_count, chat_id, user_id)
 
 async def clear_warns(chat_id: int, user_id: int):
     async with WARN_LOCK:
-        chat = str(chat_id); user = str(user_id)
-        if chat in WARN_DB and user in WARN_DB[chat]:
-            WARN_DB[chat][user] = {"count": 0, "history": []}
-            save_warn_db()
+        await state_call(state.warn_clear, chat_id, user_id)
 
 async def apply_auto_action(client: Client, chat_id: int, user_id: int, count: int):
     """Auto mute jika melampaui threshold."""
@@ -592,6 +1187,13 @@ async def apply_auto_action(client: Client, chat_id: int, user_id: int, count: i
         except Exception as e:
             logger.error(f"Gagal mute user {user_id} di {chat_id}: {e}")
 
+MOD_LOG_MAX_BYTES = MAX_LOG_SIZE
+MOD_AUDIT_DB = Path(os.getenv("MOD_AUDIT_DB", str(DATA_DIR / "modlog.db")))
+try:
+    MOD_AUDIT_RETENTION_DAYS = max(1, int(os.getenv("MOD_AUDIT_RETENTION_DAYS", "365")))
+except ValueError:
+    MOD_AUDIT_RETENTION_DAYS = 365
+
 def _modlog_line(action, moderator, target, reason: str | None = None, extra: str | None = None) -> str:
     t = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     mod = f"{moderator.id}(@{moderator.username or 'unknown'})" if moderator else "system"
@@ -603,12 +1205,174 @@ def _modlog_line(action, moderator, target, reason: str | None = None, extra: st
         base += f" | {extra}"
     return base + "\n"
 
-def mod_log(line: str):
+_MODLOG_LINE_RE = re.compile(
+    r"^\[(?P<ts>[\d\- :]+)\] (?P<action>\S+) by (?P<mod>.+?) → (?P<tgt>.+?)"
+    r"(?: \| reason: (?P<reason>.*?))?(?: \| (?P<extra>[^|]*))?$"
+)
+_MODLOG_USER_RE = re.compile(r"^(-?\d+)\(@(.*)\)$")
+
+def _mod_username(name: str | None) -> str | None:
+    """Username target untuk index; user tanpa username disimpan NULL (bukan "unknown")."""
+    name = (name or "").lower()
+    return None if name in ("", "unknown") else name
+
+class ModAuditStore:
+    """
+    Audit moderasi terstruktur di SQLite (WAL), terpisah dari state store. Index per target
+    (target_id, ts) dan per chat (chat_id, ts) membuat riwayat satu user / satu grup cukup
+    satu range scan, berapa pun besar tabelnya. Event lebih tua dari MOD_AUDIT_RETENTION_DAYS
+    dibuang oleh prune(). logs/mod_action.log (teks) tetap ditulis untuk dibaca manusia.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS mod_events (
+            id INTEGER PRIMARY KEY,
+            ts INTEGER NOT NULL,
+            chat_id INTEGER,
+            action TEXT NOT NULL,
+            actor_id INTEGER,
+            actor_name TEXT,
+            target_id INTEGER,
+            target_name TEXT,
+            reason TEXT,
+            extra TEXT
+        );
+        CREATE INDEX IF NOT EXISTS mod_events_target ON mod_events (target_id, ts);
+        CREATE INDEX IF NOT EXISTS mod_events_chat ON mod_events (chat_id, ts);
+        CREATE INDEX IF NOT EXISTS mod_events_target_name ON mod_events (target_name, ts);
+        CREATE INDEX IF NOT EXISTS mod_events_ts ON mod_events (ts);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+    COLUMNS = ("id", "ts", "chat_id", "action", "actor_id", "actor_name", "target_id", "target_name", "reason", "extra")
+
+    def __init__(self, path: Path = MOD_AUDIT_DB):
+        self.path = Path(path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()
+
+    def warmup(self):
+        with self._lock:
+            self._db()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            _ensure_parent_dir(self.path)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(self.SCHEMA)
+            # impor lama menyimpan "unknown" untuk user tanpa username → /modlog @unknown salah sasaran
+            conn.execute("UPDATE mod_events SET target_name = NULL WHERE target_name IN ('unknown', '')")
+            self._conn = conn
+            self._import_text_log(conn)
+        return self._conn
+
+    def _import_text_log(self, db):
+        """Sekali saja: pindahkan riwayat logs/mod_action.log lama (tanpa chat_id) ke tabel."""
+        if db.execute("SELECT 1 FROM meta WHERE key = 'text_imported'").fetchone():
+            return
+        rows = []
+        if MOD_LOG.exists():
+            with open(MOD_LOG, "r", encoding="utf-8", errors="replace") as f:
+                for ln in f:
+                    m = _MODLOG_LINE_RE.match(ln.rstrip("\n"))
+                    if not m:
+                        continue
+                    try:
+                        ts = int(datetime.strptime(m["ts"], "%Y-%m-%d %H:%M:%S").timestamp())
+                    except ValueError:
+                        continue
+                    actor = _MODLOG_USER_RE.match(m["mod"])
+                    target = _MODLOG_USER_RE.match(m["tgt"])
+                    rows.append((
+                        ts, None, m["action"],
+                        int(actor[1]) if actor else None, actor[2].lower() if actor else m["mod"],
+                        int(target[1]) if target else None, _mod_username(target[2]) if target else None,
+                        m["reason"], m["extra"],
+                    ))
+        db.execute("BEGIN IMMEDIATE")
+        db.executemany(
+            "INSERT INTO mod_events (ts, chat_id, action, actor_id, actor_name, target_id, target_name, reason, extra)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows,
+        )
+        db.execute("INSERT INTO meta (key, value) VALUES ('text_imported', ?)", (datetime.now().isoformat(),))
+        db.execute("COMMIT")
+        if rows:
+            logger.info(f"🛡️ {len(rows)} baris {MOD_LOG} diimpor ke {self.path}.")
+
+    @timed_persist("mod_audit")
+    def record(self, action: str, chat_id, moderator, target, reason: str | None = None, extra: str | None = None):
+        with self._lock:
+            self._db().execute(
+                "INSERT INTO mod_events (ts, chat_id, action, actor_id, actor_name, target_id, target_name, reason, extra)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    int(time.time()), chat_id, action,
+                    moderator.id if moderator else None,
+                    (moderator.username or "").lower() if moderator else "system",
+                    target.id if target else None,
+                    _mod_username(target.username) if target else None,
+                    reason or None, extra,
+                ),
+            )
+
+    def _select(self, where: str, args: tuple, limit: int) -> list[dict]:
+        sql = f"SELECT {', '.join(self.COLUMNS)} FROM mod_events WHERE {where} ORDER BY ts DESC, id DESC LIMIT ?"
+        with self._lock:
+            rows = self._db().execute(sql, args + (limit,)).fetchall()
+        return [dict(zip(self.COLUMNS, r)) for r in rows]
+
+    @timed_read("mod_audit")
+    def for_target(self, target_id: int | None = None, username: str | None = None,
+                   chat_id=None, limit: int = 20) -> list[dict]:
+        if target_id is not None:
+            where, args = "target_id = ?", (target_id,)
+        else:
+            where, args = "target_name = ?", (username.lstrip("@").lower(),)
+        if chat_id is not None:
+            where, args = where + " AND chat_id = ?", args + (chat_id,)
+        return self._select(where, args, limit)
+
+    @timed_read("mod_audit")
+    def for_chat(self, chat_id, limit: int = 20) -> list[dict]:
+        return self._select("chat_id = ?", (chat_id,), limit)
+
+    @timed_persist("mod_audit")
+    def prune(self, retention_days: int = MOD_AUDIT_RETENTION_DAYS) -> int:
+        cutoff = int(time.time()) - retention_days * 86400
+        with self._lock:
+            cur = self._db().execute("DELETE FROM mod_events WHERE ts < ?", (cutoff,))
+        return cur.rowcount
+
+mod_audit = features.lazy("moderation", ModAuditStore)
+
+_MOD_LOG_LOCK = threading.Lock()   # rotasi + append dari beberapa thread sekaligus
+
+def _write_mod_log(action: str, chat_id, moderator, target, reason: str | None = None, extra: str | None = None):
     try:
-        with open(MOD_LOG, "a", encoding="utf-8") as f:
-            f.write(line)
+        # buka DB dulu: impor satu kali mod_action.log tidak boleh ikut menyalin baris yang baru ditulis
+        mod_audit.warmup()
+    except Exception as e:
+        logger.error(f"mod_audit error: {e}")
+    try:
+        with _MOD_LOG_LOCK:
+            disk_governor.rotate(MOD_LOG, MOD_LOG_MAX_BYTES)   # segmen bertanggal, dikompres & dibuang governor
+            with open(MOD_LOG, "a", encoding="utf-8") as f:
+                f.write(_modlog_line(action, moderator, target, reason, extra))
     except Exception as e:
         logger.error(f"mod_log error: {e}")
+    try:
+        mod_audit.record(action, chat_id, moderator, target, reason, extra)
+    except Exception as e:
+        logger.error(f"mod_audit error: {e}")
+
+async def mod_log(action: str, chat_id, moderator, target, reason: str | None = None, extra: str | None = None):
+    """
+    Catat aksi moderasi: baris teks (logs/mod_action.log, dirotasi) + event terstruktur (mod_audit).
+    Rotasi, append, dan INSERT SQLite jalan di thread: banjir spam yang memicu AUTO_* tidak
+    menahan event loop.
+    """
+    await asyncio.to_thread(_write_mod_log, action, chat_id, moderator, target, reason, extra)
 
 # --- Mute/Kick/Ban helpers ---
 
@@ -660,6 +1424,7 @@ def _parse_duration_to_seconds(s: str | None, default: int = 30 * 60) -> int:
 
 def load_stream_map():
     global STREAM_MAP
+    LIST_PAGE_CACHE.invalidate()
     if not STREAM_MAP_FILE.exists():
         logger.warning(f"Berkas '{STREAM_MAP_FILE}' tidak ditemukan. Memulai dengan map kosong.")
         STREAM_MAP = {}
@@ -672,7 +1437,9 @@ def load_stream_map():
         STREAM_MAP = {}
     return STREAM_MAP
 
+@timed_persist("stream_map")
 def save_stream_map():
+    LIST_PAGE_CACHE.invalidate()
     with open(STREAM_MAP_FILE, "w", encoding="utf-8") as f:
         json.dump(STREAM_MAP, f, indent=4, ensure_ascii=False)
     logger.info("Stream map disimpan.")
@@ -690,124 +1457,633 @@ def search_codes(query: str):
     return [c for c in STREAM_MAP.keys() if q in c.lower()]
 
 # --- Click Logging ---
+# Format click log untuk analitik: "jsonl" (bawaan), "binary", atau "both" (tulis dua-duanya,
+# baca dari biner — berguna saat migrasi). logs/clicks_human.log selalu ditulis.
+CLICK_LOG_FORMAT = os.getenv("CLICK_LOG_FORMAT", "jsonl").strip().lower()
+if CLICK_LOG_FORMAT not in ("jsonl", "binary", "both"):
+    CLICK_LOG_FORMAT = "jsonl"
+CLICKS_BIN = LOG_DIR / "clicks.bin"
+CLICKS_CODES = LOG_DIR / "clicks.codes.json"
+
+def _click_log_binary() -> bool:
+    return CLICK_LOG_FORMAT in ("binary", "both")
+
+def _click_log_jsonl() -> bool:
+    return CLICK_LOG_FORMAT in ("jsonl", "both")
+
+@contextmanager
+def click_log_lock(path: Path, exclusive: bool):
+    """
+    Kunci click log antar proses/thread (sidecar <nama>.lock): append memegang kunci
+    bersama (boleh paralel, O_APPEND), prune/tulis ulang memegang kunci eksklusif selama
+    salin + replace supaya tidak ada record baru yang jatuh ke file lama lalu hilang.
+    Jangan di-nest: flock kedua di proses yang sama menunggu kunci pertama.
+    """
+    _ensure_parent_dir(path)
+    with open(path.with_suffix(".lock"), "a") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+class BinaryClickLog:
+    """
+    Click log biner dengan record lebar tetap 16 byte: epoch detik (u32), user_id (i64),
+    id kode (u32). Kode di-intern ke sidecar JSON (list; index = id), jadi tiap event
+    tidak lagi menyimpan timestamp ISO, username, dan link lengkap.
+
+    Record hanya ditambahkan di akhir (urut waktu), sehingga pembaca bisa mmap file lalu
+    binary search ke cutoff periode tanpa mem-parse record lama. Dengan NumPy, file yang
+    sama bisa langsung dibaca sebagai structured array (`to_numpy`).
+    """
+
+    RECORD = struct.Struct("<IqI")
+    NUMPY_DTYPE = [("ts", "<u4"), ("user_id", "<i8"), ("code", "<u4")]
+
+    def __init__(self, path: Path = CLICKS_BIN, codes_path: Path = CLICKS_CODES):
+        self.path = path
+        self.codes_path = codes_path
+        self._codes: list[str] | None = None
+        self._ids: dict[str, int] = {}
+
+    # --- sidecar kode ---
+
+    def _read_codes(self):
+        codes = []
+        try:
+            if self.codes_path.exists():
+                with open(self.codes_path, "r", encoding="utf-8") as f:
+                    codes = [str(c) for c in json.load(f)]
+        except Exception as e:
+            logger.error(f"Gagal membaca {self.codes_path}: {e}")
+        self._codes = codes
+        self._ids = {c: i for i, c in enumerate(codes)}
+
+    @property
+    def codes(self) -> list[str]:
+        if self._codes is None:
+            self._read_codes()
+        return self._codes
+
+    def code_id(self, code: str) -> int:
+        cid = self._ids.get(code) if self._codes is not None else None
+        if cid is not None:
+            return cid
+        _ensure_parent_dir(self.codes_path)
+        with open(self.codes_path.with_suffix(".lock"), "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            # baca ulang di dalam kunci: proses bot lain mungkin sudah menambah kode ini
+            self._read_codes()
+            if code not in self._ids:
+                self._ids[code] = len(self._codes)
+                self._codes.append(code)
+                tmp = self.codes_path.with_suffix(".json.tmp")
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self._codes, f, ensure_ascii=False)
+                os.replace(tmp, self.codes_path)
+            return self._ids[code]
+
+    def code_name(self, cid: int) -> str:
+        if cid >= len(self.codes):
+            self._read_codes()   # id baru dari proses lain
+        # sidecar basi (mis. ditulis ulang proses lain) → placeholder, bukan IndexError
+        return self._codes[cid] if cid < len(self._codes) else f"#{cid}"
+
+    # --- tulis ---
+
+    def _locked(self, exclusive: bool):
+        return click_log_lock(self.path, exclusive)
+
+    def pack(self, ts: float, user_id, code: str) -> bytes:
+        return self.RECORD.pack(int(ts), int(user_id or 0), self.code_id(code))
+
+    def append(self, ts: float, user_id, code: str):
+        rec = self.pack(ts, user_id, code)
+        with self._locked(exclusive=False), open(self.path, "ab") as f:
+            f.write(rec)   # O_APPEND: 16 byte tetap utuh walau beberapa proses menulis
+
+    def write_all(self, events):
+        """Tulis ulang file dari iterable (ts, user_id, code) yang sudah urut waktu (atomic replace)."""
+        tmp = self.path.with_suffix(".bin.tmp")
+        n = 0
+        with self._locked(exclusive=True):
+            with open(tmp, "wb") as f:
+                for ts, uid, code in events:
+                    f.write(self.pack(ts, uid, code))
+                    n += 1
+            os.replace(tmp, self.path)
+        return n
+
+    # --- baca ---
+
+    @contextmanager
+    def _mapped(self):
+        """memoryview atas record utuh (ekor yang terpotong karena crash diabaikan)."""
+        size = self.path.stat().st_size if self.path.exists() else 0
+        usable = size - size % self.RECORD.size
+        if usable <= 0:
+            yield memoryview(b"")
+            return
+        with open(self.path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            view = memoryview(mm)[:usable]
+            try:
+                yield view
+            finally:
+                view.release()
+
+    def _first_at_or_after(self, view, ts: float) -> int:
+        """Index record pertama dengan epoch >= ts (binary search)."""
+        lo, hi = 0, len(view) // self.RECORD.size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.RECORD.unpack_from(view, mid * self.RECORD.size)[0] < ts:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def iter_events(self, since: float = 0.0):
+        """Yield (epoch, user_id, code) untuk event sejak `since`."""
+        with self._mapped() as view:
+            start = self._first_at_or_after(view, since) * self.RECORD.size if since else 0
+            names = self.codes
+            for ts, uid, cid in self.RECORD.iter_unpack(view[start:]):
+                if cid >= len(names):
+                    name = self.code_name(cid)   # reload sidecar sekali, lalu pakai list barunya
+                    names = self.codes
+                    yield ts, uid, name
+                else:
+                    yield ts, uid, names[cid]
+
+    def to_numpy(self, since: float = 0.0):
+        """Structured array (ts, user_id, code) via np.memmap; None kalau NumPy tidak terpasang."""
+        try:
+            import numpy as np
+        except ImportError:
+            return None
+        size = self.path.stat().st_size if self.path.exists() else 0
+        count = size // self.RECORD.size
+        if count == 0:
+            return np.zeros(0, dtype=self.NUMPY_DTYPE)
+        arr = np.memmap(self.path, dtype=self.NUMPY_DTYPE, mode="r", shape=(count,))
+        return arr[int(np.searchsorted(arr["ts"], since)):] if since else arr
+
+    def stats(self) -> dict:
+        size = self.path.stat().st_size if self.path.exists() else 0
+        return {"exists": self.path.exists(), "size": size, "records": size // self.RECORD.size,
+                "codes": len(self.codes)}
+
+    def prune(self, cutoff: float):
+        """Buang record sebelum cutoff: cari batas dengan binary search, salin sisanya (atomic)."""
+        if not self.path.exists():
+            return
+        tmp = self.path.with_suffix(".bin.tmp")
+        with self._locked(exclusive=True):
+            with self._mapped() as view:
+                start = self._first_at_or_after(view, cutoff) * self.RECORD.size
+                if start == 0:
+                    return
+                with open(tmp, "wb") as f:
+                    f.write(view[start:])
+            os.replace(tmp, self.path)
+
+click_log_bin = BinaryClickLog()
+
+def _iter_clicks_jsonl(since: float = 0.0, stats: dict | None = None, path: Path = CLICKS_JSONL):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            s = line.strip()
+            if not s:
+                continue
+            try:
+                row = json.loads(s)
+            except json.JSONDecodeError:
+                if stats is not None: stats["errors"] += 1
+                continue
+            dt = _safe_parse_ts(row.get("ts", ""))
+            if not dt:
+                if stats is not None: stats["errors"] += 1
+                continue
+            ts = dt.timestamp()
+            if ts < since:
+                continue
+            code = row.get("code") or row.get("link_key") or row.get("video_key") or "unknown"
+            yield ts, row.get("user_id"), code
+
+def click_log_exists() -> bool:
+    return (CLICKS_BIN if _click_log_binary() else CLICKS_JSONL).exists()
+
+def iter_click_events(since: float = 0.0, stats: dict | None = None):
+    """
+    Yield (epoch, user_id, code) dari click log aktif sejak `since`.
+    `stats` (opsional) diisi jumlah baris rusak di key "errors" (hanya JSONL).
+    """
+    if _click_log_binary():
+        return click_log_bin.iter_events(since)
+    return _iter_clicks_jsonl(since, stats)
+
+def convert_clicks_jsonl(src: Path = CLICKS_JSONL, log: BinaryClickLog = click_log_bin) -> int:
+    """Konversi clicks.jsonl → clicks.bin + sidecar kode, diurutkan waktu. Return jumlah event."""
+    if not src.exists():
+        return 0
+    events = []
+    for ts, uid, code in _iter_clicks_jsonl(path=src):
+        try:
+            events.append((int(ts), int(uid or 0), str(code)))
+        except (TypeError, ValueError):
+            continue
+    events.sort(key=lambda e: e[0])
+    n = log.write_all(events)
+    logger.info(f"🗜️ {src} dikonversi: {n} event → {log.path} ({len(log.codes)} kode)")
+    return n
+
+# Naik setiap ada klik baru; snapshot dashboard dihitung ulang kalau nilainya berubah
+CLICK_LOG_VERSION = 0
 
+@timed_persist("click_log")
 def append_click_log(user_id, username, code, link):
     """
-    Tulis event klik ke dua format:
-    - JSONL (analitik/dashboard) → logs/clicks.jsonl
+    Tulis event klik ke:
+    - JSONL (analitik/dashboard) → logs/clicks.jsonl, dan/atau
+    - biner (CLICK_LOG_FORMAT=binary|both) → logs/clicks.bin
     - Human-readable (monitoring cepat) → logs/clicks_human.log
     """
-    ts_human = datetime.now(JAKARTA_TZ).strftime("%Y-%m-%d %H:%M:%S")
+    global CLICK_LOG_VERSION
+    CLICK_LOG_VERSION += 1
+    now = datetime.now(JAKARTA_TZ)
+    ts_human = now.strftime("%Y-%m-%d %H:%M:%S")
     uname = f"@{username}" if username else "(unknown)"
     line = f"[{ts_human}] User {user_id} ({uname}) klik: {code} → {link}\n"
 
-    event = {
-        "ts": datetime.now(JAKARTA_TZ).isoformat(),
-        "user_id": user_id,
-        "username": username or None,
-        "code": code,
-        "link": link,
-    }
-    try:
-        with open(CLICKS_JSONL, "a", encoding="utf-8") as f:
-            f.write(json.dumps(event, ensure_ascii=False) + "\n")
-    except Exception as e:
-        logger.error(f"Gagal menulis clicks.jsonl: {e}")
+    if _click_log_jsonl():
+        event = {
+            "ts": now.isoformat(),
+            "user_id": user_id,
+            "username": username or None,
+            "code": code,
+            "link": link,
+        }
+        try:
+            with click_log_lock(CLICKS_JSONL, exclusive=False), open(CLICKS_JSONL, "a", encoding="utf-8") as f:
+                f.write(json.dumps(event, ensure_ascii=False) + "\n")
+        except Exception as e:
+            logger.error(f"Gagal menulis clicks.jsonl: {e}")
+    if _click_log_binary():
+        try:
+            click_log_bin.append(now.timestamp(), user_id, code)
+        except Exception as e:
+            logger.error(f"Gagal menulis clicks.bin: {e}")
     try:
-        with open(CLICKS_HUMAN, "a", encoding="utf-8") as f:
+        with click_log_lock(CLICKS_HUMAN, exclusive=False), open(CLICKS_HUMAN, "a", encoding="utf-8") as f:
             f.write(line)
     except Exception as e:
         logger.error(f"Gagal menulis clicks_human.log: {e}")
+    trending.record(code)
+    if user_id is not None and "dashboard" in features:
+        engagement.mark(int(user_id))
 
 def prune_clicks_log(retention_days: int = RETENTION_DAYS):
-    """Simpan hanya event dalam N hari terakhir (atomic replace)."""
+    """
+    Simpan hanya event dalam N hari terakhir (atomic replace). Membaca & menulis ulang
+    seluruh file, jadi dipanggil lewat asyncio.to_thread.
+    """
+    cutoff = datetime.now(JAKARTA_TZ) - timedelta(days=retention_days)
+    if _click_log_binary():
+        click_log_bin.prune(cutoff.timestamp())
     if not CLICKS_JSONL.exists():
         return
-    cutoff = datetime.now(JAKARTA_TZ) - timedelta(days=RETENTION_DAYS)
     tmp_path = CLICKS_JSONL.with_suffix(".jsonl.tmp")
-    with open(CLICKS_JSONL, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
-        for line in src:
-            try:
-                ev = json.loads(line)
-                ts = _safe_parse_ts(ev.get("ts", ""))
-                if ts and ts >= cutoff:
-                    dst.write(json.dumps(ev, ensure_ascii=False) + "\n")
-            except Exception:
-                continue
-    os.replace(tmp_path, CLICKS_JSONL)
+    with click_log_lock(CLICKS_JSONL, exclusive=True):
+        with open(CLICKS_JSONL, "r", encoding="utf-8") as src, open(tmp_path, "w", encoding="utf-8") as dst:
+            for line in src:
+                try:
+                    ev = json.loads(line)
+                    ts = _safe_parse_ts(ev.get("ts", ""))
+                    if ts and ts >= cutoff:
+                        dst.write(json.dumps(ev, ensure_ascii=False) + "\n")
+                except Exception:
+                    continue
+        os.replace(tmp_path, CLICKS_JSONL)
 
-def prune_clicks_human(retention_days: int = RETENTION_DAYS):
-    if not CLICKS_HUMAN.exists():
-        return
-    cutoff = datetime.now(JAKARTA_TZ) - timedelta(days=RETENTION_DAYS)
-    out = []
-    with open(CLICKS_HUMAN, "r", encoding="utf-8") as f:
-        for ln in f:
-            # format: "[YYYY-mm-dd HH:MM:SS] ...\n"
-            try:
-                ts = ln[1:20]
-                dt = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=JAKARTA_TZ)
-                if dt >= cutoff:
-                    out.append(ln)
-            except Exception:
-                out.append(ln)
-    with open(CLICKS_HUMAN, "w", encoding="utf-8") as f:
-        f.writelines(out)
+def prune_clicks_human(retention_days: int = RETENTION_DAYS) -> tuple[int, int]:
+    """
+    Retensi clicks_human.log: baris > N hari dibuang dari file aktif (/log tetap berisi klik
+    terbaru), file yang melewati LOG_SEGMENT_MAX_BYTES dirotasi, lalu segmen > N hari dihapus.
+    Baris urut waktu, jadi file hanya ditulis ulang kalau baris pertamanya sudah lewat cutoff.
+    Return (baris dibuang, segmen dihapus).
+    """
+    disk_governor.rotate(CLICKS_HUMAN, LOG_SEGMENT_MAX_BYTES)
+    dropped = 0
+    if CLICKS_HUMAN.exists():
+        cutoff = (datetime.now(JAKARTA_TZ) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+        tmp = CLICKS_HUMAN.with_suffix(".log.tmp")
+        with click_log_lock(CLICKS_HUMAN, exclusive=True):
+            with open(CLICKS_HUMAN, "r", encoding="utf-8") as src:
+                ino = os.fstat(src.fileno()).st_ino
+                for ln in src:
+                    # format: "[YYYY-mm-dd HH:MM:SS] ...\n"; baris tak dikenal disimpan
+                    if not (ln.startswith("[") and ln[1:20] < cutoff):
+                        break
+                    dropped += 1
+                else:
+                    ln = ""
+                if dropped:
+                    with open(tmp, "w", encoding="utf-8") as dst:
+                        dst.write(ln)
+                        shutil.copyfileobj(src, dst)
+            if dropped:
+                try:
+                    same = os.stat(CLICKS_HUMAN).st_ino == ino
+                except FileNotFoundError:
+                    same = False
+                if same:
+                    os.replace(tmp, CLICKS_HUMAN)
+                else:   # dirotasi governor selagi disalin: segmen lama dibuang lewat expire()
+                    os.remove(tmp)
+                    dropped = 0
+    return dropped, disk_governor.expire(CLICKS_HUMAN, retention_days)
+
+# --- Disk budget (logs/ & data/) ---
+# DiskGovernor menjaga semua file di logs/ dan data/: log teks aktif dirotasi saat melewati
+# LOG_SEGMENT_MAX_BYTES, segmen hasil rotasi (file.log.1, file.log.<stamp>) dikompres gzip,
+# segmen yang lewat umur dihapus, dan selama total masih di atas budget segmen tertua dibuang
+# lebih dulu. File aktif (state, DB, clicks.jsonl/bin) tidak pernah dihapus di sini.
+try:
+    DISK_BUDGET_MB = float(os.getenv("DISK_BUDGET_MB", "1024"))     # total logs/ + data/
+except ValueError:
+    DISK_BUDGET_MB = 1024.0
+try:
+    LOG_MAX_AGE_DAYS = max(1, int(os.getenv("LOG_MAX_AGE_DAYS", "30")))   # umur maks segmen log
+except ValueError:
+    LOG_MAX_AGE_DAYS = 30
+try:
+    DISK_CHECK_MINUTES = max(1, int(os.getenv("DISK_CHECK_MINUTES", "60")))
+except ValueError:
+    DISK_CHECK_MINUTES = 60
+LOG_SEGMENT_MAX_BYTES = MAX_LOG_SIZE
+STALE_TMP_SECONDS = 3600                                                # sisa tulis atomik yang gagal
+_SEGMENT_SUFFIX_RE = re.compile(r"^\.(\d+|\d{8}-\d{6}(?:-\d+)?)(\.gz)?$")
+
+def _fmt_bytes(n: float) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.0f}{unit}" if unit == "B" else f"{n:.1f}{unit}"
+        n /= 1024
+
+class DiskGovernor:
+    """
+    Budget ukuran & umur untuk logs/ dan data/. `enforce()` jalan di thread (lihat run()),
+    `expire()`/`rotate()` dipakai pruning per log yang punya retensi sendiri.
+    """
 
-def parse_clicks_log_json(days_back: int = 7):
-    """Ringkas logs/clicks.jsonl untuk N hari terakhir."""
+    def __init__(self, roots, budget_bytes: int, logs: dict, rotated=()):
+        self.roots = tuple(roots)
+        self.budget = budget_bytes
+        self.logs = dict(logs)              # log aktif -> umur maks segmennya (hari)
+        self.rotated = tuple(rotated)       # log teks yang dirotasi governor berdasarkan ukuran
+        self.last: dict = {}                # laporan enforce() terakhir
+        self._lock = threading.Lock()
+
+    def _files(self) -> list[tuple[Path, int, float]]:
+        out = []
+        for root in self.roots:
+            for dirpath, _, names in os.walk(root):
+                for name in names:
+                    p = Path(dirpath) / name
+                    try:
+                        st = p.stat()
+                    except OSError:
+                        continue
+                    out.append((p, st.st_size, st.st_mtime))
+        return out
+
+    def _segment_of(self, path: Path):
+        """Log aktif pemilik segmen ini, atau None kalau path bukan segmen rotasi."""
+        for live in self.logs:
+            if path.parent == live.parent and path.name.startswith(live.name + "."):
+                if _SEGMENT_SUFFIX_RE.match(path.name[len(live.name):]):
+                    return live
+        return None
+
+    def _free_name(self, base: Path, stamp: str, ext: str = "") -> Path:
+        dest = base.with_name(f"{base.name}.{stamp}{ext}")
+        n = 1
+        while dest.exists():
+            dest = base.with_name(f"{base.name}.{stamp}-{n}{ext}")
+            n += 1
+        return dest
+
+    def rotate(self, path: Path, min_bytes: int = 1) -> Path | None:
+        """path → path.<YYYYmmdd-HHMMSS> (penulis berikutnya membuat file baru)."""
+        try:
+            if not path.exists() or path.stat().st_size < min_bytes:
+                return None
+            dest = self._free_name(path, datetime.now().strftime("%Y%m%d-%H%M%S"))
+            os.replace(path, dest)
+            return dest
+        except OSError as e:
+            logger.error(f"Gagal rotasi {path}: {e}")
+            return None
+
+    def _compress(self, path: Path, live: Path) -> int:
+        """Gzip satu segmen (mtime dipertahankan untuk urutan umur). Return byte yang dihemat."""
+        st = path.stat()
+        stamp = path.name[len(live.name) + 1:]
+        if stamp.isdigit():   # backup RotatingFileHandler (.1, .2, ...) → nama berdasarkan waktu
+            stamp = datetime.fromtimestamp(st.st_mtime).strftime("%Y%m%d-%H%M%S")
+        dest = self._free_name(live, stamp, ".gz")
+        tmp = dest.with_name(dest.name + ".tmp")
+        with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.utime(tmp, (st.st_mtime, st.st_mtime))
+        try:
+            if os.stat(path).st_ino != st.st_ino:   # dirotasi ulang oleh handler selagi dikompres
+                os.remove(tmp)
+                return 0
+        except FileNotFoundError:
+            os.remove(tmp)
+            return 0
+        os.replace(tmp, dest)
+        os.remove(path)
+        return st.st_size - dest.stat().st_size
+
+    def _delete(self, path: Path, size: int, report: dict):
+        try:
+            path.unlink()
+            report["deleted"] += 1
+            report["freed"] += size
+        except OSError as e:
+            logger.error(f"Gagal hapus {path}: {e}")
+
+    def expire(self, live: Path, max_age_days: int) -> int:
+        """Hapus segmen `live` yang terakhir ditulis lebih dari N hari lalu."""
+        cutoff = time.time() - max_age_days * 86400
+        report = {"deleted": 0, "freed": 0}
+        with self._lock:
+            for p, size, mtime in self._files():
+                if mtime < cutoff and self._segment_of(p) == live:
+                    self._delete(p, size, report)
+        return report["deleted"]
+
+    def enforce(self) -> dict:
+        now = time.time()
+        report = {"at": now, "rotated": 0, "compressed": 0, "saved": 0, "deleted": 0, "freed": 0}
+        with self._lock:
+            for live in self.rotated:
+                if self.rotate(live, LOG_SEGMENT_MAX_BYTES):
+                    report["rotated"] += 1
+            for p, _, _ in self._files():
+                live = self._segment_of(p)
+                if live is None or p.suffix == ".gz":
+                    continue
+                try:
+                    report["saved"] += self._compress(p, live)
+                    report["compressed"] += 1
+                except OSError as e:
+                    logger.error(f"Gagal kompres {p}: {e}")
+
+            files = self._files()
+            segments, kept = [], []
+            for p, size, mtime in files:
+                live = self._segment_of(p)
+                if live is not None and mtime < now - self.logs[live] * 86400:
+                    self._delete(p, size, report)
+                elif p.name.endswith(".tmp") and mtime < now - STALE_TMP_SECONDS:
+                    self._delete(p, size, report)
+                else:
+                    kept.append((p, size, mtime))
+                    if live is not None:
+                        segments.append((mtime, p, size))
+
+            total = sum(size for _, size, _ in kept)
+            segments.sort()
+            while total > self.budget and segments:   # tertua dulu
+                _, p, size = segments.pop(0)
+                self._delete(p, size, report)
+                total -= size
+
+        report.update(total=total, segments=len(segments), over_budget=total > self.budget,
+                      by_root=self._by_root(p for p in kept if p[0].exists()),
+                      segment_bytes=sum(size for _, _, size in segments))
+        self.last = report
+        if report["rotated"] or report["compressed"] or report["deleted"]:
+            logger.info(f"💾 Disk: rotasi {report['rotated']}, kompres {report['compressed']} "
+                        f"(hemat {_fmt_bytes(report['saved'])}), hapus {report['deleted']} "
+                        f"({_fmt_bytes(report['freed'])}), total {_fmt_bytes(total)}")
+        if report["over_budget"]:
+            logger.warning(f"💾 Disk {_fmt_bytes(total)} masih di atas budget {_fmt_bytes(self.budget)} "
+                           "(tidak ada segmen lagi yang bisa dihapus)")
+        return report
+
+    def _by_root(self, files) -> dict:
+        by_root = {str(root): 0 for root in self.roots}
+        for p, size, _ in files:
+            for root in self.roots:
+                if p.is_relative_to(root):
+                    by_root[str(root)] += size
+                    break
+        return by_root
+
+    def usage(self) -> dict:
+        files = self._files()
+        by_root = self._by_root(files)
+        largest = sorted(((size, p) for p, size, _ in files), reverse=True)
+        return {"by_root": by_root, "total": sum(by_root.values()), "largest": largest[:3]}
+
+    def health_lines(self) -> list[str]:
+        u = self.usage()
+        pct = u["total"] / self.budget * 100 if self.budget else 0
+        icon = "⚠️" if u["total"] > self.budget else "💾"
+        roots = ", ".join(f"{r} {_fmt_bytes(n)}" for r, n in u["by_root"].items())
+        lines = [f"{icon} Disk {_fmt_bytes(u['total'])}/{_fmt_bytes(self.budget)} ({pct:.0f}%): {roots}"]
+        if u["largest"]:
+            lines.append("   terbesar: " + ", ".join(f"{p.name} {_fmt_bytes(s)}" for s, p in u["largest"]))
+        if self.last:
+            ago = (time.time() - self.last["at"]) / 60
+            lines.append(f"   segmen {self.last['segments']} ({_fmt_bytes(self.last['segment_bytes'])}), "
+                         f"cek terakhir {ago:.0f} menit lalu")
+        return lines
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.enforce)
+            except Exception as e:
+                logger.error(f"Gagal enforce disk budget: {e}")
+            await asyncio.sleep(DISK_CHECK_MINUTES * 60)
+
+disk_governor = DiskGovernor(
+    (LOG_DIR, DATA_DIR),
+    int(DISK_BUDGET_MB * 1024 * 1024),
+    logs={ACTIVITY_LOG: LOG_MAX_AGE_DAYS, CLICKS_HUMAN: RETENTION_DAYS,
+          MOD_LOG: LOG_MAX_AGE_DAYS, HEALTH_LOG: LOG_MAX_AGE_DAYS},
+    rotated=(CLICKS_HUMAN, HEALTH_LOG),
+)
+# angka dari enforce() terakhir: scrape Prometheus tidak ikut menelusuri logs/ & data/ di event loop
+metrics.gauge("bot_disk_usage_bytes", "Ukuran file per direktori yang dijaga disk budget (cek terakhir)",
+              fn=lambda: {(("dir", r),): n for r, n in disk_governor.last.get("by_root", {}).items()})
+
+@functools.lru_cache(maxsize=4096)
+def _click_day_of_hour(hour: int) -> str:
+    # offset zona waktu selalu kelipatan jam, jadi tanggal cukup dihitung sekali per jam
+    return datetime.fromtimestamp(hour * 3600, JAKARTA_TZ).strftime("%Y-%m-%d")
+
+@timed_read("click_log")
+def summarize_clicks(periods=(7,)) -> dict:
+    """Ringkas click log untuk beberapa periode (hari) sekaligus dalam satu kali baca file."""
     base = {
         "total_clicks": 0, "unique_users": 0, "by_day": {}, "by_code": {},
         "status": "success", "message": "", "debug": {}
     }
-    if not CLICKS_JSONL.exists():
+    if not click_log_exists():
         r = base.copy(); r.update({"status": "no_log_file", "message": "File log belum ada."})
-        return r
+        return {p: dict(r) for p in periods}
 
-    cutoff = datetime.now(JAKARTA_TZ) - timedelta(days=RETENTION_DAYS)
-    total, users, by_day, by_code = 0, set(), defaultdict(int), defaultdict(int)
-    processed, errors = 0, 0
+    now = datetime.now(JAKARTA_TZ)
+    cutoffs = {p: now - timedelta(days=p) for p in periods}
+    cutoff_ts = {p: c.timestamp() for p, c in cutoffs.items()}
+    oldest = min(cutoff_ts.values())
+    acc = {p: {"total": 0, "users": set(), "by_day": defaultdict(int), "by_code": defaultdict(int)} for p in periods}
+    processed, read_stats = 0, {"errors": 0}
 
     try:
-        with open(CLICKS_JSONL, "r", encoding="utf-8") as f:
-            for line in f:
-                s = line.strip()
-                if not s:
-                    continue
-                try:
-                    row = json.loads(s)
-                except json.JSONDecodeError:
-                    errors += 1; continue
-                dt = _safe_parse_ts(row.get("ts", ""))
-                if not dt:
-                    errors += 1; continue
-                if dt >= cutoff:
-                    total += 1
-                    uid = row.get("user_id"); 
-                    if uid is not None: users.add(uid)
-                    code = row.get("code") or row.get("link_key") or row.get("video_key") or "unknown"
-                    by_code[code] += 1
-                    by_day[dt.strftime("%Y-%m-%d")] += 1
-                processed += 1
-
-        status = "success" if total > 0 else "no_recent_clicks"
-        out = base.copy()
-        out.update({
-            "status": status,
-            "total_clicks": total,
-            "unique_users": len(users),
-            "by_day": dict(by_day),
-            "by_code": dict(by_code),
-            "message": "" if total > 0 else f"Tidak ada klik dalam {days_back} hari.",
-            "debug": {"processed_lines": processed, "error_lines": errors, "cutoff_iso": cutoff.isoformat()}
-        })
-        return out
+        for ts, uid, code in iter_click_events(oldest, read_stats):
+            processed += 1
+            day = _click_day_of_hour(int(ts) // 3600)
+            for p, cutoff in cutoff_ts.items():
+                if ts >= cutoff:
+                    a = acc[p]
+                    a["total"] += 1
+                    if uid is not None: a["users"].add(uid)
+                    a["by_code"][code] += 1
+                    a["by_day"][day] += 1
     except Exception as e:
-        logger.error(f"Error membaca clicks.jsonl: {e}")
+        logger.error(f"Error membaca click log: {e}")
         r = base.copy(); r.update({"status": "read_error", "message": f"Error: {e}"})
-        return r
+        return {p: dict(r) for p in periods}
+    errors = read_stats["errors"]
+
+    out = {}
+    for p, a in acc.items():
+        total = a["total"]
+        r = base.copy()
+        r.update({
+            "status": "success" if total > 0 else "no_recent_clicks",
+            "total_clicks": total,
+            "unique_users": len(a["users"]),
+            "by_day": dict(a["by_day"]),
+            "by_code": dict(a["by_code"]),
+            "message": "" if total > 0 else f"Tidak ada klik dalam {p} hari.",
+            "debug": {"processed_lines": processed, "error_lines": errors, "cutoff_iso": cutoffs[p].isoformat()}
+        })
+        out[p] = r
+    return out
 
-def paginate_codes(codes, page, per_page=ITEMS_PER_PAGE):
+def parse_clicks_log_json(days_back: int = 7):
+    """Ringkas click log untuk N hari terakhir."""
+    return summarize_clicks((days_back,))[days_back]
+
+def paginate_codes(codes, page, per_page=ITEMS_PER_PAGE):
     total = len(codes)
     pages = max(1, (total + per_page - 1) // per_page)
     page = max(1, min(page, pages))
@@ -815,6 +2091,17 @@ def paginate_codes(codes, page, per_page=ITEMS_PER_PAGE):
     end = min(start + per_page, total)
     return codes[start:end], page, pages, total
 
+# Halaman /list (teks header + keyboard) per nomor halaman; dikosongkan saat STREAM_MAP berubah
+LIST_PAGE_CACHE = TTLCache("list_page", maxsize=256, ttl=3600)
+
+def get_list_page(page: int):
+    """(page_codes, page, pages, total, keyboard) untuk halaman /list, dari cache bila ada."""
+    def build():
+        codes = sorted(STREAM_MAP.keys())
+        page_codes, p, pages, total = paginate_codes(codes, page)
+        return page_codes, p, pages, total, build_list_keyboard(page_codes, p, pages)
+    return LIST_PAGE_CACHE.get_or_compute(page, build)
+
 def build_list_keyboard(page_codes, page, pages):
     buttons = [[InlineKeyboardButton(code, callback_data=f"list_show|{code}|{page}")] for code in page_codes]
     nav = []
@@ -827,7 +2114,10 @@ def build_list_keyboard(page_codes, page, pages):
     buttons.append([InlineKeyboardButton("❌ Tutup", callback_data="list_close")])
     return InlineKeyboardMarkup(buttons)
 
-async def is_member(client: Client, user_id: int, chat_username: str) -> bool:
+# Hanya hasil positif yang di-cache: user yang baru join tidak perlu menunggu TTL habis
+MEMBERSHIP_CACHE = TTLCache("membership", maxsize=50_000, ttl=600)
+
+async def _fetch_membership(client: Client, user_id: int, chat_username: str) -> bool:
     try:
         m = await client.get_chat_member(_norm_chat(chat_username), user_id)
         return m.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]
@@ -838,7 +2128,19 @@ async def is_member(client: Client, user_id: int, chat_username: str) -> bool:
         logger.warning(f"Gagal cek membership {user_id} di {chat_username}: {e}")
         return False
 
+async def is_member(client: Client, user_id: int, chat_username: str) -> bool:
+    return await MEMBERSHIP_CACHE.get_or_load(
+        (user_id, _norm_chat(chat_username).lower()),
+        lambda: _fetch_membership(client, user_id, chat_username),
+        cache_if=bool,
+    )
+
+@timed_read("click_log")
 def _check_log_file_status():
+    if _click_log_binary():
+        info = click_log_bin.stats()
+        info["lines"] = info["records"]
+        return info
     info = {"exists": CLICKS_JSONL.exists(), "size": 0, "lines": 0, "tail": []}
     if not info["exists"]:
         return info
@@ -853,7 +2155,9 @@ def _check_log_file_status():
     return info
 
 def build_dashboard_text(period_days: int = 7, top_n: int = 5):
-    stats = parse_clicks_log_json(days_back=period_days)
+    return render_dashboard_text(parse_clicks_log_json(days_back=period_days), period_days, top_n)
+
+def render_dashboard_text(stats: dict, period_days: int, top_n: int = 5) -> str:
     if stats["status"] in ("no_log_file", "read_error", "no_recent_clicks"):
         head = f"📊 Dashboard — {period_days} hari terakhir\n"
         body = f"• Total klik: {stats.get('total_clicks', 0)}\n• Pengguna unik: {stats.get('unique_users', 0)}\n"
@@ -879,19 +2183,809 @@ def build_dashboard_text(period_days: int = 7, top_n: int = 5):
             lines.append(f"• {d}: {c}")
     return "\n".join(lines)
 
+# --- Snapshot dashboard (dihitung di background, disajikan langsung) ---
+DASHBOARD_PERIODS = (1, 7, 30)
+DASHBOARD_REFRESH_SECONDS = 30        # interval cek klik baru
+DASHBOARD_MAX_AGE = 300               # tetap dihitung ulang walau tak ada klik (batas periode bergeser)
+DASHBOARD_FORCE_MIN_INTERVAL = 5      # refresh paksa lebih rapat dari ini → pakai snapshot terbaru
+
+def _ago(seconds: float) -> str:
+    seconds = int(max(0, seconds))
+    if seconds < 60:
+        return f"{seconds} detik lalu"
+    if seconds < 3600:
+        return f"{seconds // 60} menit lalu"
+    return f"{seconds // 3600} jam lalu"
+
+class DashboardSnapshots:
+    """
+    Statistik + teks dashboard untuk periode standar, dihitung dalam satu kali baca click log
+    oleh task latar (saat ada klik baru, atau minimal tiap DASHBOARD_MAX_AGE). Handler hanya
+    membaca snapshot; refresh paksa di-serialisasi lewat lock sehingga tombol Refresh yang
+    ditekan beruntun cukup memicu satu perhitungan.
+    """
+
+    def __init__(self, periods=DASHBOARD_PERIODS):
+        self.periods = tuple(periods)
+        self.snapshots: dict[int, dict] = {}   # period -> {"stats", "text", "computed_at"}
+        self.computed_at = 0.0
+        self.version_seen = -1
+        self.compute_seconds = 0.0
+        self._lock = asyncio.Lock()
+
+    def _compute(self) -> dict:
+        t0 = time.time()
+        all_stats = summarize_clicks(self.periods)
+        return {p: {"stats": st, "text": render_dashboard_text(st, p), "computed_at": t0} for p, st in all_stats.items()}
+
+    def stale(self) -> bool:
+        return CLICK_LOG_VERSION != self.version_seen or time.time() - self.computed_at >= DASHBOARD_MAX_AGE
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            # yang menunggu lock mungkin sudah kebagian hasil perhitungan pemanggil sebelumnya
+            if self.snapshots:
+                if force and time.time() - self.computed_at < DASHBOARD_FORCE_MIN_INTERVAL:
+                    return
+                if not force and not self.stale():
+                    return
+            version = CLICK_LOG_VERSION
+            t0 = time.perf_counter()
+            self.snapshots = await asyncio.to_thread(self._compute)
+            self.compute_seconds = time.perf_counter() - t0
+            self.computed_at = time.time()
+            self.version_seen = version
+
+    async def get(self, period_days: int) -> dict:
+        if period_days not in self.periods:
+            # periode non-standar: hitung sekali, tidak disimpan
+            t0 = time.time()
+            st = await asyncio.to_thread(parse_clicks_log_json, period_days)
+            return {"stats": st, "text": render_dashboard_text(st, period_days), "computed_at": t0}
+        if period_days not in self.snapshots:
+            await self.refresh()
+        return self.snapshots[period_days]
+
+    async def text(self, period_days: int, force: bool = False) -> str:
+        if force:
+            await self.refresh(force=True)
+        snap = await self.get(period_days)
+        return snap["text"] + f"\n\n🕐 Dihitung {_ago(time.time() - snap['computed_at'])}"
+
+    async def run(self):
+        while True:
+            try:
+                if self.stale():
+                    await self.refresh()
+            except Exception as e:
+                logger.error(f"Gagal menghitung snapshot dashboard: {e}")
+            await asyncio.sleep(DASHBOARD_REFRESH_SECONDS)
+
+dashboard_snapshots = features.lazy("dashboard", DashboardSnapshots)
+
 def build_dashboard_keyboard(current_period: int = 7):
     periods = [1, 7, 30]
     row = []
     for p in periods:
         label = f"{p}d" if p != current_period else f"• {p}d"
         row.append(InlineKeyboardButton(label, callback_data=f"dashboard:{p}"))
-    return InlineKeyboardMarkup([row, [InlineKeyboardButton("🔄 Refresh", callback_data=f"dashboard:{current_period}")]])
+    return InlineKeyboardMarkup([row, [InlineKeyboardButton("🔄 Refresh", callback_data=f"dashboard:{current_period}:r")]])
+
+# --- Analitik kolomnar (NumPy) untuk /report ---
+WEEKDAY_NAMES = ("Senin", "Selasa", "Rabu", "Kamis", "Jumat", "Sabtu", "Minggu")
+USER_FREQ_BUCKETS = (1, 2, 3, 6, 11, 21, 51)   # batas bawah: 1, 2, 3-5, 6-10, 11-20, 21-50, 51+
+
+def _numpy():
+    """Import NumPy saat dibutuhkan saja; None kalau belum terpasang."""
+    try:
+        import numpy as np
+    except ImportError:
+        return None
+    return np
+
+def _tz_offset_seconds() -> int:
+    # Asia/Jakarta tanpa DST → offset tetap, cukup dihitung sekali untuk seluruh array
+    off = datetime.now(JAKARTA_TZ).utcoffset() if JAKARTA_TZ else None
+    return int(off.total_seconds()) if off else 0
+
+class ClickColumns:
+    """
+    Click log sebagai kolom: ts (int64 epoch), user/code (int32 index padat).
+    `user_ids[user]` dan `code_names[code]` memetakan index kembali ke nilai aslinya.
+    """
+
+    def __init__(self, ts, user, code, user_ids, code_names: list[str]):
+        self.ts, self.user, self.code = ts, user, code
+        self.user_ids = user_ids
+        self.code_names = code_names
+
+    def __len__(self):
+        return len(self.ts)
+
+    @classmethod
+    def load(cls, since: float = 0.0) -> "ClickColumns":
+        np = _numpy()
+        arr = click_log_bin.to_numpy(since) if _click_log_binary() else None
+        if arr is not None:
+            ts = arr["ts"].astype(np.int64)
+            raw_users = arr["user_id"]
+            code = arr["code"].astype(np.int32)
+            # id dari proses lain yang belum ada di sidecar yang dimuat → reload / placeholder
+            # "#<id>", supaya array per kode selalu selebar id terbesar di file
+            top_id = int(code.max()) + 1 if len(code) else 0
+            if top_id > len(click_log_bin.codes):
+                click_log_bin._read_codes()
+            names = list(click_log_bin.codes)
+            names += [f"#{i}" for i in range(len(names), top_id)]
+        else:
+            ts_l, users_l, codes_l = [], [], []
+            ids: dict[str, int] = {}
+            for t, uid, c in iter_click_events(since):
+                ts_l.append(int(t))
+                users_l.append(int(uid or 0))
+                codes_l.append(ids.setdefault(c, len(ids)))
+            ts = np.array(ts_l, dtype=np.int64)
+            raw_users = np.array(users_l, dtype=np.int64)
+            code = np.array(codes_l, dtype=np.int32)
+            names = list(ids)
+        user_ids, user = np.unique(raw_users, return_inverse=True)
+        return cls(ts, user.astype(np.int32), code, user_ids, names)
+
+    def local_hours(self):
+        return (self.ts + _tz_offset_seconds()) // 3600
+
+    def code_totals(self):
+        return _numpy().bincount(self.code, minlength=len(self.code_names))
+
+    def code_by_hour(self):
+        """Matriks [kode, jam 0-23] jumlah klik."""
+        np = _numpy()
+        hour = (self.local_hours() % 24).astype(np.int64)
+        n = len(self.code_names)
+        return np.bincount(self.code.astype(np.int64) * 24 + hour, minlength=n * 24).reshape(n, 24)
+
+    def weekday_by_hour(self):
+        """Matriks [hari (Senin=0), jam] jumlah klik."""
+        np = _numpy()
+        hours = self.local_hours()
+        weekday = (hours // 24 + 3) % 7   # 1970-01-01 hari Kamis
+        return np.bincount(weekday * 24 + hours % 24, minlength=7 * 24).reshape(7, 24)
+
+    def user_frequency(self):
+        """(klik per user, jumlah user per bucket USER_FREQ_BUCKETS)."""
+        np = _numpy()
+        per_user = np.bincount(self.user, minlength=len(self.user_ids))
+        buckets = np.searchsorted(np.array(USER_FREQ_BUCKETS), per_user, side="right") - 1
+        return per_user, np.bincount(buckets[buckets >= 0], minlength=len(USER_FREQ_BUCKETS))
+
+def _freq_bucket_label(i: int) -> str:
+    lo = USER_FREQ_BUCKETS[i]
+    if i + 1 == len(USER_FREQ_BUCKETS):
+        return f"{lo}+"
+    hi = USER_FREQ_BUCKETS[i + 1] - 1
+    return str(lo) if lo == hi else f"{lo}-{hi}"
+
+@timed_read("click_log")
+def build_click_report(days: int = 30, top_codes: int = 50) -> tuple[str, bytes] | None:
+    """
+    (ringkasan teks, CSV) untuk N hari terakhir; None kalau NumPy belum terpasang.
+    CSV berformat panjang: section,key,bucket,count — section = code_total | code_hour |
+    weekday_hour | user_freq.
+    """
+    np = _numpy()
+    if np is None:
+        return None
+    cols = ClickColumns.load(time.time() - days * 86400)
+    if not len(cols):
+        return f"📑 Report {days} hari: belum ada klik.", b""
+
+    totals = cols.code_totals()
+    by_hour = cols.code_by_hour()
+    week = cols.weekday_by_hour()
+    per_user, freq = cols.user_frequency()
+    top = np.argsort(totals)[::-1][:top_codes]
+    top = top[totals[top] > 0]
+
+    buf = io.StringIO()
+    w = csv.writer(buf)
+    w.writerow(["section", "key", "bucket", "count"])
+    for c in top:
+        w.writerow(["code_total", cols.code_names[c], "", int(totals[c])])
+    for c in top:
+        for h in np.nonzero(by_hour[c])[0]:
+            w.writerow(["code_hour", cols.code_names[c], f"{h:02d}", int(by_hour[c, h])])
+    for d in range(7):
+        for h in range(24):
+            w.writerow(["weekday_hour", WEEKDAY_NAMES[d], f"{h:02d}", int(week[d, h])])
+    for i, n in enumerate(freq):
+        w.writerow(["user_freq", _freq_bucket_label(i), "", int(n)])
+
+    hour_totals = week.sum(axis=0)
+    day_totals = week.sum(axis=1)
+    summary = "\n".join([
+        f"📑 <b>Report klik {days} hari</b>",
+        f"• Total klik: {len(cols)}",
+        f"• Pengguna unik: {len(cols.user_ids)} (median {int(np.median(per_user))}, "
+        f"p90 {int(np.percentile(per_user, 90))} klik/user)",
+        f"• Kode aktif: {int((totals > 0).sum())}",
+        f"• Jam tersibuk: {int(hour_totals.argmax()):02d}:00 ({int(hour_totals.max())} klik)",
+        f"• Hari tersibuk: {WEEKDAY_NAMES[int(day_totals.argmax())]} ({int(day_totals.max())} klik)",
+    ])
+    return summary, buf.getvalue().encode("utf-8")
+
+# ================================
+# State Store (XP, quota, warn)
+# ================================
+# STATE_BACKEND=json (bawaan): file JSON per jenis state, hanya aman untuk satu proses.
+# STATE_BACKEND=sqlite: satu database SQLite (mode WAL) yang bisa dipakai bersama beberapa
+# proses bot (mirror/worker) di host yang sama; update per user dijalankan dalam transaksi.
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json").strip().lower()
+STATE_DB_FILE = Path(os.getenv("STATE_DB", "data/state.db"))
+
+def _badge_by_xp(xp: int) -> str:
+    if xp >= 150:
+        return BADGE_STARLORD
+    if xp >= 80:
+        return BADGE_STELLAR
+    if xp >= 20:
+        return BADGE_SHIMMER
+    return BADGE_STRANGER
+
+class JsonStateStore:
+    name = "json"
+
+    def warmup(self):
+        pass
+
+    @timed_read("user_data")
+    def all_users(self) -> dict:
+        if USER_DATA_FILE.exists():
+            with open(USER_DATA_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {}
+
+    @timed_persist("user_data")
+    def replace_users(self, data: dict):
+        _ensure_parent_dir(USER_DATA_FILE)
+        with open(USER_DATA_FILE, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+
+    def get_user(self, user_id) -> dict | None:
+        return self.all_users().get(str(user_id))
+
+    def update_user(self, user_id, fn, default: dict) -> dict:
+        data = self.all_users()
+        user = data.setdefault(str(user_id), dict(default))
+        fn(user)
+        self.replace_users(data)
+        return user
+
+    def quota_used(self, day: str, user_id) -> int:
+        data = _load_quota()
+        if set(data.keys()) - {day}:
+            data = {day: data.get(day, {})}
+            _save_quota(data)
+        return int(data.get(day, {}).get(str(user_id), 0))
+
+    def quota_consume(self, day: str, user_id, limit: int) -> tuple[bool, int]:
+        data = _load_quota()
+        if set(data.keys()) - {day}:
+            data = {day: data.get(day, {})}
+        daymap = data.setdefault(day, {})
+        used = int(daymap.get(str(user_id), 0))
+        if used >= limit:
+            _save_quota(data)
+            return False, used
+        daymap[str(user_id)] = used + 1
+        _save_quota(data)
+        return True, used + 1
+
+    def warn_add(self, chat_id, user_id, entry: dict) -> int:
+        rec = WARN_DB.setdefault(str(chat_id), {}).setdefault(str(user_id), {"count": 0, "history": []})
+        rec["count"] += 1
+        rec["history"].append(entry)
+        save_warn_db()
+        return rec["count"]
+
+    def warn_count(self, chat_id, user_id) -> int:
+        return WARN_DB.get(str(chat_id), {}).get(str(user_id), {}).get("count", 0)
+
+    def warn_clear(self, chat_id, user_id):
+        chat, user = str(chat_id), str(user_id)
+        if chat in WARN_DB and user in WARN_DB[chat]:
+            WARN_DB[chat][user] = {"count": 0, "history": []}
+            save_warn_db()
+
+class SqliteStateStore:
+    """
+    State bersama lintas proses di satu file SQLite (WAL: pembaca tidak memblokir penulis).
+    Read-modify-write per user memakai BEGIN IMMEDIATE, jadi dua proses yang menambah XP /
+    memakai jatah /random user yang sama tidak saling menimpa. Koneksi dibuka saat pertama dipakai;
+    data JSON lama diimpor sekali ke database yang masih kosong.
+    """
+    name = "sqlite"
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS users (uid TEXT PRIMARY KEY, data TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS quota (day TEXT NOT NULL, uid TEXT NOT NULL, used INTEGER NOT NULL,
+                                          PRIMARY KEY (day, uid));
+        CREATE TABLE IF NOT EXISTS warns (chat TEXT NOT NULL, uid TEXT NOT NULL, count INTEGER NOT NULL,
+                                          history TEXT NOT NULL, PRIMARY KEY (chat, uid));
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.RLock()   # satu koneksi dipakai loop utama + to_thread saat startup
+
+    def warmup(self):
+        """Buka koneksi (+ impor JSON lama) di luar jalur handler; dipanggil saat bootstrap."""
+        with self._lock:
+            self._db()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            _ensure_parent_dir(self.path)
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=10000")
+            conn.executescript(self.SCHEMA)
+            self._conn = conn
+            with self._tx() as db:
+                self._import_json(db)
+        return self._conn
+
+    @contextmanager
+    def _tx(self):
+        with self._lock:
+            db = self._db()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+            else:
+                db.execute("COMMIT")
+
+    def _query(self, sql: str, args=()) -> list:
+        with self._lock:
+            return self._db().execute(sql, args).fetchall()
+
+    def _import_json(self, db):
+        if db.execute("SELECT 1 FROM meta WHERE key = 'json_imported'").fetchone():
+            return
+        users = JsonStateStore().all_users()
+        db.executemany(
+            "INSERT OR IGNORE INTO users (uid, data) VALUES (?, ?)",
+            ((uid, json.dumps(u, ensure_ascii=False)) for uid, u in users.items()),
+        )
+        quota = _load_quota()
+        db.executemany(
+            "INSERT OR IGNORE INTO quota (day, uid, used) VALUES (?, ?, ?)",
+            ((day, uid, int(n)) for day, m in quota.items() for uid, n in m.items()),
+        )
+        warns = read_local_config(WARN_DB_FILE) or {}
+        db.executemany(
+            "INSERT OR IGNORE INTO warns (chat, uid, count, history) VALUES (?, ?, ?, ?)",
+            ((chat, uid, int(r.get("count", 0)), json.dumps(r.get("history", []), ensure_ascii=False))
+             for chat, m in warns.items() for uid, r in m.items()),
+        )
+        db.execute("INSERT INTO meta (key, value) VALUES ('json_imported', ?)", (datetime.now().isoformat(),))
+        logger.info(f"🗄️ State JSON diimpor ke {self.path}: {len(users)} user, {len(warns)} chat warn.")
+
+    @timed_read("user_data")
+    def all_users(self) -> dict:
+        return {uid: json.loads(d) for uid, d in self._query("SELECT uid, data FROM users")}
+
+    @timed_persist("user_data")
+    def replace_users(self, data: dict):
+        with self._tx() as db:
+            db.execute("DELETE FROM users")
+            db.executemany(
+                "INSERT INTO users (uid, data) VALUES (?, ?)",
+                ((str(uid), json.dumps(u, ensure_ascii=False)) for uid, u in data.items()),
+            )
+
+    @timed_read("user_data")
+    def get_user(self, user_id) -> dict | None:
+        rows = self._query("SELECT data FROM users WHERE uid = ?", (str(user_id),))
+        return json.loads(rows[0][0]) if rows else None
+
+    @timed_persist("user_data")
+    def update_user(self, user_id, fn, default: dict) -> dict:
+        uid = str(user_id)
+        with self._tx() as db:
+            row = db.execute("SELECT data FROM users WHERE uid = ?", (uid,)).fetchone()
+            user = json.loads(row[0]) if row else dict(default)
+            fn(user)
+            db.execute(
+                "INSERT INTO users (uid, data) VALUES (?, ?) ON CONFLICT(uid) DO UPDATE SET data = excluded.data",
+                (uid, json.dumps(user, ensure_ascii=False)),
+            )
+        return user
+
+    @timed_read("random_quota")
+    def quota_used(self, day: str, user_id) -> int:
+        rows = self._query("SELECT used FROM quota WHERE day = ? AND uid = ?", (day, str(user_id)))
+        return int(rows[0][0]) if rows else 0
+
+    @timed_persist("random_quota")
+    def quota_consume(self, day: str, user_id, limit: int) -> tuple[bool, int]:
+        uid = str(user_id)
+        with self._tx() as db:
+            db.execute("DELETE FROM quota WHERE day < ?", (day,))
+            row = db.execute("SELECT used FROM quota WHERE day = ? AND uid = ?", (day, uid)).fetchone()
+            used = int(row[0]) if row else 0
+            if used >= limit:
+                return False, used
+            db.execute(
+                "INSERT INTO quota (day, uid, used) VALUES (?, ?, ?) "
+                "ON CONFLICT(day, uid) DO UPDATE SET used = excluded.used",
+                (day, uid, used + 1),
+            )
+        return True, used + 1
+
+    @timed_persist("warnings")
+    def warn_add(self, chat_id, user_id, entry: dict) -> int:
+        chat, uid = str(chat_id), str(user_id)
+        with self._tx() as db:
+            row = db.execute("SELECT count, history FROM warns WHERE chat = ? AND uid = ?", (chat, uid)).fetchone()
+            count, history = (int(row[0]), json.loads(row[1])) if row else (0, [])
+            count += 1
+            history.append(entry)
+            db.execute(
+                "INSERT INTO warns (chat, uid, count, history) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(chat, uid) DO UPDATE SET count = excluded.count, history = excluded.history",
+                (chat, uid, count, json.dumps(history, ensure_ascii=False)),
+            )
+        return count
+
+    def warn_count(self, chat_id, user_id) -> int:
+        rows = self._query("SELECT count FROM warns WHERE chat = ? AND uid = ?", (str(chat_id), str(user_id)))
+        return int(rows[0][0]) if rows else 0
+
+    @timed_persist("warnings")
+    def warn_clear(self, chat_id, user_id):
+        with self._tx() as db:
+            db.execute("UPDATE warns SET count = 0, history = '[]' WHERE chat = ? AND uid = ?",
+                       (str(chat_id), str(user_id)))
+
+if STATE_BACKEND == "sqlite":
+    state = SqliteStateStore(STATE_DB_FILE)
+else:
+    if STATE_BACKEND != "json":
+        logger.warning(f"STATE_BACKEND '{STATE_BACKEND}' tidak dikenal, pakai json.")
+    state = JsonStateStore()
+
+# Semua akses state store lewat satu thread khusus: transaksi SQLite yang menunggu lock proses lain
+# (busy_timeout 10 detik) atau baca/tulis file JSON tidak pernah memblokir event loop, dan urutan
+# operasi antar handler tetap serial seperti sebelumnya.
+STATE_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="state")
+
+async def state_call(fn, *args, **kwargs):
+    # salin context seperti asyncio.to_thread: @timed_read/@timed_persist tetap mencatat ke trace handler
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await asyncio.get_running_loop().run_in_executor(STATE_EXECUTOR, call)
 
 # ================================
 # Bot Initialization
 # ================================
 
-app = Client("bangsabacolbot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+# Nama session per proses: beberapa bot mirror bisa jalan dari folder yang sama (BOT_SESSION berbeda)
+BOT_SESSION = os.getenv("BOT_SESSION", "bangsabacolbot")
+app = Client(BOT_SESSION, api_id=API_ID, api_hash=API_HASH, bot_token=BOT_TOKEN)
+
+# ================================
+# Outbound Queue (anti FloodWait)
+# ================================
+# Batas aman Telegram: ±30 pesan/detik total, 1 pesan/detik per chat privat,
+# ±20 pesan/menit per grup.
+OUTBOX_GLOBAL_RATE = 25            # pesan per detik (semua chat)
+OUTBOX_PRIVATE_INTERVAL = 1.0      # detik antar pesan ke chat privat yang sama
+OUTBOX_GROUP_INTERVAL = 3.0        # detik antar pesan ke grup/channel yang sama
+OUTBOX_MAX_RETRIES = 3
+OUTBOX_MAX_FLOODWAIT = 300         # FloodWait lebih lama dari ini → langsung gagal
+OUTBOX_SCAN_LIMIT = 50             # maks item yang dicek per lane saat memilih kiriman
+
+# Lane prioritas: angka kecil dikirim duluan
+PRIO_USER = 0        # balasan ke user
+PRIO_OWNER = 1       # notifikasi & laporan ke owner
+PRIO_BROADCAST = 2   # pesan periodik ke grup
+OUTBOX_LANE_LIMITS = {PRIO_USER: 2000, PRIO_OWNER: 500, PRIO_BROADCAST: 50}
+OUTBOX_LANE_NAMES = {PRIO_USER: "user", PRIO_OWNER: "owner", PRIO_BROADCAST: "broadcast"}
+
+# RPC pengirim pesan yang dialirkan lewat outbox di level client (instrument_client): balasan
+# handler (message.reply*, send_*, copy_message) ikut budget global & per chat di lane PRIO_USER
+# tanpa tiap call site membungkus outbox.send. Edit, answer callback, dan delete tidak diantrikan.
+OUTBOX_ROUTED_RPC = (
+    raw.functions.messages.SendMessage,
+    raw.functions.messages.SendMedia,
+    raw.functions.messages.SendMultiMedia,
+    raw.functions.messages.ForwardMessages,
+)
+# True di task kirim outbox: RPC di dalamnya sudah lewat antrian, jangan diantrikan lagi
+_outbox_delivering: contextvars.ContextVar[bool] = contextvars.ContextVar("outbox_delivering", default=False)
+
+class OutboxFull(Exception):
+    """Lane antrian penuh; kiriman ditolak."""
+
+class _OutboxItem:
+    __slots__ = ("chat_id", "factory", "priority", "future", "enqueued", "attempts")
+
+    def __init__(self, chat_id, factory, priority, future):
+        self.chat_id = chat_id
+        self.factory = factory
+        self.priority = priority
+        self.future = future
+        self.enqueued = time.monotonic()
+        self.attempts = 0
+
+class OutboundScheduler:
+    """
+    Antrian kirim terpusat:
+    - lane prioritas (user > owner > broadcast)
+    - budget rate per chat & global
+    - retry otomatis saat FloodWait (chat ditahan sesuai durasi FloodWait)
+    - metrik latensi antrian (enqueue → mulai kirim)
+    """
+
+    def __init__(self, global_rate: float = OUTBOX_GLOBAL_RATE):
+        self.global_rate = global_rate
+        self.lanes = {p: deque() for p in sorted(OUTBOX_LANE_LIMITS)}
+        self._next_slot = {}            # chat_id -> monotonic time paling awal boleh kirim
+        self._global_next = 0.0
+        self._wakeup = asyncio.Event()
+        self._latency = deque(maxlen=2000)
+        self._task = None
+        self._inflight: set[asyncio.Task] = set()   # referensi kuat: task kirim tidak di-GC di tengah jalan
+        self.stats = {"sent": 0, "failed": 0, "retried": 0, "floodwait": 0, "dropped": 0}
+
+    @staticmethod
+    def _interval(chat_id) -> float:
+        # username (str) dan id negatif = grup/channel
+        if isinstance(chat_id, str) or (isinstance(chat_id, int) and chat_id < 0):
+            return OUTBOX_GROUP_INTERVAL
+        return OUTBOX_PRIVATE_INTERVAL
+
+    def start(self, loop=None):
+        if self._task is None or self._task.done():
+            self._task = (loop or asyncio.get_event_loop()).create_task(self.run())
+        return self._task
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def send(self, chat_id, factory, priority: int = PRIO_USER, wait: bool = True):
+        """
+        Antrikan kiriman. `factory` = callable tanpa argumen yang mengembalikan coroutine
+        (mis. `lambda: client.send_message(...)`), supaya bisa dipanggil ulang saat retry.
+        wait=True → tunggu hasil kiriman; wait=False → fire-and-forget (error cukup di-log).
+        """
+        if not self.running:
+            # worker belum jalan (mis. sebelum app.start) → kirim langsung
+            return await factory()
+        lane = self.lanes[priority]
+        if len(lane) >= OUTBOX_LANE_LIMITS[priority]:
+            self.stats["dropped"] += 1
+            raise OutboxFull(f"lane {priority} penuh ({len(lane)})")
+        future = asyncio.get_running_loop().create_future() if wait else None
+        lane.append(_OutboxItem(chat_id, factory, priority, future))
+        self._wakeup.set()
+        if future is None:
+            return None
+        # RPC asli jalan di task worker; waktu tunggu dihitung sebagai waktu Telegram handler ini
+        t0 = time.perf_counter()
+        try:
+            return await future
+        finally:
+            _trace_add("tg", time.perf_counter() - t0)
+
+    def _pick(self):
+        """Ambil item siap kirim dengan prioritas tertinggi. Return (item, delay_tunggu)."""
+        now = time.monotonic()
+        earliest = None
+        for lane in self.lanes.values():
+            for i, item in enumerate(lane):
+                if i >= OUTBOX_SCAN_LIMIT:
+                    break
+                slot = self._next_slot.get(item.chat_id, 0.0)
+                if slot <= now:
+                    del lane[i]
+                    return item, 0.0
+                earliest = slot if earliest is None else min(earliest, slot)
+        return None, (None if earliest is None else max(0.0, earliest - now))
+
+    async def run(self):
+        logger.info("📤 Outbound queue started!")
+        while True:
+            item, delay = self._pick()
+            if item is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            now = time.monotonic()
+            if self._global_next > now:
+                await asyncio.sleep(self._global_next - now)
+            now = time.monotonic()
+            self._global_next = now + 1.0 / self.global_rate
+            self._next_slot[item.chat_id] = now + self._interval(item.chat_id)
+            self._latency.append(now - item.enqueued)
+            OUTBOX_LATENCY.observe(now - item.enqueued, lane=OUTBOX_LANE_NAMES[item.priority])
+            task = asyncio.create_task(self._deliver(item))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, item: _OutboxItem):
+        _outbox_delivering.set(True)   # context milik task ini saja
+        try:
+            await self._attempt(item)
+        except asyncio.CancelledError:
+            self._fail(item, ConnectionError("bot sedang shutdown"))
+            raise
+        except Exception as e:   # bug di jalur kirim: jangan sampai jadi "Task exception was never retrieved"
+            logger.error(f"Outbox error ke {item.chat_id}: {e}")
+            self._fail(item, e)
+
+    async def _attempt(self, item: _OutboxItem):
+        try:
+            result = await item.factory()
+        except FloodWait as e:
+            wait = int(getattr(e, "value", 0) or 0)
+            self.stats["floodwait"] += 1
+            self._next_slot[item.chat_id] = time.monotonic() + wait
+            if item.attempts < OUTBOX_MAX_RETRIES and wait <= OUTBOX_MAX_FLOODWAIT:
+                item.attempts += 1
+                self.stats["retried"] += 1
+                logger.warning(f"FloodWait {wait}s ke {item.chat_id}, retry {item.attempts}/{OUTBOX_MAX_RETRIES}")
+                self.lanes[item.priority].appendleft(item)
+                self._wakeup.set()
+                return
+            self._fail(item, e)
+            return
+        except Exception as e:
+            self._fail(item, e)
+            return
+        self.stats["sent"] += 1
+        if item.future is not None and not item.future.done():
+            item.future.set_result(result)
+
+    def _fail(self, item: _OutboxItem, exc: Exception):
+        self.stats["failed"] += 1
+        if item.future is not None:
+            if not item.future.done():
+                item.future.set_exception(exc)
+        else:
+            logger.error(f"Gagal kirim ke {item.chat_id}: {exc}")
+
+    @property
+    def pending(self) -> int:
+        return sum(len(lane) for lane in self.lanes.values()) + len(self._inflight)
+
+    async def drain(self, timeout: float) -> int:
+        """Tunggu antrian + kiriman yang sedang jalan habis (maks `timeout` detik). Return sisa item."""
+        deadline = time.monotonic() + timeout
+        while self.pending and self.running and time.monotonic() < deadline:
+            if self._inflight:
+                # retry FloodWait bisa masuk lane lagi → cek ulang antrian secara berkala
+                await asyncio.wait(set(self._inflight), timeout=min(0.5, deadline - time.monotonic()),
+                                   return_when=asyncio.FIRST_COMPLETED)
+            else:
+                await asyncio.sleep(0.05)
+        return self.pending
+
+    async def stop(self):
+        """Hentikan worker; kiriman yang masih antre digagalkan (penunggu dapat ConnectionError)."""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        inflight = list(self._inflight)
+        for task in inflight:
+            task.cancel()
+        await asyncio.gather(*inflight, return_exceptions=True)
+        for lane in self.lanes.values():
+            while lane:
+                self._fail(lane.popleft(), ConnectionError("bot sedang shutdown"))
+
+    def snapshot(self) -> dict:
+        lat = list(self._latency)
+        return {
+            "queued": {p: len(lane) for p, lane in self.lanes.items()},
+            "latency_p50_ms": _percentile(lat, 50) * 1000,
+            "latency_p99_ms": _percentile(lat, 99) * 1000,
+            "latency_max_ms": (max(lat) if lat else 0.0) * 1000,
+            **self.stats,
+        }
+
+outbox = OutboundScheduler()
+
+# ================================
+# Delete Scheduler (hapus tertunda)
+# ================================
+PENDING_DELETES_FILE = DATA_DIR / "pending_deletes.json"
+DELETE_BATCH_SIZE = 100   # batas message_ids per panggilan delete_messages
+
+class DeleteScheduler:
+    """
+    Antrian hapus-tertunda berbasis heap (due_ts, chat_id, message_id).
+    Disimpan ke disk supaya pesan yang belum sempat dihapus tetap dihapus setelah restart.
+    Pesan yang jatuh tempo bersamaan dihapus per chat dengan satu delete_messages.
+    """
+
+    def __init__(self, path: Path = PENDING_DELETES_FILE):
+        self.path = path
+        self._heap: list[tuple[float, int, int]] = []
+        self._wakeup = asyncio.Event()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._heap = [(float(d), int(c), int(m)) for d, c, m in json.load(f)]
+            heapq.heapify(self._heap)
+            logger.info(f"🗑️ {len(self._heap)} pesan menunggu dihapus (dari {self.path}).")
+        except Exception as e:
+            logger.error(f"Gagal load {self.path}: {e}")
+            self._heap = []
+
+    @timed_persist("pending_deletes")
+    def _save(self):
+        try:
+            _ensure_parent_dir(self.path)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._heap, f)
+        except Exception as e:
+            logger.error(f"Gagal save {self.path}: {e}")
+
+    def schedule(self, chat_id: int, message_ids, delay: float):
+        due = time.time() + delay
+        for mid in message_ids:
+            heapq.heappush(self._heap, (due, int(chat_id), int(mid)))
+        self._save()
+        self._wakeup.set()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def _pop_due(self) -> dict:
+        now = time.time()
+        due = defaultdict(list)
+        while self._heap and self._heap[0][0] <= now:
+            _, chat_id, mid = heapq.heappop(self._heap)
+            due[chat_id].append(mid)
+        return due
+
+    async def run(self, client):
+        while True:
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+            delay = self._heap[0][0] - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due = self._pop_due()
+            self._save()
+            for chat_id, ids in due.items():
+                for i in range(0, len(ids), DELETE_BATCH_SIZE):
+                    try:
+                        await client.delete_messages(chat_id, ids[i:i + DELETE_BATCH_SIZE])
+                    except Exception as e:
+                        logger.warning(f"Gagal hapus {len(ids[i:i + DELETE_BATCH_SIZE])} pesan di {chat_id}: {e}")
+
+delete_scheduler = DeleteScheduler()
 
 # ================================
 # Commands & Handlers
@@ -899,10 +2993,10 @@ app = Client("bangsabacolbot", api_id=API_ID, api_hash=API_HASH, bot_token=BOT_T
 
 # --- Moderator Commands (group) ---
 
-@Client.on_message(filters.command("reload_badwords") & filters.user([OWNER_ID]))
+@features.on_message("moderation", filters.command("reload_badwords") & filters.user([OWNER_ID]))
 async def reload_badwords_cmd(client, message):
     try:
-        load_badwords_config()
+        await asyncio.to_thread(load_badwords_config)
         await message.reply(
             f"✅ Reload OK.\n• Badwords: {len(BAD_WORDS)}\n• Allowed domains: {len(ALLOWED_LINK_DOMAINS)}"
         )
@@ -910,7 +3004,7 @@ async def reload_badwords_cmd(client, message):
         logger.exception("reload_config failed")
         await message.reply("❌ Gagal reload config. Cek log.")
 
-@app.on_message(filters.command("warn") & filters.group)
+@features.on_message("moderation", filters.command("warn") & filters.group)
 async def warn_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
@@ -930,17 +3024,17 @@ async def warn_cmd(client, message):
             logger.error(f"Mute gagal: {e}")
     else:
         await message.reply_text(f"⚠️ {target.mention} mendapatkan peringatan {count}/{WARN_MUTE_THRESHOLD}.", quote=True)
-    mod_log(_modlog_line("WARN", message.from_user, target, reason, extra))
+    await mod_log("WARN", message.chat.id, message.from_user, target, reason, extra)
 
-@app.on_message(filters.command("warns") & filters.group)
+@features.on_message("moderation", filters.command("warns") & filters.group)
 async def warns_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
     target = message.reply_to_message.from_user if message.reply_to_message and message.reply_to_message.from_user else message.from_user
-    cnt = get_warn_count(message.chat.id, target.id)
+    cnt = await get_warn_count(message.chat.id, target.id)
     await message.reply_text(f"ℹ️ Warn {target.mention}: {cnt}/{WARN_MUTE_THRESHOLD}", quote=True)
 
-@app.on_message(filters.command("resetwarn") & filters.group)
+@features.on_message("moderation", filters.command("resetwarn") & filters.group)
 async def resetwarn_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
@@ -949,9 +3043,9 @@ async def resetwarn_cmd(client, message):
         await message.reply_text("Balas pesan user yang ingin direset peringatannya."); return
     await clear_warns(message.chat.id, target.id)
     await message.reply_text(f"✅ Warn {target.mention} direset.")
-    mod_log(_modlog_line("RESETWARN", message.from_user, target))
+    await mod_log("RESETWARN", message.chat.id, message.from_user, target)
 
-@app.on_message(filters.command("mute") & filters.group)
+@features.on_message("moderation", filters.command("mute") & filters.group)
 async def mute_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
@@ -963,11 +3057,11 @@ async def mute_cmd(client, message):
     try:
         await mute_user(client, message.chat.id, target.id, seconds)
         await message.reply_text(f"🔇 {target.mention} di-mute {seconds//60} menit.")
-        mod_log(_modlog_line("MUTE", message.from_user, target, extra=f"{seconds}s"))
+        await mod_log("MUTE", message.chat.id, message.from_user, target, extra=f"{seconds}s")
     except Exception as e:
         await message.reply_text("❌ Gagal mute. Pastikan bot admin."); logger.error(f"/mute error: {e}")
 
-@app.on_message(filters.command("unmute") & filters.group)
+@features.on_message("moderation", filters.command("unmute") & filters.group)
 async def unmute_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
@@ -977,11 +3071,11 @@ async def unmute_cmd(client, message):
     try:
         await unmute_user(client, message.chat.id, target.id)
         await message.reply_text(f"✅ {target.mention} sudah boleh bicara lagi.")
-        mod_log(_modlog_line("UNMUTE", message.from_user, target))
+        await mod_log("UNMUTE", message.chat.id, message.from_user, target)
     except Exception as e:
         await message.reply_text("❌ Gagal unmute."); logger.error(f"/unmute error: {e}")
 
-@app.on_message(filters.command("ban") & filters.group)
+@features.on_message("moderation", filters.command("ban") & filters.group)
 async def ban_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
@@ -991,11 +3085,11 @@ async def ban_cmd(client, message):
     try:
         await ban_user(client, message.chat.id, target.id)
         await message.reply_text(f"🚫 {target.mention} di-ban.")
-        mod_log(_modlog_line("BAN", message.from_user, target))
+        await mod_log("BAN", message.chat.id, message.from_user, target)
     except Exception as e:
         await message.reply_text("❌ Gagal ban."); logger.error(f"/ban error: {e}")
 
-@app.on_message(filters.command("kick") & filters.group)
+@features.on_message("moderation", filters.command("kick") & filters.group)
 async def kick_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
@@ -1005,11 +3099,74 @@ async def kick_cmd(client, message):
     try:
         await kick_user(client, message.chat.id, target.id)
         await message.reply_text(f"👢 {target.mention} di-kick.")
-        mod_log(_modlog_line("KICK", message.from_user, target))
+        await mod_log("KICK", message.chat.id, message.from_user, target)
     except Exception as e:
         await message.reply_text("❌ Gagal kick."); logger.error(f"/kick error: {e}")
 
-@app.on_message(filters.command("del") & filters.group)
+MODLOG_PAGE = 15
+
+def _format_mod_events(rows: list[dict], show_chat: bool = False, show_target: bool = True) -> list[str]:
+    lines = []
+    for r in rows:
+        when = datetime.fromtimestamp(r["ts"], JAKARTA_TZ).strftime("%Y-%m-%d %H:%M")
+        actor = f"@{r['actor_name']}" if r["actor_name"] and r["actor_name"] != "system" else (
+            str(r["actor_id"]) if r["actor_id"] else "sistem")
+        line = f"<code>{when}</code> <b>{r['action']}</b>"
+        if show_target:
+            line += f" → {('@' + r['target_name']) if r['target_name'] else r['target_id']}"
+        line += f" oleh {html_escape(actor)}"
+        if show_chat and r["chat_id"] is not None:
+            line += f" di {r['chat_id']}"
+        if r["reason"]:
+            line += f" — {html_escape(r['reason'])}"
+        if r["extra"]:
+            line += f" ({html_escape(r['extra'])})"
+        lines.append(line)
+    return lines
+
+@features.on_message("moderation", filters.command("modlog"))
+async def modlog_cmd(client, message):
+    """
+    Riwayat moderasi dari mod_audit (query ber-index, tanpa scan file).
+    Grup (operator): reply pesan user → riwayat user itu di grup ini; tanpa reply → aksi terbaru grup.
+    Private (owner): /modlog <user_id|@username> → riwayat user di semua grup.
+    """
+    if not message.from_user: return
+    in_group = message.chat and message.chat.type in (ChatType.GROUP, ChatType.SUPERGROUP)
+    if in_group:
+        if not await _is_operator(client, message): return
+    elif not is_owner(message):
+        await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
+
+    arg = message.command[1] if len(message.command) > 1 else None
+    reply_user = message.reply_to_message.from_user if message.reply_to_message else None
+    chat_filter = message.chat.id if in_group else None
+    try:
+        if reply_user:
+            title = f"user {reply_user.mention}"
+            rows = await asyncio.to_thread(mod_audit.for_target, reply_user.id, chat_id=chat_filter, limit=MODLOG_PAGE)
+        elif arg and arg.lstrip("-").isdigit():
+            title = f"user <code>{arg}</code>"
+            rows = await asyncio.to_thread(mod_audit.for_target, int(arg), chat_id=chat_filter, limit=MODLOG_PAGE)
+        elif arg:
+            title = f"user @{html_escape(arg.lstrip('@'))}"
+            rows = await asyncio.to_thread(mod_audit.for_target, username=arg, chat_id=chat_filter, limit=MODLOG_PAGE)
+        elif in_group:
+            title = "grup ini"
+            rows = await asyncio.to_thread(mod_audit.for_chat, message.chat.id, limit=MODLOG_PAGE)
+        else:
+            await message.reply("Pakai: /modlog <user_id|@username> (atau reply pesan user di grup)."); return
+    except Exception as e:
+        logger.error(f"/modlog error: {e}")
+        await message.reply("❌ Gagal membaca audit moderasi."); return
+
+    if not rows:
+        await message.reply(f"🛡️ Belum ada catatan moderasi untuk {title}.", parse_mode=ParseMode.HTML); return
+    lines = [f"🛡️ <b>Riwayat moderasi</b> {title} ({len(rows)} terbaru):", ""]
+    lines += _format_mod_events(rows, show_chat=not in_group, show_target=not (reply_user or arg))
+    await message.reply("\n".join(lines), parse_mode=ParseMode.HTML)
+
+@features.on_message("moderation", filters.command("del") & filters.group)
 async def del_cmd(client, message):
     if not message.from_user: return
     if not await _is_operator(client, message): return
@@ -1035,18 +3192,19 @@ def _extract_domains(text: str):
             continue
     return domains
 
-@app.on_message(filters.text & filters.group, group=5)  # group bebas, asal tidak tabrakan
+@features.on_message("moderation", filters.text & filters.group, group=5)  # group bebas, asal tidak tabrakan
 async def moderation_guard(client, message):
     text = (message.text or message.caption or "").strip()
     if not text:
         return
 
     # 1) Filter badwords
-    if BAD_WORDS and BAD_WORDS_RE.search(text):
+    if BAD_WORDS and (bad := BAD_WORDS_RE.search(text)):
         try:
             await message.delete()
         except Exception:
             pass
+        await mod_log("AUTO_BADWORD", message.chat.id, None, message.from_user, extra=bad.group(0)[:64])
         try:
             await message.reply("⚠️ Bahasa jaga ya, hindari kata-kata kasar.")
         except Exception:
@@ -1064,6 +3222,7 @@ async def moderation_guard(client, message):
                 await message.delete()
             except Exception:
                 pass
+            await mod_log("AUTO_LINK", message.chat.id, None, message.from_user, extra=(urlparse(u).netloc or u)[:64])
             try:
                 await message.reply("🔗 Link luar tidak diizinkan di sini.")
             except Exception:
@@ -1072,16 +3231,15 @@ async def moderation_guard(client, message):
 
 # --- Perintah Umum ---
 
-from pyrogram.enums import ParseMode
 
-@app.on_message(filters.command("start") & filters.private)
+@features.on_message("core", filters.command("start") & filters.private)
 async def start_command(client, message):
     if len(message.command) > 1:
         param = message.command[1].lower()
 
         # === START LAPOR ===
         if param == "lapor":
-            grant_xp_for_command(message, "lapor")
+            await grant_xp_for_command(message, "lapor")
             user_id = message.from_user.id
             if user_id not in waiting_lapor_users:
                 waiting_lapor_users.add(user_id)
@@ -1104,9 +3262,12 @@ async def start_command(client, message):
         # === START KOLEKSI ===
         else:
             start_param = param
+            t0 = time.perf_counter()
             stream_link, _ = get_stream_data(start_param)
 
             if not stream_link:
+                if "dashboard" in features:
+                    funnel.event("start", "unknown_code", start_param)
                 await message.reply(
                     f"❌ KODE <code>{start_param}</code> tidak ditemukan.\n\n"
                     f"Silakan periksa kembali kodenya di channel @{CHANNEL_USERNAME}.\n\n"
@@ -1136,10 +3297,14 @@ async def start_command(client, message):
                 reply_markup=InlineKeyboardMarkup(buttons),
                 parse_mode=ParseMode.HTML
             )
+            if "dashboard" in features:
+                funnel.event("start", "shown", start_param, time.perf_counter() - t0)
+                funnel.started(message.from_user.id, start_param)
 
             logger.info(
                 f"User {message.from_user.id} (@{message.from_user.username or 'unknown'}) "
-                f"requested code '{start_param}'."
+                f"requested code '{start_param}'.",
+                extra={"event": "start"},
             )
             return
 
@@ -1163,6 +3328,7 @@ async def start_command(client, message):
         "• <code>/list</code> → Daftar koleksi\n"
         "• <code>/search</code> → Cari koleksi\n"
         "• <code>/random</code> → Pilih koleksi random\n"
+        "• <code>/trending</code> → Koleksi yang lagi rame\n"
         "• <code>/joinvip</code> → Unlock full koleksi\n"
         "• <code>/request</code> → Request koleksi\n"
         "• <code>/about</code> → Tentang bot ini\n"
@@ -1178,14 +3344,14 @@ async def start_command(client, message):
 
     await message.reply(teks, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
 
-@app.on_message(filters.command("stats"))
+@features.on_message("dashboard", filters.command("stats"))
 async def stats_command(client, message):
     if not is_owner(message):  # <-
         await message.reply("❌ Perintah ini hanya untuk OWNER, gak penting kok buat kamu.")
         return
     try:
         period_days = 7
-        stats = parse_clicks_log_json(days_back=period_days)
+        stats = (await dashboard_snapshots.get(period_days))["stats"]
         if stats["status"] in ("no_log_file", "read_error", "no_recent_clicks"):
             text = (
                 f"📈 Statistik ({period_days} hari)\n\n"
@@ -1218,7 +3384,7 @@ async def stats_command(client, message):
         logger.error(f"Error di /stats: {e}")
         await message.reply("❌ Terjadi kesalahan saat menghasilkan statistik.")
 
-@app.on_message(filters.command("log"))
+@features.on_message("dashboard", filters.command("log"))
 async def log_command(client, message):
     """OWNER: tampilkan 20 baris terakhir klik human log."""
     if not is_owner(message):
@@ -1237,25 +3403,26 @@ async def log_command(client, message):
         logger.error(f"Gagal membaca clicks_human.log: {e}")
         await message.reply("❌ Gagal membaca file log.")
 
-@app.on_message(filters.command("dashboard"))
+@features.on_message("dashboard", filters.command("dashboard"))
 async def dashboard_command(client, message):
     if not is_owner(message):  # <-
         await message.reply("❌ Gak usah kepo! Perintah ini hanya untuk OWNER.")
         return
     try:
         period_days = 7
-        text = build_dashboard_text(period_days)
+        text = await dashboard_snapshots.text(period_days)
         kb = build_dashboard_keyboard(period_days)
         await message.reply(text, reply_markup=kb, parse_mode=ParseMode.MARKDOWN)
     except Exception as e:
         logger.error(f"Error di /dashboard: {e}")
         await message.reply("❌ Error memuat dashboard.")
 
-@app.on_callback_query(filters.regex(r"^dashboard:\d+$"))
+@features.on_callback_query("dashboard", filters.regex(r"^dashboard:\d+(:r)?$"))
 async def dashboard_cb_period(client, cq: CallbackQuery):
     try:
-        period_days = int(cq.data.split(":")[1])
-        text = build_dashboard_text(period_days)
+        parts = cq.data.split(":")
+        period_days = int(parts[1])
+        text = await dashboard_snapshots.text(period_days, force=len(parts) > 2)
         kb = build_dashboard_keyboard(period_days)
         try:
             await cq.message.edit_text(text, reply_markup=kb, parse_mode=ParseMode.MARKDOWN)
@@ -1266,23 +3433,49 @@ async def dashboard_cb_period(client, cq: CallbackQuery):
         logger.error(f"Error dashboard callback: {e}")
         await cq.answer("❌ Gagal memperbarui dashboard.", show_alert=False)
 
-@app.on_message(filters.command("reload_interaction") & filters.user(OWNER_ID))
+@features.on_message("dashboard", filters.command("report"))
+async def report_command(client, message):
+    """OWNER: /report [hari] → ringkasan + CSV agregasi click log (per kode/jam, hari×jam, frekuensi user)."""
+    if not is_owner(message):
+        await message.reply("❌ Gak usah kepo! Perintah ini hanya untuk OWNER.")
+        return
+    days = 30
+    if len(message.command) > 1 and message.command[1].isdigit():
+        days = max(1, min(int(message.command[1]), 365))
+    try:
+        result = await asyncio.to_thread(build_click_report, days)
+    except Exception as e:
+        logger.error(f"Error di /report: {e}")
+        await message.reply("❌ Gagal membuat report.")
+        return
+    if result is None:
+        await message.reply("⚠️ NumPy belum terpasang di server (pip install numpy).")
+        return
+    summary, data = result
+    if not data:
+        await message.reply(summary, parse_mode=ParseMode.HTML)
+        return
+    doc = io.BytesIO(data)
+    doc.name = f"report_klik_{days}d_{datetime.now(JAKARTA_TZ):%Y%m%d_%H%M}.csv"
+    await message.reply_document(doc, caption=summary, parse_mode=ParseMode.HTML)
+
+@features.on_message("interaction", filters.command("reload_interaction") & filters.user(OWNER_ID))
 async def reload_interaction_cmd(client, message):
     try:
-        load_interaction_config()
+        await asyncio.to_thread(load_interaction_config)
         await message.reply(f"✅ Reload Interaction OK. ({len(INTERACTION_MESSAGES)} pesan, interval {INTERACTION_INTERVAL_MINUTES}m)")
     except Exception:
         await message.reply("❌ Gagal reload interaction config. Cek log.")
 
-@app.on_message(filters.command("list"))
+@features.on_message("catalog", filters.command("list"))
 async def list_command(client, message):
-    grant_xp_for_command(message, "list")
+    await grant_xp_for_command(message, "list")
     user_id = message.from_user.id
     username = message.from_user.username or ""
     log_user_activity(user_id, username)
 
     # --- Gabungan cek akses ---
-    if not (is_owner(message) or is_admin(message) or has_stellar_or_higher(user_id)):
+    if not (is_owner(message) or is_admin(message) or await has_stellar_or_higher(user_id)):
         teks = (
             "❌ <b>Akses Ditolak!</b>\n\n"
             "Fitur ini hanya tersedia untuk pengguna dengan badge tingkat lanjut:\n"
@@ -1298,12 +3491,11 @@ async def list_command(client, message):
         return
     # --------------------------
 
-    codes = sorted(list(STREAM_MAP.keys()))
-    if not codes:
+    if not STREAM_MAP:
         await message.reply("📭 Daftar koleksi kosong.")
         return
     
-    page_codes, page, pages, total = paginate_codes(codes, 1)
+    page_codes, page, pages, total, keyboard = get_list_page(1)
 
     txt = (f"📜 DAFTAR KOLEKSI BANGSA BACOL\n"
            "Pilih kode di bawah untuk melihat detail:")
@@ -1311,10 +3503,10 @@ async def list_command(client, message):
     await message.reply(
         txt,
         parse_mode=ParseMode.MARKDOWN,
-        reply_markup=build_list_keyboard(page_codes, page, pages)
+        reply_markup=keyboard
     )
 
-@app.on_message(filters.command("healthcheck") & filters.private)
+@features.on_message("health", filters.command("healthcheck") & filters.private)
 async def healthcheck_cmd(client, message):
     checked_at = datetime.now(JAKARTA_TZ).strftime("%Y-%m-%d %H:%M:%S %Z")
     """OWNER: Health check semua URL di STREAM_MAP."""
@@ -1324,8 +3516,11 @@ async def healthcheck_cmd(client, message):
     try:
         await message.reply_text("🔄 Sedang melakukan health check semua URLs...")
         results = await health_check_all_urls()
+        disk_info = await asyncio.to_thread(disk_governor.health_lines)
+        loop_info = "\n".join(loop_watchdog.health_lines() + startup_health_lines() + logging_health_lines()
+                              + disk_info)
         if not results:
-            await message.reply_text("❌ Tidak ada URL untuk di-check."); return
+            await message.reply_text(f"❌ Tidak ada URL untuk di-check.\n\n{loop_info}", parse_mode=ParseMode.MARKDOWN); return
         healthy_count = sum(1 for r in results if r['is_healthy'])
         total_count = len(results)
         success_rate = (healthy_count / total_count * 100) if total_count > 0 else 0
@@ -1337,6 +3532,8 @@ async def healthcheck_cmd(client, message):
 📈 Success Rate: {success_rate:.1f}%
 f"🕐 checked_at: {checked_at}"
 
+{loop_info}
+
 Detail (maks 20):
 """
         for r in results[:20]:
@@ -1351,7 +3548,7 @@ Detail (maks 20):
         await message.reply_text(f"❌ Error during health check: {str(e)}")
 
 # Extra: prune logs command (owner)
-@app.on_message(filters.command("prune_logs"))
+@features.on_message("dashboard", filters.command("prune_logs"))
 async def prune_logs_cmd(client, message):
     if not is_owner(message):
         await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
@@ -1361,11 +3558,118 @@ async def prune_logs_cmd(client, message):
             days = max(1, int(message.command[1]))
     except Exception:
         pass
-    prune_clicks_log(days)
-    await message.reply(f"🧹 Log dikompak untuk {days} hari terakhir.")
+    await asyncio.to_thread(prune_clicks_log, days)
+    await asyncio.to_thread(prune_clicks_human, days)
+    report = await asyncio.to_thread(disk_governor.enforce)
+    await message.reply(f"🧹 Log dikompak untuk {days} hari terakhir. "
+                        f"Disk: {_fmt_bytes(report['total'])}, {report['deleted']} segmen dihapus.")
+
+@features.on_message("health", filters.command("outbox"))
+async def outbox_cmd(client, message):
+    """OWNER: status antrian kirim (outbound queue)."""
+    if not is_owner(message):
+        await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
+    snap = outbox.snapshot()
+    q = snap["queued"]
+    await message.reply(
+        "📤 <b>Outbound Queue</b>\n"
+        f"• Antri: user {q[PRIO_USER]} | owner {q[PRIO_OWNER]} | broadcast {q[PRIO_BROADCAST]}\n"
+        f"• Latensi antri p50/p99/max: {snap['latency_p50_ms']:.0f} / {snap['latency_p99_ms']:.0f} / {snap['latency_max_ms']:.0f} ms\n"
+        f"• Terkirim: {snap['sent']} • Gagal: {snap['failed']} • Ditolak: {snap['dropped']}\n"
+        f"• FloodWait: {snap['floodwait']} • Retry: {snap['retried']}",
+        parse_mode=ParseMode.HTML,
+    )
+
+@features.on_message("health", filters.command("loglevel"))
+async def loglevel_cmd(client, message):
+    """OWNER: /loglevel [logger] [LEVEL] → lihat/ubah level log saat runtime (tanpa restart)."""
+    if not is_owner(message):
+        await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
+    args = message.command[1:]
+    if args:
+        name, level = (args[0], args[1]) if len(args) > 1 else (logger.name, args[0])
+        level = level.upper()
+        if not isinstance(logging.getLevelName(level), int):
+            await message.reply("⚠️ Level: DEBUG, INFO, WARNING, ERROR, CRITICAL."); return
+        logging.getLogger(name).setLevel(level)
+        logger.warning(f"Level log {name} diubah ke {level} oleh owner")
+    lines = ["📝 <b>Level log</b>"]
+    for name in (logger.name, "pyrogram"):
+        lines.append(f"• {name}: {logging.getLevelName(logging.getLogger(name).getEffectiveLevel())}")
+    lines += [""] + logging_health_lines()
+    await message.reply("\n".join(lines), parse_mode=ParseMode.HTML)
+
+@features.on_message("health", filters.command("logsample"))
+async def logsample_cmd(client, message):
+    """OWNER: /logsample [event every:N|rate:N|off] → lihat/ubah aturan sampling log hot path."""
+    if not is_owner(message):
+        await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
+    args = message.command[1:]
+    if len(args) == 2:
+        try:
+            log_sampler.set_rule(args[0], args[1].lower())
+        except ValueError as e:
+            await message.reply(f"⚠️ {e}"); return
+    elif args:
+        await message.reply("Pakai: /logsample [event every:N|rate:N|off] (event: start, click, tick)"); return
+    rules = log_sampler.describe() or ["(tidak ada aturan — semua log ditulis)"]
+    await message.reply("🎚️ <b>Sampling log</b>\n" + "\n".join(f"• {r}" for r in rules), parse_mode=ParseMode.HTML)
+
+@features.on_message("health", filters.command("perf"))
+async def perf_cmd(client, message):
+    """OWNER: ringkasan trace handler terbaru (ring buffer) dan handler lambat."""
+    if not is_owner(message):
+        await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
+    traces = list(RECENT_TRACES)
+    if not traces:
+        await message.reply("⏱️ Belum ada trace handler."); return
+    by_handler = defaultdict(list)
+    for tr in traces:
+        by_handler[tr.handler].append(tr)
+    lines = [f"⏱️ <b>Perf</b> — {len(traces)} trace terakhir (lambat ≥ {SLOW_HANDLER_MS:.0f}ms)", ""]
+    rows = sorted(by_handler.items(), key=lambda kv: _percentile([t.wall for t in kv[1]], 95), reverse=True)
+    for name, trs in rows[:10]:
+        walls = [t.wall for t in trs]
+        n = len(trs)
+        lines.append(
+            f"• <code>{name}</code> n={n} p50={_percentile(walls, 50) * 1000:.0f}ms "
+            f"p95={_percentile(walls, 95) * 1000:.0f}ms | tg {sum(t.tg for t in trs) / n * 1000:.0f} "
+            f"io {sum(t.io for t in trs) / n * 1000:.0f} cpu {sum(t.cpu for t in trs) / n * 1000:.0f} "
+            f"other/loop {sum(t.other for t in trs) / n * 1000:.0f}ms"
+        )
+    slow = list(SLOW_TRACES)[-5:]
+    if slow:
+        lines += ["", "🐢 <b>Lambat terakhir:</b>"]
+        for tr in reversed(slow):
+            when = datetime.fromtimestamp(tr.started, JAKARTA_TZ).strftime("%H:%M:%S")
+            lines.append(f"• {when} <code>{html_escape(tr.summary())}</code>")
+    await message.reply("\n".join(lines), parse_mode=ParseMode.HTML)
+
+@features.on_message("health", filters.command("cachestats"))
+async def cachestats_cmd(client, message):
+    """OWNER: statistik semua cache (/cachestats [clear nama])."""
+    if not is_owner(message):
+        await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
+    args = message.command[1:]
+    if len(args) == 2 and args[0].lower() == "clear":
+        cache = TTLCache.registry.get(args[1])
+        if not cache:
+            await message.reply(f"❌ Cache tidak dikenal. Pilihan: {', '.join(TTLCache.registry)}"); return
+        cache.invalidate()
+        await message.reply(f"🧹 Cache <code>{cache.name}</code> dikosongkan.", parse_mode=ParseMode.HTML); return
+    lines = ["🗃️ <b>Cache</b>", ""]
+    for name, cache in TTLCache.registry.items():
+        st = cache.snapshot()
+        lines.append(
+            f"• <code>{name}</code> {st['size']}/{st['maxsize']} (ttl {st['ttl']:.0f}s) "
+            f"hit {st['hit_rate'] * 100:.1f}% ({st['hits']}/{st['hits'] + st['misses']}) | "
+            f"load {st['loads']} evict {st['evictions']} exp {st['expired']} inval {st['invalidations']}"
+        )
+    lines += ["", "Kosongkan: <code>/cachestats clear nama</code>"]
+    await message.reply("\n".join(lines), parse_mode=ParseMode.HTML)
 
 # --- Admin-Only: manage links ---
-@app.on_message(filters.command("add") & filters.private)
+@features.on_message("catalog", filters.command("add") & filters.private)
 async def add_link_command(client, message):
     if not is_owner(message):
         await message.reply("❌ Ngapain?! Perintah ini hanya untuk owner.")
@@ -1402,7 +3706,7 @@ async def add_link_command(client, message):
             parse_mode=ParseMode.MARKDOWN,
         )
 
-@app.on_message(filters.command("delete") & filters.private)
+@features.on_message("catalog", filters.command("delete") & filters.private)
 async def delete_link_command(client, message):
     if not is_owner(message):
         await message.reply("❌ Kamu siapa? Perintah ini hanya untuk owner.")
@@ -1436,10 +3740,9 @@ BADGE_TIERS = [
     ("Stranger 🔰", 0),
 ]
 
-def has_shimmer_or_higher(user_id: int) -> bool:
+async def has_shimmer_or_higher(user_id: int) -> bool:
     """Cek apakah user minimal punya badge Shimmer 🥉 atau lebih tinggi."""
-    data = load_user_data()
-    info = data.get(str(user_id), {})
+    info = await get_user_record(user_id)
     xp = int(info.get("xp", 0))
     badge = _badge_for_xp(xp)
     return badge in ["Shimmer 🥉", "Stellar 🥈", "Starlord 🥇"]
@@ -1472,7 +3775,7 @@ def _progress_bar(xp: int) -> str:
     filled = max(0, min(5, filled))
     return "▰" * filled + "▱" * (5 - filled)
 
-@app.on_message(filters.command("profile"))
+@features.on_message("xp", filters.command("profile"))
 async def profile_cmd(client, message):
     user = message.from_user
     if not user:
@@ -1481,16 +3784,15 @@ async def profile_cmd(client, message):
     username = user.username or "-"
 
     # Tambah XP lewat helper (maks 1x per hari per command)
-    grant_xp_for_command(message, "profile")
+    await grant_xp_for_command(message, "profile")
 
     # Ambil data user
-    data = load_user_data()
-    info = data.get(str(user_id), {
+    info = await state_call(state.get_user, user_id) or {
         "username": username,
         "xp": 0,
         "badge": "Stranger 🔰",
         "last_xp_dates": {}
-    })
+    }
     xp = int(info.get("xp", 0))
     badge = _badge_for_xp(xp)
 
@@ -1562,9 +3864,9 @@ async def profile_cmd(client, message):
 
     await message.reply_text(teks, parse_mode=ParseMode.HTML)
 
-@app.on_message(filters.command("panduan"))
+@features.on_message("core", filters.command("panduan"))
 async def cmd_panduan(client, message):
-    grant_xp_for_command(message, "panduan")
+    await grant_xp_for_command(message, "panduan")
     user = message.from_user.first_name if message.from_user else "Pengguna"
     username = f"@{message.from_user.username}" if (message.from_user and message.from_user.username) else user
 
@@ -1614,7 +3916,7 @@ Mau akses lebih cepat? Gabung <b>VIP BangsaBacol</b>. Karena para Admin & Menter
 # ============================================================
 # 6) HANDLER OWNER-ONLY
 # ============================================================
-@app.on_message(filters.command("helper") & filters.private)
+@features.on_message("core", filters.command("helper") & filters.private)
 async def cmd_helper(_: Client, m) -> None:
     user_id = m.from_user.id
 
@@ -1657,9 +3959,9 @@ Menambahkan update ke <b>stream.json</b>
 
 # --- General ---
 
-@app.on_message(filters.command("bot"))
+@features.on_message("core", filters.command("bot"))
 async def bot_command(client, message):
-    grant_xp_for_command(message, "bot")
+    await grant_xp_for_command(message, "bot")
     # Tombol → baris 1 (utama), baris 2 (mirror + lapor)
     buttons = [
         [InlineKeyboardButton("✅ BOT UTAMA", url=f"https://t.me/{BOT_MIRRORS[0]['username']}")],
@@ -1690,14 +3992,14 @@ async def bot_command(client, message):
 
     await message.reply(teks, reply_markup=kb, parse_mode=ParseMode.HTML)
 
-@app.on_message(filters.command("ping"))
+@features.on_message("core", filters.command("ping"))
 async def ping_cmd(client, message):
-    grant_xp_for_command(message, "ping")
+    await grant_xp_for_command(message, "ping")
     await message.reply("✅ Pong! Bot aktif dan responsif.")
 
-@app.on_message(filters.private & filters.command("profile"))
+@features.on_message("xp", filters.private & filters.command("profile"))
 async def profile_command(client: Client, message: Message):
-    user = update_user_xp(message.from_user.id, message.from_user.username, "profile")
+    user = await update_user_xp(message.from_user.id, message.from_user.username, "profile")
 
     # progress badge
     xp = int(user.get("xp", 0))
@@ -1753,9 +4055,9 @@ async def profile_command(client: Client, message: Message):
     )
     await message.reply_text(text, disable_web_page_preview=True)
 
-@app.on_message(filters.command("random"))
+@features.on_message("catalog", filters.command("random"))
 async def random_command(client, message):
-    grant_xp_for_command(message, "random")
+    await grant_xp_for_command(message, "random")
     user_id = message.from_user.id
 
     log_user_activity(user_id, message.from_user.username or "")
@@ -1792,23 +4094,32 @@ async def random_command(client, message):
         await message.reply_text("⚠️ Tidak ada koleksi valid.")
         return
 
-    kode, link, thumb = random.choice(valid)
+    # /random trending → acak berbobot dari kode yang sedang naik; fallback ke acak biasa
+    title = "🎲 Koleksi Random"
+    pick = None
+    if len(message.command) > 1 and message.command[1].lower() == "trending":
+        pick = trending.pick({k for k, _, _ in valid})
+    if pick:
+        kode, link, thumb = next(item for item in valid if item[0] == pick)
+        title = "🔥 Koleksi Trending"
+    else:
+        kode, link, thumb = random.choice(valid)
     kb = InlineKeyboardMarkup([[InlineKeyboardButton("🔗 TONTON SEKARANG", url=link)]])
-    caption = f"🎲 Koleksi Random\n<b>Kode:</b> <code>{kode}</code>\n<i>Sisa jatah hari ini: {remaining_after}/{limit}</i>"
+    caption = f"{title}\n<b>Kode:</b> <code>{kode}</code>\n<i>Sisa jatah hari ini: {remaining_after}/{limit}</i>"
 
     if thumb and Path(f"Img/{thumb}").exists():
         await message.reply_photo(photo=f"Img/{thumb}", caption=caption, reply_markup=kb, parse_mode=ParseMode.HTML)
     else:
         await message.reply_text(caption, reply_markup=kb, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
 
-@app.on_message(filters.command("quota"))
+@features.on_message("catalog", filters.command("quota"))
 async def quota_command(client, message):
     used, remaining, limit, reset_sec = await get_random_quota_status(message.from_user.id)
     await message.reply_text(
         f"📊 Jatah /random kamu hari ini:\nDipakai: {used}\nSisa: {remaining}\nLimit: {limit}\nReset: { _format_eta(reset_sec) } lagi"
     )
 
-@app.on_message(filters.command("help") & filters.private)
+@features.on_message("core", filters.command("help") & filters.private)
 async def help_command(_: Client, m):
     # cek owner
     if m.from_user.id != OWNER_ID:
@@ -1820,8 +4131,9 @@ async def help_command(_: Client, m):
 
 👥 <b>Untuk Semua Pengguna:</b>
 • <code>/start</code> Kode → Buka koleksi
-• <code>/random</code> → Pilih koleksi acak
-• <code>/top</code> → Top user paling aktif (leaderboard)
+• <code>/random</code> [trending] → Pilih koleksi acak (opsional: dari yang lagi trending)
+• <code>/trending</code> → Koleksi paling rame akhir-akhir ini
+• <code>/top</code> [harian|mingguan] → Top user paling aktif (leaderboard)
 • <code>/panduan</code> → Cara penggunaan bot
 • <code>/ping</code> → Cek status bot
 • <code>/joinvip</code> → Unlock Full Koleksi
@@ -1837,6 +4149,7 @@ async def help_command(_: Client, m):
 • <code>/unban @username</code> → unblokir user
 • <code>/kick @username</code> → keluarkan user dari group
 • <code>/warn @username</code> → beri peringatan (misalnya spam atau badwords)
+• <code>/modlog</code> [@username] → riwayat moderasi user (reply) atau grup
 • <code>/clean</code> → hapus pesan terakhir (spam / iklan)
 • <code>/badwords</code> → tampilkan daftar kata terlarang
 
@@ -1846,11 +4159,20 @@ async def help_command(_: Client, m):
 • <code>/stats</code> → Akses 7 hari terakhir
 • <code>/log</code> → 20 log terakhir
 • <code>/dashboard</code> → Dashboard interaktif
+• <code>/report</code> [hari] → Report CSV klik (per kode/jam, hari×jam, frekuensi user)
+• <code>/cohort</code> [hari] → DAU/WAU/MAU + retensi user baru
+• <code>/funnel</code> [jam] [kode] → Funnel /start → BUKA KOLEKSI → klik
 • <code>/healthcheck</code> → Cek URL koleksi
 • <code>/add</code> Kode Link Thumb → Update koleksi
 • <code>/delete</code> Kode → Hapus koleksi
 • <code>/helper</code> → Reminder
 • <code>/prune_logs</code> Hari → Pangkas log klik sesuai hari
+• <code>/outbox</code> → Status antrian kirim pesan
+• <code>/perf</code> → Trace performa handler terbaru
+• <code>/cachestats</code> → Statistik cache (hit/miss/eviction)
+• <code>/loglevel</code> [logger] [LEVEL] → Ubah level log tanpa restart
+• <code>/logsample</code> [event aturan] → Sampling log hot path (every:N, rate:N, off)
+• <code>/lapor_flush</code> → Teruskan laporan yang masih antri
 • <code>/reload_badwords</code> → Update Badwords
 • <code>/reload_interaction</code> → Update pesan interaksi periodik
 • <code>/reset_top</code> → Reset data leaderboard (top user)
@@ -1858,9 +4180,9 @@ async def help_command(_: Client, m):
     await m.reply_text(teks, parse_mode=ParseMode.HTML, disable_web_page_preview=True)
 
 # -------------------- ABOUT --------------------
-@app.on_message(filters.command("about"))
+@features.on_message("core", filters.command("about"))
 async def about_command(client, message):
-    grant_xp_for_command(message, "about")
+    await grant_xp_for_command(message, "about")
     teks = """
 ◢ ℹ️ <b>ABOUT</b> ◣
 
@@ -1882,9 +4204,9 @@ Sedangkan <b>Admin & Menteri</b> aktif di Channel VIP.
 """
     await message.reply_text(teks, disable_web_page_preview=True, parse_mode=ParseMode.HTML)
 
-@app.on_message(filters.command("joinvip") & filters.private)
+@features.on_message("core", filters.command("joinvip") & filters.private)
 async def join_vip(client, message):
-    grant_xp_for_command(message, "joinvip")
+    await grant_xp_for_command(message, "joinvip")
     url_vip = "https://trakteer.id/BangsaBacol/showcase"
     keyboard = InlineKeyboardMarkup(
         [
@@ -1916,63 +4238,1086 @@ async def join_vip(client, message):
 
 # --- Leaderboard Komunitas ---
 USER_ACTIVITY_FILE = Path("data/user_activity.json")
+USER_ACTIVITY_PERIODS_FILE = DATA_DIR / "user_activity_periods.json"
+ACTIVITY_FLUSH_SECONDS = 60
+LEADERBOARD_SIZE = 10
+LEADERBOARD_PERIODS = ("daily", "weekly")
+LEADERBOARD_ALIASES = {"harian": "daily", "daily": "daily", "mingguan": "weekly", "weekly": "weekly"}
 
-def load_user_activity():
-    if USER_ACTIVITY_FILE.exists():
-        with open(USER_ACTIVITY_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+class TopK:
+    """
+    Top-K untuk counter yang hanya bertambah: simpan K entri teratas + nilai minimumnya.
+    Increment user di luar top-K yang masih <= minimum cukup O(1); penggantian O(K).
+    """
 
-def save_user_activity(data):
-    USER_ACTIVITY_FILE.parent.mkdir(parents=True, exist_ok=True)
-    with open(USER_ACTIVITY_FILE, "w", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    def __init__(self, k: int):
+        self.k = k
+        self.items: dict[str, int] = {}
+        self._min_key = None
+
+    def _refresh_min(self):
+        self._min_key = min(self.items, key=self.items.get) if self.items else None
+
+    def offer(self, key: str, count: int):
+        if key in self.items:
+            self.items[key] = count
+            if key == self._min_key:
+                self._refresh_min()
+            return
+        if len(self.items) < self.k:
+            self.items[key] = count
+            self._refresh_min()
+            return
+        if count > self.items[self._min_key]:
+            del self.items[self._min_key]
+            self.items[key] = count
+            self._refresh_min()
+
+    def ranked(self) -> list[tuple[str, int]]:
+        return sorted(self.items.items(), key=lambda x: x[1], reverse=True)
+
+class ActivityCounter:
+    """
+    Counter aktivitas user (/list, /random) di memori, di-flush berkala ke disk.
+    Menjaga top-K untuk all-time, harian, dan mingguan sehingga /top tidak perlu sort ulang.
+    """
+
+    def __init__(self, path: Path = USER_ACTIVITY_FILE, periods_path: Path = USER_ACTIVITY_PERIODS_FILE,
+                 k: int = LEADERBOARD_SIZE):
+        self.path = path
+        self.periods_path = periods_path
+        self.k = k
+        self.counts: dict[str, dict] = {}        # uid -> {"username", "count"} (format file lama)
+        self.periods: dict[str, dict] = {}       # "daily"/"weekly" -> {"key", "counts": {uid: n}}
+        self.top: dict[str, TopK] = {}
+        self.dirty = False
+        self._loaded = False
+
+    @staticmethod
+    def _period_key(kind: str) -> str:
+        now = _now_jkt()
+        if kind == "daily":
+            return now.date().isoformat()
+        year, week, _ = now.isocalendar()
+        return f"{year}-W{week:02d}"
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.counts = json.load(f)
+            if self.periods_path.exists():
+                with open(self.periods_path, "r", encoding="utf-8") as f:
+                    self.periods = json.load(f)
+        except Exception as e:
+            logger.error(f"Gagal load data aktivitas: {e}")
+        self._rebuild_top()
+
+    def _rebuild_top(self):
+        self.top = {"all": TopK(self.k)}
+        for uid, info in self.counts.items():
+            self.top["all"].offer(uid, int(info.get("count", 0)))
+        for kind in LEADERBOARD_PERIODS:
+            rec = self.periods.get(kind)
+            if not rec or rec.get("key") != self._period_key(kind):
+                rec = self.periods[kind] = {"key": self._period_key(kind), "counts": {}}
+            self.top[kind] = TopK(self.k)
+            for uid, n in rec["counts"].items():
+                self.top[kind].offer(uid, int(n))
+
+    def _roll(self, kind: str) -> dict:
+        """Mulai periode baru kalau hari/minggu sudah berganti."""
+        key = self._period_key(kind)
+        rec = self.periods.get(kind)
+        if not rec or rec["key"] != key:
+            rec = self.periods[kind] = {"key": key, "counts": {}}
+            self.top[kind] = TopK(self.k)
+        return rec
+
+    def increment(self, user_id, username: str):
+        self._ensure_loaded()
+        uid = str(user_id)
+        info = self.counts.setdefault(uid, {"username": username, "count": 0})
+        info["count"] += 1
+        info["username"] = username  # update username jika berubah
+        self.top["all"].offer(uid, info["count"])
+        for kind in LEADERBOARD_PERIODS:
+            rec = self._roll(kind)
+            n = rec["counts"][uid] = rec["counts"].get(uid, 0) + 1
+            self.top[kind].offer(uid, n)
+        self.dirty = True
+
+    def leaderboard(self, kind: str = "all") -> list[tuple[str, str, int]]:
+        """[(uid, username, count)] terurut, maks K entri."""
+        self._ensure_loaded()
+        if kind in LEADERBOARD_PERIODS:
+            self._roll(kind)
+        return [(uid, self.counts.get(uid, {}).get("username", ""), n) for uid, n in self.top[kind].ranked()]
+
+    def reset(self):
+        self._ensure_loaded()
+        self.counts, self.periods = {}, {}
+        self._rebuild_top()
+        self.dirty = True
+        self.flush()
+
+    @timed_persist("user_activity")
+    def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            _ensure_parent_dir(self.path)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.counts, f, ensure_ascii=False, indent=2)
+            with open(self.periods_path, "w", encoding="utf-8") as f:
+                json.dump(self.periods, f, ensure_ascii=False)
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Gagal flush data aktivitas: {e}")
+
+activity = ActivityCounter()
 
 def log_user_activity(user_id, username):
-    data = load_user_activity()
-    user = str(user_id)
-    if user not in data:
-        data[user] = {"username": username, "count": 0}
-    data[user]["count"] += 1
-    data[user]["username"] = username  # update username jika berubah
-    save_user_activity(data)
-
-@app.on_message(filters.command("top"))
+    activity.increment(user_id, username)
+
+async def activity_flush_worker():
+    while True:
+        await asyncio.sleep(ACTIVITY_FLUSH_SECONDS)
+        activity.flush()
+        for obj in (trending, engagement, funnel):
+            if obj.loaded:
+                obj.flush()
+
+@features.on_message("xp", filters.command("top"))
 async def top_users_command(client, message):
-    data = load_user_activity()
-    if not data:
+    arg = message.command[1].lower() if len(message.command) > 1 else ""
+    kind = LEADERBOARD_ALIASES.get(arg, "all")
+    top = activity.leaderboard(kind)
+    if not top:
         await message.reply("📊 Belum ada data aktivitas user.")
         return
-    # Urutkan berdasarkan count
-    top = sorted(data.items(), key=lambda x: x[1]["count"], reverse=True)[:10]
-    lines = ["🏆 <b>Top Bacolers</b> (paling aktif):\n"]
-    for i, (uid, info) in enumerate(top, 1):
-        uname = f"@{info['username']}" if info['username'] else f"ID:{uid}"
-        lines.append(f"{i}. {uname} — {info['count']} akses")
+    title = {"all": "paling aktif", "daily": "paling aktif hari ini", "weekly": "paling aktif minggu ini"}[kind]
+    lines = [f"🏆 <b>Top Bacolers</b> ({title}):\n"]
+    for i, (uid, uname, count) in enumerate(top, 1):
+        uname = f"@{uname}" if uname else f"ID:{uid}"
+        lines.append(f"{i}. {uname} — {count} akses")
     await message.reply("\n".join(lines), parse_mode=ParseMode.HTML)
 
-@app.on_message(filters.command("reset_top") & filters.user(OWNER_ID))
+@features.on_message("xp", filters.command("reset_top") & filters.user(OWNER_ID))
 async def reset_top_command(client, message):
-    save_user_activity({})
+    activity.reset()
     await message.reply("✅ Data leaderboard direset.")
 
+# --- Trending Koleksi ---
+TRENDING_FILE = DATA_DIR / "trending.json"
+try:
+    TRENDING_HALF_LIFE_HOURS = float(os.getenv("TRENDING_HALF_LIFE_HOURS", "6"))
+except ValueError:
+    TRENDING_HALF_LIFE_HOURS = 6.0
+TRENDING_SIZE = 20          # kandidat top-K yang selalu siap dibaca
+TRENDING_MAX_CODES = 5000   # lebih dari ini, kode dengan skor terkecil dibuang
+TRENDING_MIN_SCORE = 0.05   # skor di bawah ini dianggap sudah tidak trending
+
+class TrendingEngine:
+    """
+    Skor popularitas kode dengan peluruhan eksponensial (half-life TRENDING_HALF_LIFE_HOURS).
+
+    Skor disimpan dalam domain log terhadap waktu acuan tetap t0: klik pada waktu t menambah
+    exp(λ·(t - t0)). Update cukup O(1) (tidak perlu meluruhkan semua kode tiap event), urutan
+    antar kode tidak berubah seiring waktu, dan skor acuan hanya naik → top-K bisa pakai TopK
+    yang sama dengan leaderboard. Skor "sekarang" = exp(log_skor - λ·(now - t0)).
+    """
+
+    def __init__(self, path: Path = TRENDING_FILE, half_life_hours: float = TRENDING_HALF_LIFE_HOURS,
+                 k: int = TRENDING_SIZE, max_codes: int = TRENDING_MAX_CODES):
+        self.path = path
+        self.rate = math.log(2) / (max(half_life_hours, 0.01) * 3600)
+        self.k = k
+        self.max_codes = max_codes
+        self.t0 = time.time()
+        self.scores: dict[str, float] = {}   # kode -> log skor relatif t0
+        self.top = TopK(k)
+        self.dirty = False
+        self._loaded = False
+
+    def warmup(self) -> bool:
+        """
+        Muat snapshot; kalau belum ada, isi sekali dari click log supaya tidak mulai dari nol.
+        True kalau baru saja diisi dari click log.
+        """
+        if self._loaded:
+            return False
+        self._loaded = True
+        seeded = False
+        try:
+            if self.path.exists():
+                with open(self.path, "r", encoding="utf-8") as f:
+                    snap = json.load(f)
+                self.t0 = float(snap["t0"])
+                scores = {str(c): float(s) for c, s in snap.get("scores", {}).items()}
+                old_rate = float(snap.get("rate", self.rate))
+                if old_rate != self.rate:
+                    # half-life diganti: pertahankan skor saat ini, hitung ulang dengan laju baru
+                    shift = (time.time() - self.t0) * (self.rate - old_rate)
+                    scores = {c: s + shift for c, s in scores.items()}
+                self.scores = scores
+            elif click_log_exists():
+                self._seed_from_log()
+                seeded = True
+        except Exception as e:
+            logger.error(f"Gagal load data trending: {e}")
+        self._rebuild_top()
+        return seeded
+
+    def _seed_from_log(self):
+        for ts, _, code in iter_click_events():
+            self._add(str(code), ts)
+        self.dirty = True
+        logger.info(f"📈 Trending diisi dari click log: {len(self.scores)} kode.")
+
+    def _rebuild_top(self):
+        self.top = TopK(self.k)
+        for code, s in self.scores.items():
+            self.top.offer(code, s)
+
+    def _add(self, code: str, ts: float) -> float:
+        x = self.rate * (ts - self.t0)
+        old = self.scores.get(code)
+        # log(exp(old) + exp(x)) tanpa overflow
+        new = x if old is None else max(old, x) + math.log1p(math.exp(-abs(old - x)))
+        self.scores[code] = new
+        return new
+
+    def record(self, code: str, ts: float | None = None):
+        # append_click_log menulis klik ke log sebelum record(): kalau warmup lazy barusan
+        # mengisi skor dari log, klik ini sudah terhitung
+        if self.warmup():
+            return
+        self.top.offer(code, self._add(code, ts if ts is not None else time.time()))
+        self.dirty = True
+        if len(self.scores) > self.max_codes:
+            self._prune()
+
+    def _prune(self):
+        """Jarang terjadi: buang separuh kode dengan skor terkecil."""
+        keep = sorted(self.scores.items(), key=lambda x: x[1], reverse=True)[: self.max_codes // 2]
+        self.scores = dict(keep)
+        self._rebuild_top()
+
+    def current(self, log_score: float, now: float | None = None) -> float:
+        return math.exp(log_score - self.rate * ((now or time.time()) - self.t0))
+
+    def ranked(self, n: int | None = None, valid=None) -> list[tuple[str, float]]:
+        """[(kode, skor sekarang)] dari top-K; kode yang sudah dihapus dari `valid` dilewati."""
+        self.warmup()
+        now = time.time()
+        out = []
+        for code, s in self.top.ranked():
+            if valid is not None and code not in valid:
+                continue
+            score = self.current(s, now)
+            if score < TRENDING_MIN_SCORE:
+                break
+            out.append((code, score))
+        return out[:n] if n else out
+
+    def pick(self, valid) -> str | None:
+        """Pilih acak dari top-K dengan bobot skor; None kalau belum ada yang trending."""
+        ranked = self.ranked(valid=valid)
+        if not ranked:
+            return None
+        codes, weights = zip(*ranked)
+        return random.choices(codes, weights=weights, k=1)[0]
+
+    @timed_persist("trending")
+    def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            _ensure_parent_dir(self.path)
+            tmp = self.path.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"t0": self.t0, "rate": self.rate, "scores": self.scores}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Gagal flush data trending: {e}")
+
+trending = features.lazy("catalog", TrendingEngine)
+
+@features.on_message("catalog", filters.command("trending"))
+async def trending_command(client, message):
+    await grant_xp_for_command(message, "trending")
+    top = trending.ranked(10, valid=STREAM_MAP)
+    if not top:
+        await message.reply_text("📈 Belum ada koleksi yang lagi trending.")
+        return
+    best = top[0][1]
+    lines = [f"🔥 <b>Koleksi Trending</b> (half-life {TRENDING_HALF_LIFE_HOURS:g} jam):\n"]
+    for i, (code, score) in enumerate(top, 1):
+        bar = "▰" * max(1, round(score / best * 8))
+        lines.append(f"{i}. <code>{code}</code> {bar}")
+    lines.append("\n<i>Ketik /random trending untuk koleksi acak dari daftar ini.</i>")
+    await message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+
+# --- Engagement (bitmap user harian) ---
+ENGAGEMENT_DIR = DATA_DIR / "engagement"
+ENGAGEMENT_HEADER = struct.Struct("<II")   # index user baru hari itu: [dari, sampai)
+
+class _TodayBits:
+    """Salinan bitmap hari berjalan untuk satu /cohort: diambil di event loop, dipack sekali."""
+    __slots__ = ("day", "members", "new_from", "new_to", "_bm")
+
+    def __init__(self, day: str | None, members: tuple, new_from: int, new_to: int):
+        self.day, self.members, self.new_from, self.new_to = day, members, new_from, new_to
+        self._bm = None
+
+    def record(self) -> tuple[int, int, int]:
+        if self._bm is None:
+            self._bm = int.from_bytes(UserBitmaps._pack_bits(self.members), "little")
+        return self._bm, self.new_from, self.new_to
+
+class UserBitmaps:
+    """
+    Bitmap user aktif per hari (klik + command). Tiap user dapat index padat permanen
+    (urutan pertama kali terlihat, disimpan append-only di users.txt); bit ke-i pada
+    bitmap hari D = user index i aktif di hari D. File per hari = header [dari, sampai)
+    index user baru + bitmap terkompresi zlib, jadi cuma beberapa KB.
+
+    DAU/WAU/MAU = popcount dari OR beberapa hari; retensi N-hari = popcount(user baru
+    hari D AND bitmap D+N). Karena index urut kemunculan, kohort user baru cukup berupa
+    rentang bit, tanpa menyimpan daftar terpisah. Seperti JsonStateStore, aman untuk satu proses.
+    """
+
+    def __init__(self, root: Path = ENGAGEMENT_DIR):
+        self.root = root
+        self.users_path = root / "users.txt"
+        self.index: dict[int, int] = {}
+        self.users: list[int] = []
+        self._saved_users = 0
+        self.day: str | None = None
+        self.today: set[int] = set()
+        self.today_new_from = 0
+        self.cache = TTLCache("user_bitmaps", maxsize=400, ttl=86400)   # hari lampau tidak berubah
+        self._cache_lock = threading.Lock()   # cache dibaca /cohort (thread) & di-invalidate flush (loop)
+        self._cache_gen = 0
+        self.dirty = False
+        self._loaded = False
+
+    # --- penyimpanan ---
+
+    def _day_path(self, day: str) -> Path:
+        return self.root / f"{day}.bm"
+
+    def _read_day(self, day: str) -> tuple[int, int, int] | None:
+        """(bitmap, baru_dari, baru_sampai) atau None kalau tidak ada aktivitas tercatat."""
+        path = self._day_path(day)
+        if not path.exists():
+            return None
+        raw = path.read_bytes()
+        lo, hi = ENGAGEMENT_HEADER.unpack_from(raw)
+        return int.from_bytes(zlib.decompress(raw[ENGAGEMENT_HEADER.size:]), "little"), lo, hi
+
+    @staticmethod
+    def _pack_bits(members) -> bytes:
+        bits = bytearray((max(members, default=-1) >> 3) + 1)
+        for i in members:
+            bits[i >> 3] |= 1 << (i & 7)
+        return bytes(bits)
+
+    def _write_day(self, day: str, members, new_from: int, new_to: int):
+        _ensure_parent_dir(self._day_path(day))
+        tmp = self._day_path(day).with_suffix(".tmp")
+        tmp.write_bytes(ENGAGEMENT_HEADER.pack(new_from, new_to) + zlib.compress(self._pack_bits(members), 6))
+        os.replace(tmp, self._day_path(day))
+        with self._cache_lock:
+            self._cache_gen += 1
+            self.cache.invalidate(day)
+
+    def _save_users(self):
+        if self._saved_users == len(self.users):
+            return
+        _ensure_parent_dir(self.users_path)
+        with open(self.users_path, "a", encoding="utf-8") as f:
+            f.writelines(f"{uid}\n" for uid in self.users[self._saved_users:])
+        self._saved_users = len(self.users)
+
+    def warmup(self):
+        """Muat index user; kalau belum pernah ada data, isi sekali dari click log."""
+        if self._loaded:
+            return
+        self._loaded = True
+        try:
+            if self.users_path.exists():
+                with open(self.users_path, "r", encoding="utf-8") as f:
+                    self.users = [int(ln) for ln in f if ln.strip()]
+                self.index = {uid: i for i, uid in enumerate(self.users)}
+                self._saved_users = len(self.users)
+                today = _now_jkt().date().isoformat()
+                rec = self._read_day(today)
+                if rec:
+                    bm, lo, _ = rec
+                    self.today = {i for i in range(bm.bit_length()) if bm >> i & 1}
+                    self.day, self.today_new_from = today, lo
+            elif click_log_exists():
+                self._seed_from_log()
+        except Exception as e:
+            logger.error(f"Gagal load bitmap engagement: {e}")
+
+    def _seed_from_log(self):
+        events = sorted((ts, uid) for ts, uid, _ in iter_click_events() if uid is not None)
+        for ts, uid in events:
+            day = _click_day_of_hour(int(ts) // 3600)
+            self.mark(int(uid), day)
+        self.flush()
+        logger.info(f"👥 Bitmap engagement diisi dari click log: {len(self.users)} user.")
+
+    # --- tulis ---
+
+    def _roll(self, day: str):
+        if self.day is not None and self.today:
+            self._write_day(self.day, self.today, self.today_new_from, len(self.users))
+        self.day, self.today, self.today_new_from = day, set(), len(self.users)
+
+    def mark(self, user_id: int, day: str | None = None):
+        self.warmup()
+        day = day or _now_jkt().date().isoformat()
+        if day != self.day:
+            self._roll(day)
+        idx = self.index.get(user_id)
+        if idx is None:
+            idx = self.index[user_id] = len(self.users)
+            self.users.append(user_id)
+        if idx not in self.today:
+            self.today.add(idx)
+            self.dirty = True
+
+    @timed_persist("engagement")
+    def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            self._save_users()
+            if self.day and self.today:
+                self._write_day(self.day, self.today, self.today_new_from, len(self.users))
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Gagal flush bitmap engagement: {e}")
+
+    # --- baca ---
+
+    def snapshot(self) -> _TodayBits:
+        """Panggil dari event loop sebelum membaca di thread (mark() terus menambah `today`)."""
+        self.warmup()
+        return _TodayBits(self.day, tuple(self.today), self.today_new_from, len(self.users))
+
+    def _day_record(self, day: str, snap: _TodayBits | None = None) -> tuple[int, int, int]:
+        snap = snap or self.snapshot()
+        if day == snap.day:
+            return snap.record()
+        with self._cache_lock:
+            rec, gen = self.cache.get(day), self._cache_gen
+        if rec is None:
+            rec = self._read_day(day) or (0, 0, 0)
+            with self._cache_lock:
+                if gen == self._cache_gen:   # tidak ada tulis ulang selagi file dibaca
+                    self.cache.set(day, rec)
+        return rec
+
+    def bitmap(self, day: str, snap: _TodayBits | None = None) -> int:
+        return self._day_record(day, snap)[0]
+
+    def active(self, end: date, days: int = 1, snap: _TodayBits | None = None) -> int:
+        """Jumlah user unik yang aktif dalam `days` hari sampai `end` (inklusif)."""
+        snap = snap or self.snapshot()
+        acc = 0
+        for k in range(days):
+            acc |= self.bitmap((end - timedelta(days=k)).isoformat(), snap)
+        return acc.bit_count()
+
+    def retention(self, cohort_day: date, n: int, snap: _TodayBits | None = None) -> tuple[int, int | None]:
+        """(ukuran kohort user baru hari itu, berapa yang aktif lagi N hari kemudian | None kalau belum sampai)."""
+        snap = snap or self.snapshot()
+        _, lo, hi = self._day_record(cohort_day.isoformat(), snap)
+        target = cohort_day + timedelta(days=n)
+        if hi <= lo:
+            return 0, None
+        if target > _now_jkt().date():
+            return hi - lo, None
+        cohort = ((1 << hi) - 1) ^ ((1 << lo) - 1)
+        return hi - lo, (self.bitmap(target.isoformat(), snap) & cohort).bit_count()
+
+engagement = features.lazy("dashboard", UserBitmaps)
+
+RETENTION_OFFSETS = (1, 3, 7)
+
+def build_cohort_text(days: int = 7, snap: _TodayBits | None = None) -> str:
+    today = _now_jkt().date()
+    snap = snap or engagement.snapshot()   # bitmap hari ini dipack sekali untuk semua kolom
+    dau, dau_y = engagement.active(today, snap=snap), engagement.active(today - timedelta(days=1), snap=snap)
+    wau, mau = engagement.active(today, 7, snap), engagement.active(today, 30, snap)
+    lines = [
+        "👥 <b>Engagement</b> (klik + command)",
+        f"• DAU: {dau} (kemarin {dau_y})",
+        f"• WAU: {wau} • MAU: {mau}",
+        f"• Stickiness DAU/MAU: {dau / mau * 100:.0f}%" if mau else "• Stickiness DAU/MAU: -",
+        "",
+        "📅 <b>Retensi user baru</b> (" + " / ".join(f"D{n}" for n in RETENTION_OFFSETS) + "):",
+    ]
+    for k in range(days, 0, -1):
+        d = today - timedelta(days=k)
+        cells, size = [], 0
+        for n in RETENTION_OFFSETS:
+            size, kept = engagement.retention(d, n, snap)
+            cells.append("-" if kept is None or not size else f"{kept / size * 100:.0f}%")
+        lines.append(f"<code>{d.isoformat()}</code> {size} baru → " + " / ".join(cells))
+    return "\n".join(lines)
+
+@features.on_message("dashboard", filters.command("cohort"))
+async def cohort_command(client, message):
+    """OWNER: /cohort [hari] → DAU/WAU/MAU + retensi kohort user baru dari bitmap harian."""
+    if not is_owner(message):
+        await message.reply("❌ Gak usah kepo! Perintah ini hanya untuk OWNER.")
+        return
+    days = 7
+    if len(message.command) > 1 and message.command[1].isdigit():
+        days = max(1, min(int(message.command[1]), 60))
+    text = await asyncio.to_thread(build_cohort_text, days, engagement.snapshot())
+    await message.reply(text, parse_mode=ParseMode.HTML)
+
+# --- Funnel akses koleksi (/start → verify_ → klik) ---
+FUNNEL_WINDOW_HOURS = 48
+FUNNEL_PENDING_MAX = 50_000     # /start yang menunggu verify_ (untuk waktu konversi)
+FUNNEL_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0)
+FUNNEL_STAGES = ("start", "convert", "gate", "verify", "click")
+FUNNEL_FILE = DATA_DIR / "funnel.json"
+FUNNEL_EVENTS = metrics.counter("bot_funnel_events_total", "Event funnel akses koleksi per tahap & hasil")
+FUNNEL_LATENCY = metrics.histogram("bot_funnel_stage_seconds", "Durasi tiap tahap funnel akses koleksi per hasil",
+                                   buckets=FUNNEL_BUCKETS)
+
+class AccessFunnel:
+    """
+    Counter + histogram latensi per (tahap, hasil, kode), per jam, disimpan di ring
+    FUNNEL_WINDOW_HOURS bucket (bucket lama otomatis terbuang). Tahap:
+    - start:   /start <kode> → hasil shown | unknown_code, latensi handler
+    - convert: jeda /start → tombol BUKA KOLEKSI (verify_) per user (hasil converted)
+    - gate:    cek membership → ok | fail (+ missing_channel | missing_group | missing_extra)
+    - verify:  callback verify_ → opened | not_member | no_link, latensi sampai koleksi terkirim
+    - click:   pencatatan klik → logged | error
+    Histogram per kode disimpan jarang (index bucket → jumlah), jadi kode sepi nyaris gratis.
+    Ring di-flush ke data/funnel.json bersama state lain supaya selamat dari restart.
+    """
+
+    def __init__(self, path: Path = FUNNEL_FILE, window_hours: int = FUNNEL_WINDOW_HOURS, buckets=FUNNEL_BUCKETS):
+        self.path = path
+        self.window = window_hours
+        self.bounds = tuple(buckets)
+        self.hours: deque = deque()   # dict per jam: {"hour", "events", "hist"}
+        self.pending: OrderedDict = OrderedDict()   # (user_id, kode) -> monotonic saat /start
+        self.dirty = False
+        self._loaded = False
+
+    @staticmethod
+    def _new_bucket(hour: int) -> dict:
+        # events: (tahap, hasil, kode) -> n; hist: (tahap, hasil, kode) -> {index bucket: n}
+        return {"hour": hour, "events": defaultdict(int), "hist": {}}
+
+    def warmup(self):
+        """Muat ring dari snapshot terakhir (dipanggil saat bootstrap, atau lazy saat event pertama)."""
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                snap = json.load(f)
+            same_bounds = tuple(snap.get("bounds", ())) == self.bounds   # bucket diganti → histogram lama dibuang
+            for h in snap.get("hours", []):
+                b = self._new_bucket(int(h["hour"]))
+                for stage, outcome, code, n in h.get("events", []):
+                    b["events"][(stage, outcome, code)] = int(n)
+                if same_bounds:
+                    for stage, outcome, code, hist in h.get("hist", []):
+                        b["hist"][(stage, outcome, code)] = {int(i): int(n) for i, n in hist.items()}
+                self.hours.append(b)
+        except Exception as e:
+            logger.error(f"Gagal load data funnel: {e}")
+
+    @timed_persist("funnel")
+    def flush(self):
+        if not self.dirty:
+            return
+        self.dirty = False
+        try:
+            snap = {"bounds": list(self.bounds), "hours": [
+                {"hour": b["hour"],
+                 "events": [[*k, n] for k, n in b["events"].items()],
+                 "hist": [[*k, h] for k, h in b["hist"].items()]}
+                for b in list(self.hours)
+            ]}
+            _ensure_parent_dir(self.path)
+            tmp = self.path.with_suffix(".json.tmp")
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(snap, f, ensure_ascii=False)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self.dirty = True
+            logger.error(f"Gagal simpan data funnel: {e}")
+
+    def _bucket(self) -> dict:
+        self.warmup()
+        hour = int(time.time() // 3600)
+        if not self.hours or self.hours[-1]["hour"] != hour:
+            self.hours.append(self._new_bucket(hour))
+        while self.hours and self.hours[0]["hour"] <= hour - self.window:
+            self.hours.popleft()
+        return self.hours[-1]
+
+    def _code(self, code: str) -> str:
+        # kode dari user bisa apa saja; yang tidak ada di STREAM_MAP dikumpulkan jadi satu
+        return code if code in STREAM_MAP else "(tidak dikenal)"
+
+    def event(self, stage: str, outcome: str, code: str, seconds: float | None = None):
+        code = self._code(code)
+        b = self._bucket()
+        b["events"][(stage, outcome, code)] += 1
+        self.dirty = True
+        FUNNEL_EVENTS.inc(stage=stage, outcome=outcome)
+        if seconds is not None:
+            self.observe(stage, outcome, code, seconds, b)
+
+    def observe(self, stage: str, outcome: str, code: str, seconds: float, bucket: dict | None = None):
+        b = bucket or self._bucket()
+        hist = b["hist"].setdefault((stage, outcome, self._code(code)), {})
+        i = bisect.bisect_left(self.bounds, seconds)
+        hist[i] = hist.get(i, 0) + 1
+        self.dirty = True
+        FUNNEL_LATENCY.observe(seconds, stage=stage, outcome=outcome)
+
+    def started(self, user_id: int, code: str):
+        key = (user_id, code)
+        self.pending.pop(key, None)
+        self.pending[key] = time.monotonic()
+        while len(self.pending) > FUNNEL_PENDING_MAX:
+            self.pending.popitem(last=False)
+
+    def converted(self, user_id: int, code: str):
+        t0 = self.pending.pop((user_id, code), None)
+        if t0 is not None:
+            self.observe("convert", "converted", code, time.monotonic() - t0)
+
+    def _percentile(self, hist: dict[int, int], q: float) -> float | None:
+        total = sum(hist.values())
+        if not total:
+            return None
+        need, cum = q / 100 * total, 0
+        for i in sorted(hist):
+            cum += hist[i]
+            if cum >= need:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return None
+
+    def summary(self, hours: int = 24, code: str | None = None) -> dict:
+        """
+        Agregat N jam terakhir (opsional satu kode): events {(tahap, hasil): n},
+        latency {(tahap, hasil): (n, p50, p95)}, by_code {kode: {(tahap, hasil): n}}.
+        """
+        since = int(time.time() // 3600) - hours + 1
+        events: dict = defaultdict(int)
+        by_code: dict = defaultdict(lambda: defaultdict(int))
+        hist: dict = defaultdict(lambda: defaultdict(int))
+        for b in list(self.hours):
+            if b["hour"] < since:
+                continue
+            for (stage, outcome, c), n in list(b["events"].items()):
+                if code and c != code:
+                    continue
+                events[(stage, outcome)] += n
+                by_code[c][(stage, outcome)] += n
+            for (stage, outcome, c), h in list(b["hist"].items()):
+                if code and c != code:
+                    continue
+                acc = hist[(stage, outcome)]
+                for i, n in h.items():
+                    acc[i] += n
+        latency = {k: (sum(h.values()), self._percentile(h, 50), self._percentile(h, 95)) for k, h in hist.items()}
+        return {"events": dict(events), "latency": latency, "by_code": by_code}
+
+funnel = features.lazy("dashboard", AccessFunnel)
+
+def _resolve_code(arg: str) -> str:
+    """Kode persis seperti di STREAM_MAP (kunci case-sensitive); fallback pencocokan tanpa beda huruf."""
+    if arg in STREAM_MAP:
+        return arg
+    low = arg.lower()
+    return next((c for c in STREAM_MAP if c.lower() == low), arg)
+
+def _fmt_secs(s: float | None) -> str:
+    if s is None:
+        return "-"
+    if s == float("inf"):
+        return f">{FUNNEL_BUCKETS[-1]:g}s"
+    return f"{s * 1000:.0f}ms" if s < 1 else f"{s:g}s"
+
+def build_funnel_text(hours: int = 24, code: str | None = None) -> str:
+    s = funnel.summary(hours, code)
+    ev = s["events"]
+    starts = ev.get(("start", "shown"), 0)
+    verifies = sum(n for (st, _), n in ev.items() if st == "verify")
+    opened = ev.get(("verify", "opened"), 0)
+    blocked = ev.get(("verify", "not_member"), 0)
+    pct = lambda a, b: f"{a / b * 100:.0f}%" if b else "-"
+    lines = [
+        f"🔻 <b>Funnel akses</b> {hours} jam terakhir" + (f" — <code>{html_escape(code)}</code>" if code else ""),
+        f"• /start: {starts} tampil, {ev.get(('start', 'unknown_code'), 0)} kode salah",
+        f"• BUKA KOLEKSI: {verifies} ({pct(verifies, starts)} dari /start)",
+        f"• Gagal gate: {blocked} ({pct(blocked, verifies)})"
+        + "".join(f" • {name} {ev.get(('gate', 'missing_' + name), 0)}" for name in ("channel", "group", "extra")),
+        f"• Terbuka: {opened} ({pct(opened, starts)} dari /start), link hilang {ev.get(('verify', 'no_link'), 0)}",
+        f"• Klik tercatat: {ev.get(('click', 'logged'), 0)}, gagal {ev.get(('click', 'error'), 0)}",
+        "",
+        "⏱️ <b>Latensi</b> (p50 / p95, batas atas bucket):",
+    ]
+    for stage in FUNNEL_STAGES:
+        for (st, outcome), (n, p50, p95) in sorted(s["latency"].items()):
+            if st == stage:
+                lines.append(f"• {stage}/{outcome}: {_fmt_secs(p50)} / {_fmt_secs(p95)} (n={n})")
+    if not code:
+        worst = sorted(s["by_code"].items(), key=lambda kv: kv[1].get(("verify", "not_member"), 0), reverse=True)[:5]
+        worst = [(c, e) for c, e in worst if e.get(("verify", "not_member"), 0)]
+        if worst:
+            lines += ["", "🚧 <b>Paling banyak gagal gate:</b>"]
+            lines += [f"• <code>{html_escape(c)}</code>: {e[('verify', 'not_member')]} gagal / "
+                      f"{e.get(('verify', 'opened'), 0)} terbuka" for c, e in worst]
+    return "\n".join(lines)
+
+@features.on_message("dashboard", filters.command("funnel"))
+async def funnel_command(client, message):
+    """OWNER: /funnel [jam] [kode] → konversi & latensi tiap tahap /start → verify_ → klik."""
+    if not is_owner(message):
+        await message.reply("❌ Gak usah kepo! Perintah ini hanya untuk OWNER.")
+        return
+    hours, code = 24, None
+    for arg in message.command[1:]:
+        if arg.isdigit():
+            hours = max(1, min(int(arg), FUNNEL_WINDOW_HOURS))
+        else:
+            code = _resolve_code(arg)
+    await message.reply(build_funnel_text(hours, code), parse_mode=ParseMode.HTML)
+
 # ================================
 # Lapor System (/lapor)
 # ================================
-waiting_lapor_users = set()
+class ExpiringStore:
+    """
+    Dict kecil dengan masa berlaku per key, disimpan ke JSON supaya selamat dari restart.
+    Key yang kedaluwarsa dibuang otomatis saat diakses / saat purge().
+    """
+
+    def __init__(self, path: Path, default_ttl: float):
+        self.path = path
+        self.default_ttl = default_ttl
+        self._store: dict[str, list] | None = None   # key -> [value, expires_at_epoch]; dimuat saat dipakai
+
+    @property
+    def _data(self) -> dict[str, list]:
+        if self._store is None:
+            self._store = {}
+            self._load()
+        return self._store
+
+    def _load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._store = json.load(f)
+        except Exception as e:
+            logger.error(f"Gagal load {self.path}: {e}")
+            self._store = {}
+        self.purge()
+
+    @timed_persist("expiring_store")
+    def _save(self):
+        try:
+            _ensure_parent_dir(self.path)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f)
+        except Exception as e:
+            logger.error(f"Gagal save {self.path}: {e}")
+
+    def purge(self) -> int:
+        now = time.time()
+        dead = [k for k, (_, exp) in self._data.items() if exp <= now]
+        for k in dead:
+            del self._data[k]
+        if dead:
+            self._save()
+        return len(dead)
+
+    def set(self, key, value=True, ttl: float | None = None):
+        self._data[str(key)] = [value, time.time() + (self.default_ttl if ttl is None else ttl)]
+        self._save()
+
+    add = set
+
+    def get(self, key, default=None):
+        rec = self._data.get(str(key))
+        if not rec:
+            return default
+        if rec[1] <= time.time():
+            self.discard(key)
+            return default
+        return rec[0]
+
+    def ttl_left(self, key) -> float:
+        rec = self._data.get(str(key))
+        return max(0.0, rec[1] - time.time()) if rec else 0.0
+
+    def discard(self, key):
+        if self._data.pop(str(key), None) is not None:
+            self._save()
+
+    def __contains__(self, key) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._data)
+
+LAPOR_COOLDOWN = timedelta(minutes=1)
+LAPOR_WAIT_TTL = 30 * 60                 # mode laporan otomatis batal setelah 30 menit
+LAPOR_QUEUE_FILE = DATA_DIR / "lapor_queue.json"
+LAPOR_CAPTION_LIMIT = 1024               # batas caption Telegram
+LAPOR_TEXT_LIMIT = 4096                  # batas teks pesan Telegram
+try:
+    # 0 = langsung diteruskan; >0 = dikumpulkan & dikirim sebagai digest tiap N menit
+    LAPOR_DIGEST_MINUTES = int(os.getenv("LAPOR_DIGEST_MINUTES", "0"))
+except ValueError:
+    LAPOR_DIGEST_MINUTES = 0
+
+LAPOR_QUEUED_REPLY = "✅ Laporanmu sudah diterima dan akan segera diteruskan ke owner."
+
+def _chunk_plain(text: str, limit: int) -> list[str]:
+    """
+    Potong teks polos (sebelum di-escape) di batas baris supaya tiap potongan, setelah
+    html_escape, muat dalam `limit`. Tag/entity HTML tidak pernah terbelah karena escape
+    dan pembungkusan dilakukan per potongan. Baris yang terlalu panjang dipotong per karakter.
+    """
+    chunks, cur, size = [], "", 0
+    for line in text.splitlines(keepends=True):
+        n = len(html_escape(line))
+        if size + n > limit and cur:
+            chunks.append(cur)
+            cur, size = "", 0
+        while n > limit:
+            cut = width = 0
+            for ch in line:
+                w = len(html_escape(ch))
+                if width + w > limit:
+                    break
+                cut, width = cut + 1, width + w
+            chunks.append(line[:cut])
+            line = line[cut:]
+            n = len(html_escape(line))
+        cur, size = cur + line, size + n
+    if cur:
+        chunks.append(cur)
+    return chunks or [""]
+
+waiting_lapor_users = ExpiringStore(DATA_DIR / "lapor_waiting.json", LAPOR_WAIT_TTL)
+last_lapor_time = ExpiringStore(DATA_DIR / "lapor_cooldown.json", LAPOR_COOLDOWN.total_seconds())
 waiting_feedback_users = set()
 last_feedback_time = {}
-last_lapor_time = {}
-LAPOR_COOLDOWN = timedelta(minutes=1)
 
-@app.on_message(filters.command("lapor") & filters.private, group=10)
+class LaporQueue:
+    """
+    Antrian laporan persisten. Laporan disimpan dulu ke disk, baru diteruskan ke owner:
+    - mode langsung: header + isi digabung jadi 1 pesan (teks) atau 1 copy_message bercaption (media)
+    - mode digest: laporan teks dikumpulkan & dikirim sebagai satu ringkasan per interval
+    Laporan yang gagal terkirim tetap di antrian dan dicoba lagi oleh lapor_queue_worker.
+    """
+
+    def __init__(self, path: Path = LAPOR_QUEUE_FILE):
+        self.path = path
+        self._items: list[dict] | None = None   # dimuat saat pertama dipakai
+        self._lock = asyncio.Lock()
+
+    @property
+    def items(self) -> list[dict]:
+        if self._items is None:
+            self._items = self._load()
+        return self._items
+
+    @items.setter
+    def items(self, value: list[dict]):
+        self._items = value
+
+    def _load(self) -> list[dict]:
+        if not self.path.exists():
+            return []
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error(f"Gagal load {self.path}: {e}")
+            return []
+
+    @timed_persist("lapor_queue")
+    def _save(self):
+        try:
+            _ensure_parent_dir(self.path)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.items, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            logger.error(f"Gagal save {self.path}: {e}")
+
+    def add(self, message, text: str | None = None) -> dict:
+        user = message.from_user
+        report = {
+            "id": f"{user.id}-{message.id}",
+            "ts": datetime.now(JAKARTA_TZ).strftime("%Y-%m-%d %H:%M:%S"),
+            "user_id": user.id,
+            "first_name": user.first_name or "",
+            "username": user.username,
+            "chat_id": message.chat.id,
+            "message_id": message.id,
+            "media": bool(message.media) and text is None,
+            "caption": message.caption or "",
+            "text": text if text is not None else (message.text or ""),
+        }
+        self.items.append(report)
+        self._save()
+        return report
+
+    @staticmethod
+    def _header(r: dict) -> str:
+        mention = f'<a href="tg://user?id={r["user_id"]}">{html_escape(r["first_name"])}</a>'
+        username = f"@{r['username']}" if r.get("username") else "(no username)"
+        return (
+            "📩 <b>LAPORAN BARU</b>\n"
+            f"• Dari: {mention} {username}\n"
+            f"• User ID: {r['user_id']}\n"
+            f"• Waktu: {r['ts']}\n"
+        )
+
+    def _parts(self, client, r: dict) -> list:
+        """Urutan kiriman (callable RPC) untuk satu laporan; sama persis tiap kali dipanggil."""
+        header = self._header(r)
+        if r["media"]:
+            caption = header + (f"\n{html_escape(r['caption'])}" if r["caption"] else "")
+            if len(caption) <= LAPOR_CAPTION_LIMIT:
+                return [lambda: client.copy_message(
+                    OWNER_ID, r["chat_id"], r["message_id"], caption=caption, parse_mode=ParseMode.HTML
+                )]
+            # caption kepanjangan → header terpisah, media tetap dengan caption aslinya
+            return [
+                lambda: client.send_message(OWNER_ID, header, parse_mode=ParseMode.HTML),
+                lambda: client.copy_message(OWNER_ID, r["chat_id"], r["message_id"]),
+            ]
+        text = r["text"].strip()
+        if not text:
+            texts = [f"{header}\nPesan:\n⚠️ (Pesan kosong/tidak didukung)"]
+        else:
+            # potongan pertama berbagi pesan dengan header, sisanya pesan penuh
+            first, *rest = _chunk_plain(text, LAPOR_TEXT_LIMIT - len(header) - len("\nPesan:\n"))
+            rest = _chunk_plain("".join(rest), LAPOR_TEXT_LIMIT) if rest else []
+            texts = [f"{header}\nPesan:\n{html_escape(first)}"] + [html_escape(c) for c in rest]
+        return [functools.partial(client.send_message, OWNER_ID, t, parse_mode=ParseMode.HTML) for t in texts]
+
+    async def _deliver(self, client, r: dict):
+        """
+        Kirim satu laporan ke owner dengan sesedikit mungkin RPC. Jumlah bagian yang sudah
+        terkirim dicatat di laporan (`sent_parts`), jadi retry melanjutkan tanpa duplikat.
+        """
+        parts = self._parts(client, r)
+        for i in range(r.get("sent_parts", 0), len(parts)):
+            await outbox.send(OWNER_ID, parts[i], PRIO_OWNER)
+            if len(parts) > 1:
+                r["sent_parts"] = i + 1
+                self._save()
+
+    async def submit(self, client, message, text: str | None = None) -> bool:
+        """
+        Simpan laporan; di mode langsung sekalian kirim.
+        True = sudah sampai ke owner, False = tersimpan di antrian (digest / gagal kirim, dicoba lagi nanti).
+        """
+        async with self._lock:
+            report = self.add(message, text)
+            if LAPOR_DIGEST_MINUTES > 0:
+                return False
+            try:
+                await self._deliver(client, report)
+            except Exception as e:
+                logger.error(f"Gagal teruskan laporan {report['id']}, tetap di antrian: {e}")
+                return False
+            self.items = [r for r in self.items if r["id"] != report["id"]]
+            self._save()
+            return True
+
+    async def flush(self, client) -> int:
+        """Kirim semua laporan yang masih antri (digest untuk teks). Return jumlah terkirim."""
+        async with self._lock:
+            if not self.items:
+                return 0
+            pending, sent = list(self.items), []
+            texts = [r for r in pending if not r["media"]]
+            if texts:
+                head = f"🗂 <b>DIGEST LAPORAN</b> ({len(texts)} laporan)\n\n"
+                blocks = []
+                for r in texts:
+                    prefix = f"{self._header(r)}Pesan:\n"
+                    body = r["text"].strip()
+                    if not body:
+                        blocks.append(prefix + "⚠️ (kosong)")
+                        continue
+                    # laporan kepanjangan dipangkas sebelum di-escape supaya tag/entity tetap utuh
+                    room = LAPOR_TEXT_LIMIT - len(head) - len(prefix) - 3
+                    cut = _chunk_plain(body, room)
+                    blocks.append(prefix + html_escape(cut[0]) + ("…" if len(cut) > 1 else ""))
+                chunk, chunk_ids = head, []
+                try:
+                    for r, block in zip(texts, blocks):
+                        if len(chunk) + len(block) + 2 > LAPOR_TEXT_LIMIT and chunk_ids:
+                            msg = chunk
+                            await outbox.send(OWNER_ID, lambda: client.send_message(OWNER_ID, msg, parse_mode=ParseMode.HTML), PRIO_OWNER)
+                            sent.extend(chunk_ids)
+                            chunk, chunk_ids = head, []
+                        chunk += block + "\n\n"
+                        chunk_ids.append(r["id"])
+                    if chunk_ids:
+                        msg = chunk
+                        await outbox.send(OWNER_ID, lambda: client.send_message(OWNER_ID, msg, parse_mode=ParseMode.HTML), PRIO_OWNER)
+                        sent.extend(chunk_ids)
+                except Exception as e:
+                    logger.error(f"Gagal kirim digest laporan: {e}")
+            for r in pending:
+                if not r["media"]:
+                    continue
+                try:
+                    await self._deliver(client, r)
+                    sent.append(r["id"])
+                except Exception as e:
+                    logger.error(f"Gagal teruskan laporan media {r['id']}: {e}")
+            done = set(sent)
+            self.items = [r for r in self.items if r["id"] not in done]
+            self._save()
+            return len(done)
+
+lapor_queue = features.lazy("lapor", LaporQueue)
+
+@features.on_message("lapor", filters.command("lapor") & filters.private, group=10)
 async def lapor_start(client, message):
     user_id = message.from_user.id
-    now = datetime.now(JAKARTA_TZ)
 
-    last_time = last_lapor_time.get(user_id)
-    if last_time and now - last_time < LAPOR_COOLDOWN:
-        remain = int((LAPOR_COOLDOWN - (now - last_time)).total_seconds())
+    remain = int(last_lapor_time.ttl_left(user_id))
+    if remain > 0:
         await message.reply(f"⏳ Tunggu {remain} detik sebelum mengirim laporan lagi.")
         return
 
@@ -1980,21 +5325,13 @@ async def lapor_start(client, message):
     args = message.text.split(maxsplit=1)
     if len(args) > 1 and args[1].strip():
         laporan_text = args[1].strip()
-        last_lapor_time[user_id] = now
+        last_lapor_time.set(user_id)
         try:
-            user = message.from_user
-            mention = f'<a href="tg://user?id={user.id}">{user.first_name}</a>'
-            username = f"@{user.username}" if user.username else "(no username)"
-            waktu = now.strftime("%Y-%m-%d %H:%M:%S")
-            header = (
-                "📩 <b>LAPORAN BARU</b>\n"
-                f"• Dari: {mention} {username}\n"
-                f"• User ID: {user_id}\n"
-                f"• Waktu: {waktu}\n"
-            )
-            await client.send_message(OWNER_ID, header, parse_mode=ParseMode.HTML)
-            await client.send_message(OWNER_ID, f"Pesan:\n{laporan_text}")
-            await message.reply("✅ Terima kasih! Laporanmu sudah terkirim ke owner.")
+            if await lapor_queue.submit(client, message, text=laporan_text):
+                reply = "✅ Terima kasih! Laporanmu sudah terkirim ke owner."
+            else:
+                reply = LAPOR_QUEUED_REPLY
+            await outbox.send(message.chat.id, lambda: message.reply(reply))
         except Exception as e:
             logger.error(f"Gagal kirim laporan langsung: {e}")
             await message.reply("❌ Gagal mengirim laporan.")
@@ -2014,7 +5351,7 @@ async def lapor_start(client, message):
         parse_mode=ParseMode.MARKDOWN
     )
 
-@app.on_message(filters.command("batal") & filters.private, group=10)
+@features.on_message("lapor", filters.command("batal") & filters.private, group=10)
 async def lapor_cancel(client, message):
     user_id = message.from_user.id
     if user_id in waiting_lapor_users:
@@ -2023,49 +5360,53 @@ async def lapor_cancel(client, message):
     else:
         await message.reply("ℹ️ Kamu tidak sedang dalam mode laporan.")
 
-@app.on_message(filters.private & ~filters.regex(r"^/"), group=11)
+@features.on_message("lapor", filters.private & ~filters.regex(r"^/"), group=11)
 async def lapor_receive(client, message):
     user_id = message.from_user.id
     if user_id not in waiting_lapor_users:
         return  
 
     try:
-        user = message.from_user
-        mention = f'<a href="tg://user?id={user.id}">{user.first_name}</a>'
-        username = f"@{user.username}" if user.username else "(no username)"
-        waktu = datetime.now(JAKARTA_TZ).strftime("%Y-%m-%d %H:%M:%S")
-
-        header = (
-            "📩 <b>LAPORAN BARU</b>\n"
-            f"• Dari: {mention} {username}\n"
-            f"• User ID: {user_id}\n"
-            f"• Waktu: {waktu}\n"
-        )
-        await client.send_message(OWNER_ID, header, parse_mode=ParseMode.HTML)
-
-        if message.media:
-            await client.copy_message(OWNER_ID, message.chat.id, message.id)
-        elif (message.text or "").strip():
-            await client.send_message(OWNER_ID, f"Pesan:\n{message.text}")
+        if await lapor_queue.submit(client, message):
+            reply = "✅ Laporanmu sudah diteruskan ke owner."
         else:
-            await client.send_message(OWNER_ID, "⚠️ (Pesan kosong/tidak didukung)")
-
-        await message.reply("✅ Laporanmu sudah diteruskan ke owner.")
+            reply = LAPOR_QUEUED_REPLY
+        await outbox.send(message.chat.id, lambda: message.reply(reply))
 
     except Exception as e:
         logger.error(f"Gagal terima laporan: {e}")
         await message.reply("❌ Gagal mengirim laporan.")
     finally:
         waiting_lapor_users.discard(user_id)
-        last_lapor_time[user_id] = datetime.now(JAKARTA_TZ)
+        last_lapor_time.set(user_id)
         message.stop_propagation()  # 🔑 hentikan fallback
 
-@app.on_message(filters.command("search"))
+@features.on_message("lapor", filters.command("lapor_flush") & filters.private)
+async def lapor_flush_cmd(client, message):
+    """OWNER: kirim sekarang semua laporan yang masih antri."""
+    if not is_owner(message):
+        await message.reply("❌ Hadeh! Perintah ini hanya untuk OWNER."); return
+    pending = len(lapor_queue.items)
+    sent = await lapor_queue.flush(client)
+    await message.reply(f"📨 {sent}/{pending} laporan antri diteruskan.")
+
+async def lapor_queue_worker():
+    """Kirim digest laporan (atau coba ulang laporan yang gagal) secara berkala."""
+    while True:
+        await asyncio.sleep(max(1, LAPOR_DIGEST_MINUTES) * 60)
+        try:
+            waiting_lapor_users.purge()
+            last_lapor_time.purge()
+            await lapor_queue.flush(app)
+        except Exception as e:
+            logger.error(f"Gagal proses antrian laporan: {e}")
+
+@features.on_message("catalog", filters.command("search"))
 async def search_command(client, message):
     user_id = message.from_user.id
 
     # Cek akses: owner, admin, atau starlord
-    if not (is_owner(message) or is_admin(message) or is_starlord(user_id)):
+    if not (is_owner(message) or is_admin(message) or await is_starlord(user_id)):
         teks = (
             "❌ <b>Akses Ditolak!</b>\n\n"
             "Perintah ini eksklusif hanya untuk pengguna dengan badge tertinggi:\n"
@@ -2109,67 +5450,171 @@ async def search_command(client, message):
     results = "✨ **Hasil Pencarian:**\n\n" + "\n".join([f"• `/start {c}`" for c in found])
     await message.reply(results, parse_mode=ParseMode.MARKDOWN)
 
+# ================================
+# Polling /request
+# ================================
+POLL_CONFIG_FILE = CONFIG_DIR / "poll.json"
+POLL_RETENTION_DAYS = 30
+POLL_OPTIONS: list[dict] = [
+    {"id": "lokal", "label": "🇮🇩 Lokal"},
+    {"id": "chindo", "label": "🇨🇳 Chindo"},
+    {"id": "bule", "label": "🌍 Bule"},
+]
+
+def load_poll_config():
+    """Muat opsi polling dari config/poll.json (opsional): {"options": [{"id","label"}], "retention_days": N}."""
+    global POLL_OPTIONS, POLL_RETENTION_DAYS
+    if not POLL_CONFIG_FILE.exists():
+        return
+    try:
+        with open(POLL_CONFIG_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        opts = [
+            {"id": str(o["id"]).strip(), "label": str(o.get("label") or o["id"]).strip()}
+            for o in data.get("options", []) if isinstance(o, dict) and str(o.get("id", "")).strip()
+        ]
+        if opts:
+            POLL_OPTIONS = opts
+        POLL_RETENTION_DAYS = int(data.get("retention_days", POLL_RETENTION_DAYS))
+        logger.info(f"✅ Poll config loaded ({len(POLL_OPTIONS)} opsi, retensi {POLL_RETENTION_DAYS} hari).")
+    except Exception as e:
+        logger.error(f"Gagal load {POLL_CONFIG_FILE}: {e}")
+
+class PollStore:
+    """
+    Rekap vote per hari: counter per opsi (diupdate saat vote) + set user_id yang sudah vote.
+    Format file: {"version": 2, "days": {"YYYY-MM-DD": {"counts": {opt: n}, "voters": [uid, ...]}}}
+    Data lama ({uid: {"date", "choice"}}) dimigrasi otomatis saat load.
+    """
+
+    def __init__(self, path=VOTES_FILE):
+        self.path = Path(path)
+        self.days: dict[str, dict] = {}
+        self._loaded = False
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                raw = json.load(f)
+        except Exception as e:
+            logger.error(f"Gagal load {self.path}: {e}")
+            return
+        if raw.get("version") == 2:
+            for day, rec in raw.get("days", {}).items():
+                self.days[day] = {
+                    "counts": {k: int(v) for k, v in rec.get("counts", {}).items()},
+                    "voters": {int(u) for u in rec.get("voters", [])},
+                }
+        else:
+            by_label = {o["label"]: o["id"] for o in POLL_OPTIONS}
+            for uid, rec in raw.items():
+                try:
+                    day = self._day(rec["date"])
+                    opt = by_label.get(rec.get("choice"), rec.get("choice"))
+                    day["voters"].add(int(uid))
+                    day["counts"][opt] = day["counts"].get(opt, 0) + 1
+                except (KeyError, TypeError, ValueError):
+                    continue
+            self._save()
+        self.prune()
+
+    def _day(self, day: str) -> dict:
+        return self.days.setdefault(day, {"counts": {}, "voters": set()})
+
+    @timed_persist("votes")
+    def _save(self):
+        data = {
+            "version": 2,
+            "days": {
+                d: {"counts": rec["counts"], "voters": sorted(rec["voters"])}
+                for d, rec in sorted(self.days.items())
+            },
+        }
+        try:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+        except Exception as e:
+            logger.error(f"Gagal save {self.path}: {e}")
+
+    def prune(self, retention_days: int | None = None) -> int:
+        """Buang rekap lebih tua dari N hari."""
+        keep = POLL_RETENTION_DAYS if retention_days is None else retention_days
+        cutoff = (_now_jkt().date() - timedelta(days=keep)).isoformat()
+        old = [d for d in self.days if d < cutoff]
+        for d in old:
+            del self.days[d]
+        if old:
+            self._save()
+        return len(old)
+
+    def has_voted(self, user_id: int, day: str | None = None) -> bool:
+        self._ensure_loaded()
+        rec = self.days.get(day or _today_key())
+        return bool(rec) and int(user_id) in rec["voters"]
+
+    def vote(self, user_id: int, option_id: str, day: str | None = None) -> bool:
+        """Catat vote; False jika user sudah vote di hari tsb."""
+        self._ensure_loaded()
+        day = day or _today_key()
+        if day not in self.days:
+            self.prune()
+        rec = self._day(day)
+        if int(user_id) in rec["voters"]:
+            return False
+        rec["voters"].add(int(user_id))
+        rec["counts"][option_id] = rec["counts"].get(option_id, 0) + 1
+        self._save()
+        return True
+
+    def results(self, day: str | None = None) -> list[tuple[dict, int]]:
+        """[(opsi, jumlah)] sesuai urutan POLL_OPTIONS."""
+        self._ensure_loaded()
+        counts = self.days.get(day or _today_key(), {}).get("counts", {})
+        return [(o, counts.get(o["id"], 0)) for o in POLL_OPTIONS]
+
+poll_store = features.lazy("polls", PollStore)
+
 # Command request
-@app.on_message(filters.private & filters.command("request"))
+@features.on_message("polls", filters.private & filters.command("request"))
 async def request_cmd(client, message):
     keyboard = InlineKeyboardMarkup([
-        [InlineKeyboardButton("🇮🇩 Lokal", callback_data="vote_lokal")],
-        [InlineKeyboardButton("🇨🇳 Chindo", callback_data="vote_chindo")],
-        [InlineKeyboardButton("🌍 Bule", callback_data="vote_bule")]
+        [InlineKeyboardButton(o["label"], callback_data=f"vote_{o['id']}")] for o in POLL_OPTIONS
     ])
     await message.reply("📊 Silakan pilih untuk hari ini 👇", reply_markup=keyboard)
 
 # Callback vote
-@app.on_callback_query(filters.regex(r"^vote_"))
+@features.on_callback_query("polls", filters.regex(r"^vote_"))
 async def handle_vote(client, callback_query: CallbackQuery):
-    user_id = str(callback_query.from_user.id)
-    today = datetime.now().date().isoformat()
-    votes = load_votes()
+    user_id = callback_query.from_user.id
+    option_id = callback_query.data[len("vote_"):]
+    option = next((o for o in POLL_OPTIONS if o["id"] == option_id), None)
+    if option is None:
+        await callback_query.answer("❓ Pilihan tidak dikenal.", show_alert=True)
+        return
 
-    # Cek user sudah vote belum
-    if user_id in votes and votes[user_id]["date"] == today:
+    if not poll_store.vote(user_id, option_id):
         await callback_query.answer("⚠️ Kamu sudah vote hari ini!", show_alert=True)
         return
 
-    # Mapping pilihan
-    mapping = {
-        "vote_lokal": "🇮🇩 Lokal",
-        "vote_chindo": "🇨🇳 Chindo",
-        "vote_bule": "🌍 Bule"
-    }
-
-    choice = mapping.get(callback_query.data, "❓ Tidak diketahui")
-
-    # Simpan vote
-    votes[user_id] = {
-        "date": today,
-        "choice": choice
-    }
-    save_votes(votes)
-
-    await callback_query.answer(f"✅ Pilihanmu: {choice} tersimpan!", show_alert=True)
+    await callback_query.answer(f"✅ Pilihanmu: {option['label']} tersimpan!", show_alert=True)
 
 # Hasil rekap (khusus admin)
-@app.on_message(filters.command("hasil_request") & filters.user([123456789]))  # ganti ID admin
+@features.on_message("polls", filters.command("hasil_request") & filters.user([123456789]))  # ganti ID admin
 async def hasil_request(client, message):
-    today = datetime.now().date().isoformat()
-    votes = load_votes()
-
-    lokal = sum(1 for v in votes.values() if v["date"] == today and v["choice"] == "🇮🇩 Lokal")
-    chindo = sum(1 for v in votes.values() if v["date"] == today and v["choice"] == "🇨🇳 Chindo")
-    bule = sum(1 for v in votes.values() if v["date"] == today and v["choice"] == "🌍 Bule")
-
-    await message.reply(
-        f"📊 Rekap hari ini ({today}):\n\n"
-        f"🇮🇩 Lokal: {lokal}\n"
-        f"🇨🇳 Chindo: {chindo}\n"
-        f"🌍 Bule: {bule}"
-    )
+    today = _today_key()
+    lines = [f"📊 Rekap hari ini ({today}):", ""]
+    lines += [f"{o['label']}: {n}" for o, n in poll_store.results(today)]
+    await message.reply("\n".join(lines))
 
 # ================================
 # Unknown / Fallback (paling akhir)
 # ================================
-@app.on_message(filters.private & ~filters.regex(r"^/"), group=99)
+@features.on_message("core", filters.private & ~filters.regex(r"^/"), group=99)
 async def unknown_message(client, message):
     user_id = message.from_user.id if message.from_user else None
 
@@ -2196,29 +5641,85 @@ Jika kamu masih mengalami kendala:
     )
 
 # --- Group Welcome ---
+WELCOME_DELETE_AFTER = 120        # detik sebelum pesan welcome dihapus
+WELCOME_COALESCE_SECONDS = 5      # join dalam jendela ini digabung jadi satu welcome
+WELCOME_MAX_MENTIONS = 20
+
+# chat_id -> {"users": [User], "message": Message pertama di jendela, "timer": TimerHandle}
+_welcome_pending: dict[int, dict] = {}
+# flush yang sedang jalan; referensi dipegang di sini supaya task tidak hilang dan bisa ditunggu saat shutdown
+_welcome_tasks: set[asyncio.Task] = set()
 
-@app.on_message(filters.group & filters.new_chat_members)
+@features.on_message("moderation", filters.group & filters.new_chat_members)
 async def greet_new_member(client, message):
-    for user in message.new_chat_members:
-        if user.is_bot: continue
-        buttons = InlineKeyboardMarkup([
-            [InlineKeyboardButton("📢 JOIN CHANNEL", url=f"https://t.me/{CHANNEL_USERNAME}")],
-            [InlineKeyboardButton("👥 JOIN GROUP", url=f"https://t.me/{GROUP_USERNAME}")],
-        ])
-        welcome_text = (
-            f"👋 Selamat datang {user.mention} di **{message.chat.title}**!\n\n"
-            "📢 Pastikan join channel & group untuk akses koleksi.\n"
-            "📺 Cara nonton: https://t.me/BangsaBacol/26\n\n"
-            "Ketik: `/start kode_koleksi` untuk mulai."
+    users = [u for u in message.new_chat_members if not u.is_bot]
+    if not users:
+        return
+    chat_id = message.chat.id
+    pending = _welcome_pending.get(chat_id)
+    if pending:
+        pending["users"].extend(users)
+        return
+    _welcome_pending[chat_id] = {"users": users, "message": message}
+    # timer, bukan coroutine yang tidur → handler langsung selesai
+    _welcome_pending[chat_id]["timer"] = asyncio.get_running_loop().call_later(
+        WELCOME_COALESCE_SECONDS, _start_welcome_flush, client, chat_id,
+    )
+
+def _start_welcome_flush(client, chat_id: int):
+    task = asyncio.get_running_loop().create_task(_flush_welcome(client, chat_id), name=f"welcome:{chat_id}")
+    _welcome_tasks.add(task)
+    task.add_done_callback(_welcome_tasks.discard)
+
+async def flush_pending_welcomes(client):
+    """
+    Dipakai saat shutdown: timer yang belum jatuh tempo dibatalkan dan welcome-nya langsung
+    dikirim, lalu flush yang sudah jalan ditunggu sampai selesai. Return sisa yang belum terkirim.
+    """
+    for chat_id in list(_welcome_pending):
+        timer = _welcome_pending[chat_id].get("timer")
+        if timer:
+            timer.cancel()
+        await _flush_welcome(client, chat_id)
+    if _welcome_tasks:
+        await asyncio.gather(*_welcome_tasks, return_exceptions=True)
+    return len(_welcome_pending)
+
+async def _flush_welcome(client, chat_id: int):
+    pending = _welcome_pending.pop(chat_id, None)
+    if not pending:
+        return
+    message = pending["message"]
+    seen, users = set(), []
+    for u in pending["users"]:
+        if u.id not in seen:
+            seen.add(u.id); users.append(u)
+    mentions = ", ".join(u.mention for u in users[:WELCOME_MAX_MENTIONS])
+    if len(users) > WELCOME_MAX_MENTIONS:
+        mentions += f" dan {len(users) - WELCOME_MAX_MENTIONS} lainnya"
+
+    buttons = InlineKeyboardMarkup([
+        [InlineKeyboardButton("📢 JOIN CHANNEL", url=f"https://t.me/{CHANNEL_USERNAME}")],
+        [InlineKeyboardButton("👥 JOIN GROUP", url=f"https://t.me/{GROUP_USERNAME}")],
+    ])
+    welcome_text = (
+        f"👋 Selamat datang {mentions} di **{message.chat.title}**!\n\n"
+        "📢 Pastikan join channel & group untuk akses koleksi.\n"
+        "📺 Cara nonton: https://t.me/BangsaBacol/26\n\n"
+        "Ketik: `/start kode_koleksi` untuk mulai."
+    )
+    try:
+        sent = await outbox.send(
+            chat_id,
+            lambda: message.reply_text(welcome_text, parse_mode=ParseMode.MARKDOWN, reply_markup=buttons),
         )
-        sent = await message.reply_text(welcome_text, parse_mode=ParseMode.MARKDOWN, reply_markup=buttons)
-        await asyncio.sleep(120)
-        try: await sent.delete()
-        except Exception: pass
+        delete_scheduler.schedule(chat_id, [sent.id], WELCOME_DELETE_AFTER)
+    except Exception as e:
+        logger.error(f"Gagal kirim welcome di {chat_id}: {e}")
 
 # --- Callback Query Handlers ---
 
-@app.on_callback_query(filters.regex(r"^(verify|list|list_show|list_close).*"))
+@features.on_callback_query("catalog", filters.regex(r"^(verify|list|list_show|list_close).*"))
 async def handle_callback(client: Client, cq: CallbackQuery):
     data = cq.data
     user_id = cq.from_user.id
@@ -2235,8 +5736,7 @@ async def handle_callback(client: Client, cq: CallbackQuery):
             page = int(data.split("|")[1])
         except (ValueError, IndexError):
             page = 1
-        codes = sorted(list(STREAM_MAP.keys()))
-        page_codes, page, pages, total = paginate_codes(codes, page)
+        page_codes, page, pages, total, keyboard = get_list_page(page)
         txt = (
             f"📜 Daftar Kode (hal {page}/{pages})\n"
             f"Total: {total} item\n\n"
@@ -2245,7 +5745,7 @@ async def handle_callback(client: Client, cq: CallbackQuery):
         await cq.message.edit_text(
             txt,
             parse_mode=ParseMode.MARKDOWN,
-            reply_markup=build_list_keyboard(page_codes, page, pages)
+            reply_markup=keyboard
         )
         await cq.answer()
         return
@@ -2286,26 +5786,48 @@ async def handle_callback(client: Client, cq: CallbackQuery):
     # Verifikasi join group & channel sebelum akses koleksi
     if data.startswith("verify_"):
         code = data.replace("verify_", "")
+        t0 = time.perf_counter()
+        track = "dashboard" in features   # funnel milik /funnel; mirror tanpa dashboard tidak mencatat
+        if track:
+            funnel.converted(user_id, code)
         is_channel_member = await is_member(client, user_id, CHANNEL_USERNAME)
         is_group_member = await is_member(client, user_id, GROUP_USERNAME)
         is_extra_member   = await is_member(client, user_id, EXTRA_CHANNEL)
-        if not (is_channel_member and is_group_member and is_extra_member):
+        gate = {"channel": is_channel_member, "group": is_group_member, "extra": is_extra_member}
+        t_gate = time.perf_counter() - t0
+        for name, ok in gate.items():
+            if not ok and track:
+                funnel.event("gate", f"missing_{name}", code)
+        if not all(gate.values()):
+            if track:
+                funnel.event("gate", "fail", code, t_gate)
             await cq.answer(
                 "❌ TERCYDUK BELUM JOIN! ❌\nKamu harus join channel dan group dulu ya! 😜",
                 show_alert=True
             )
+            if track:
+                funnel.event("verify", "not_member", code, time.perf_counter() - t0)
             return
+        if track:
+            funnel.event("gate", "ok", code, t_gate)
 
         stream_link, thumbnail = get_stream_data(code)
         if not stream_link:
             await cq.message.reply("❌ Oopps... Link streaming tidak ditemukan.")
             logger.error(f"Link for code '{code}' not found.")
+            if track:
+                funnel.event("verify", "no_link", code, time.perf_counter() - t0)
             return
 
-        logger.info(f"User {user_id} (@{cq.from_user.username or 'unknown'}) klik: {code}")
+        logger.info(f"User {user_id} (@{cq.from_user.username or 'unknown'}) klik: {code}", extra={"event": "click"})
+        t_click = time.perf_counter()
         try:
             append_click_log(user_id, cq.from_user.username, code, stream_link)
+            if track:
+                funnel.event("click", "logged", code, time.perf_counter() - t_click)
         except Exception as e:
+            if track:
+                funnel.event("click", "error", code)
             logger.error(f"Gagal mencatat klik untuk user {user_id}: {e}")
 
         button = InlineKeyboardMarkup([
@@ -2326,6 +5848,8 @@ async def handle_callback(client: Client, cq: CallbackQuery):
             )
 
         await cq.answer()
+        if track:
+            funnel.event("verify", "opened", code, time.perf_counter() - t0)
 
 # --- Health check URLs ---
 
@@ -2349,6 +5873,7 @@ async def health_check_all_urls():
     for key, value in STREAM_MAP.items():
         if isinstance(value, dict) and 'link' in value:
             url = value['link']; urls.append(url); url_keys[url] = key
+    import aiohttp   # lazy: hanya dibutuhkan /healthcheck
     results = []
     async with aiohttp.ClientSession() as session:
         tasks = [check_url_health_async(session, url, 15) for url in urls]
@@ -2364,10 +5889,319 @@ async def health_check_all_urls():
 
 async def notify_owner(msg):
     try:
-        await app.send_message(OWNER_ID, f"[NOTIF] {msg}")
+        await outbox.send(OWNER_ID, lambda: app.send_message(OWNER_ID, f"[NOTIF] {msg}"), PRIO_OWNER, wait=False)
     except Exception as e:
         logger.error(f"Gagal kirim notif ke owner: {e}")
 
+# ================================
+# Observability (metrics endpoint)
+# ================================
+try:
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "8080"))   # 0 = nonaktif
+except ValueError:
+    METRICS_PORT = 8080
+LOOP_LAG_INTERVAL = 0.5
+try:
+    LOOP_LAG_WARN_MS = float(os.getenv("LOOP_LAG_WARN_MS", "250"))
+    LOOP_BLOCK_DEBUG_MS = float(os.getenv("LOOP_BLOCK_DEBUG_MS", "0"))   # 0 = debug stack nonaktif
+except ValueError:
+    LOOP_LAG_WARN_MS, LOOP_BLOCK_DEBUG_MS = 250.0, 0.0
+
+metrics.gauge("bot_outbox_queued", "Jumlah kiriman antri per lane",
+              fn=lambda: {(("lane", OUTBOX_LANE_NAMES[p]),): len(l) for p, l in outbox.lanes.items()})
+metrics.gauge("bot_outbox_events_total", "Hasil kiriman outbound queue", kind="counter",
+              fn=lambda: {(("event", k),): v for k, v in outbox.stats.items()})
+metrics.gauge("bot_pending_deletes", "Pesan yang menunggu dihapus", fn=lambda: len(delete_scheduler))
+metrics.gauge("bot_lapor_queue", "Laporan yang belum diteruskan ke owner", fn=lambda: len(lapor_queue.items) if "lapor" in features else 0)
+
+def _outbox_chat_id(query):
+    """Chat tujuan RPC kirim pesan (id gaya pyrogram), atau None kalau bukan RPC yang diantrikan."""
+    if not isinstance(query, OUTBOX_ROUTED_RPC):
+        return None
+    peer = getattr(query, "to_peer", None) or query.peer
+    if isinstance(peer, raw.types.InputPeerUser):
+        return peer.user_id
+    if isinstance(peer, raw.types.InputPeerChat):
+        return -peer.chat_id
+    if isinstance(peer, raw.types.InputPeerChannel):
+        return pyrogram_utils.get_channel_id(peer.channel_id)
+    return None
+
+def instrument_client(client):
+    """
+    Bungkus client.invoke: semua method pyrogram lewat sini, jadi latensi RPC tercatat per method raw.
+    RPC kirim pesan dari handler dialirkan lewat outbox (PRIO_USER) selama worker outbox jalan.
+    """
+    original = client.invoke
+
+    async def invoke(query, *args, **kwargs):
+        if outbox.running and not _outbox_delivering.get():
+            chat_id = _outbox_chat_id(query)
+            if chat_id is not None:
+                return await outbox.send(chat_id, lambda: invoke(query, *args, **kwargs), PRIO_USER)
+        method = type(query).__name__
+        t0 = time.perf_counter()
+        try:
+            return await original(query, *args, **kwargs)
+        except Exception as e:
+            RPC_ERRORS.inc(method=method, error=type(e).__name__)
+            raise
+        finally:
+            dt = time.perf_counter() - t0
+            RPC_LATENCY.observe(dt, method=method)
+            _trace_add("tg", dt)
+
+    client.invoke = invoke
+
+try:
+    SLOW_HANDLER_MS = float(os.getenv("SLOW_HANDLER_MS", "1000"))
+except ValueError:
+    SLOW_HANDLER_MS = 1000.0
+PERF_TRACE_BUFFER = 200
+RECENT_TRACES: deque = deque(maxlen=PERF_TRACE_BUFFER)
+SLOW_TRACES: deque = deque(maxlen=50)
+
+class HandlerTrace:
+    """
+    Rincian waktu satu eksekusi handler: total, tunggu Telegram, disk I/O, CPU di event loop,
+    dan sisanya (`other`). `cpu` = time.thread_time() selama coroutine handler benar-benar
+    jalan (lihat _CpuTimed); `other` = menunggu lock, asyncio.sleep, dan antre di belakang
+    task lain saat loop sibuk — justru bagian yang perlu dicurigai kalau nilainya besar.
+    """
+    __slots__ = ("handler", "update_type", "command", "user_id", "started", "wall", "tg", "io", "cpu", "error")
+
+    def __init__(self, handler: str, update):
+        self.handler = handler
+        self.update_type = type(update).__name__
+        self.command = _update_command(update)
+        user = getattr(update, "from_user", None)
+        self.user_id = user.id if user else None
+        self.started = time.time()
+        self.wall = self.tg = self.io = self.cpu = 0.0
+        self.error = None
+
+    @property
+    def other(self) -> float:
+        return max(0.0, self.wall - self.tg - self.io - self.cpu)
+
+    def summary(self) -> str:
+        return (
+            f"{self.handler} [{self.update_type}:{self.command}] user={self.user_id} "
+            f"total={self.wall * 1000:.0f}ms tg={self.tg * 1000:.0f}ms io={self.io * 1000:.0f}ms "
+            f"cpu={self.cpu * 1000:.0f}ms other/loop={self.other * 1000:.0f}ms"
+            + (f" error={self.error}" if self.error else "")
+        )
+
+class _CpuTimed:
+    """
+    Awaitable pembungkus coroutine handler: tiap langkah (send/throw sampai yield berikutnya)
+    diukur dengan time.thread_time(), jadi hanya CPU thread event loop selama handler ini jalan
+    yang masuk `trace.cpu` — bukan waktu tunggu, bukan task lain, bukan kerja di thread state.
+    """
+    __slots__ = ("coro", "trace")
+
+    def __init__(self, coro, trace: HandlerTrace):
+        self.coro = coro
+        self.trace = trace
+
+    def __await__(self):
+        coro, trace = self.coro, self.trace
+        value, exc = None, None
+        while True:
+            t0 = time.thread_time()
+            try:
+                step = coro.send(value) if exc is None else coro.throw(exc)
+            except StopIteration as e:
+                return e.value
+            finally:
+                trace.cpu += time.thread_time() - t0
+            try:
+                value, exc = (yield step), None
+            except BaseException as e:   # CancelledError dll. diteruskan ke handler
+                value, exc = None, e
+
+def _update_command(update) -> str:
+    cmd = getattr(update, "command", None)
+    if cmd:
+        return f"/{cmd[0]}"
+    data = getattr(update, "data", None)
+    if isinstance(data, str):
+        return re.split(r"[|_:]", data, maxsplit=1)[0]
+    if getattr(update, "media", None):
+        return "media"
+    return "text" if getattr(update, "text", None) else "-"
+
+def _instrument_callback(callback):
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(client, update):
+        trace = HandlerTrace(name, update)
+        token = _current_trace.set(trace)
+        t0 = time.perf_counter()
+        try:
+            return await _CpuTimed(callback(client, update), trace)
+        except (StopPropagation, ContinuePropagation):
+            raise
+        except Exception as e:
+            trace.error = type(e).__name__
+            HANDLER_ERRORS.inc(handler=name)
+            raise
+        finally:
+            _current_trace.reset(token)
+            trace.wall = time.perf_counter() - t0
+            HANDLER_LATENCY.observe(trace.wall, handler=name)
+            RECENT_TRACES.append(trace)
+            if trace.wall * 1000 >= SLOW_HANDLER_MS:
+                SLOW_TRACES.append(trace)
+                logger.warning(f"🐢 Handler lambat: {trace.summary()}")
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+def instrument_handlers(client) -> int:
+    """Bungkus semua handler yang sudah terdaftar di dispatcher (panggil setelah app.start())."""
+    count = 0
+    for handlers in client.dispatcher.groups.values():
+        for h in handlers:
+            if getattr(h.callback, "__instrumented__", False) or not inspect.iscoroutinefunction(h.callback):
+                continue
+            h.callback = _instrument_callback(h.callback)
+            count += 1
+    return count
+
+class LoopWatchdog:
+    """
+    Pantau event loop:
+    - task sampler: ukur keterlambatan bangun dari asyncio.sleep(interval) → lag
+    - mode debug (LOOP_BLOCK_DEBUG_MS > 0): thread terpisah cek heartbeat sampler; kalau loop
+      macet lebih dari N ms, ambil stack thread loop saat itu juga (siapa yang blocking) dan log.
+    """
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, warn_ms: float = LOOP_LAG_WARN_MS,
+                 block_debug_ms: float = LOOP_BLOCK_DEBUG_MS):
+        self.interval = interval
+        self.warn_ms = warn_ms
+        self.block_debug_ms = block_debug_ms
+        self.lags: deque = deque(maxlen=1200)        # ±10 menit sampel
+        self.max_lag = 0.0
+        self.slow_count = 0
+        self.blocks: deque = deque(maxlen=20)        # {"ts", "ms", "task", "stack"}
+        self._beat = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._thread = None
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        if self.block_debug_ms > 0 and self._thread is None:
+            self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._thread.start()
+            logger.info(f"🐕 Loop watchdog debug aktif (blok > {self.block_debug_ms:.0f}ms dilaporkan).")
+        while True:
+            t0 = self._loop.time()
+            self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, self._loop.time() - t0 - self.interval)
+            self._record(lag)
+
+    def _record(self, lag: float):
+        self.lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        LOOP_LAG.set(lag)
+        LOOP_LAG_HIST.observe(lag)
+        if lag * 1000 >= self.warn_ms:
+            self.slow_count += 1
+            if self.blocks and self.blocks[-1].get("open"):
+                self.blocks[-1]["ms"] = lag * 1000
+                self.blocks[-1]["open"] = False
+            logger.warning(f"🐌 Event loop tersendat {lag * 1000:.0f}ms")
+
+    def _watch(self):
+        """Thread: deteksi loop yang tidak kunjung kembali dan tangkap stack-nya."""
+        limit = (self.interval * 1000 + self.block_debug_ms) / 1000
+        reported_beat = None
+        while True:
+            time.sleep(max(0.01, self.block_debug_ms / 2000))
+            beat = self._beat
+            stalled = time.monotonic() - beat
+            if stalled < limit or beat == reported_beat:
+                continue
+            reported_beat = beat
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame else "(stack tidak tersedia)"
+            task = None
+            try:
+                current = asyncio.current_task(self._loop)
+                task = current.get_coro().__qualname__ if current else None
+            except Exception:
+                pass
+            self.blocks.append({
+                "ts": time.time(), "ms": (stalled - self.interval) * 1000,
+                "task": task or "-", "stack": stack, "open": True,
+            })
+            logger.warning(
+                f"🧱 Event loop terblokir > {self.block_debug_ms:.0f}ms (task: {task or '-'}). Stack:\n{stack}"
+            )
+
+    @staticmethod
+    def _blocking_site(stack: str) -> str:
+        """Baris terakhir stack yang berasal dari kode bot (bukan library)."""
+        here = os.path.basename(__file__)
+        lines = [ln.strip() for ln in stack.splitlines() if ln.strip().startswith("File ")]
+        ours = [ln for ln in lines if here in ln]
+        return (ours or lines or ["-"])[-1]
+
+    def health_lines(self) -> list[str]:
+        lags = list(self.lags)
+        lines = [
+            "🫀 Event loop:",
+            f"• Lag p50/p99/max: {_percentile(lags, 50) * 1000:.0f} / {_percentile(lags, 99) * 1000:.0f} / {self.max_lag * 1000:.0f} ms",
+            f"• Tersendat ≥ {self.warn_ms:.0f}ms: {self.slow_count}x",
+        ]
+        if self.block_debug_ms > 0:
+            lines.append(f"• Blokir terdeteksi: {len(self.blocks)}")
+            for b in list(self.blocks)[-3:]:
+                when = datetime.fromtimestamp(b["ts"], JAKARTA_TZ).strftime("%H:%M:%S")
+                lines.append(f"  - {when} {b['ms']:.0f}ms `{b['task']}` @ `{self._blocking_site(b['stack'])}`")
+        return lines
+
+loop_watchdog = features.lazy("health", LoopWatchdog)
+
+metrics_runner = None
+
+async def start_metrics_server(port: int = METRICS_PORT):
+    """HTTP server kecil di event loop bot: /metrics (Prometheus) dan / (health)."""
+    global metrics_runner
+    from aiohttp import web
+
+    async def handle_metrics(request):
+        return web.Response(
+            body=metrics.render().encode("utf-8"),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"},
+        )
+
+    async def handle_root(request):
+        return web.Response(text="ok")
+
+    webapp = web.Application()
+    webapp.router.add_get("/metrics", handle_metrics)
+    webapp.router.add_get("/", handle_root)
+    runner = web.AppRunner(webapp, access_log=None)
+    await runner.setup()
+    metrics_runner = runner
+    await web.TCPSite(runner, "0.0.0.0", port).start()
+    logger.info(f"📈 Metrics server aktif di :{port}/metrics")
+    return runner
+
+async def stop_metrics_server():
+    """Tutup listener dan koneksi metrics server (sink lifecycle)."""
+    global metrics_runner
+    runner, metrics_runner = metrics_runner, None
+    if runner is not None:
+        await runner.cleanup()
+
 # ================================
 # Background Tasks
 # ================================
@@ -2377,11 +6211,15 @@ async def send_periodic_message():
     logger.info("Periodic message task started!")
     while True:
         try:
-            logger.info("Periodic message loop tick!")  # <--- Tambahkan ini
+            logger.info("Periodic message loop tick!", extra={"event": "tick"})
             if INTERACTION_MESSAGES:
                 msg = random.choice(INTERACTION_MESSAGES)
                 logger.info(f"Periodic message: {msg}")
-                await app.send_message(chat_id=f"@{GROUP_USERNAME}", text=msg)
+                await outbox.send(
+                    f"@{GROUP_USERNAME}",
+                    lambda: app.send_message(chat_id=f"@{GROUP_USERNAME}", text=msg),
+                    PRIO_BROADCAST,
+                )
         except Exception as e:
             logger.error(f"Gagal kirim pesan periodik: {e}")
         await asyncio.sleep(INTERACTION_INTERVAL_MINUTES * 60)
@@ -2391,34 +6229,253 @@ async def periodic_log_prune():
     await asyncio.sleep(30)
     while True:
         try:
-            prune_clicks_log()
-            logger.info(f"Pruned clicks.jsonl (retention {RETENTION_DAYS} hari)")
+            await asyncio.to_thread(prune_clicks_log)
+            logger.info(f"Pruned click log (retention {RETENTION_DAYS} hari)")
         except Exception as e:
-            logger.error(f"Gagal prune clicks.jsonl: {e}")
+            logger.error(f"Gagal prune click log: {e}")
+        try:
+            lines, segs = await asyncio.to_thread(prune_clicks_human)
+            logger.info(f"Pruned clicks_human.log: {lines} baris & {segs} segmen > {RETENTION_DAYS} hari dibuang")
+        except Exception as e:
+            logger.error(f"Gagal prune clicks_human.log: {e}")
+        if "moderation" in features:
+            try:
+                n = await asyncio.to_thread(mod_audit.prune)
+                logger.info(f"Pruned audit moderasi: {n} event > {MOD_AUDIT_RETENTION_DAYS} hari")
+            except Exception as e:
+                logger.error(f"Gagal prune audit moderasi: {e}")
         await asyncio.sleep(24 * 3600)
 
+try:
+    CONFIG_REFRESH_MINUTES = max(1, int(os.getenv("CONFIG_REFRESH_MINUTES", "30")))
+except ValueError:
+    CONFIG_REFRESH_MINUTES = 30
+
+async def config_refresh_worker():
+    """Fetch ulang config remote di background (langsung setelah startup, lalu tiap interval)."""
+    while True:
+        try:
+            if "moderation" in features and os.getenv("BADWORDS_CONFIG_URL", "").strip():
+                await asyncio.to_thread(load_badwords_config)
+            if "interaction" in features and INTERACTION_CONFIG_URL:
+                await asyncio.to_thread(load_interaction_config)
+        except Exception as e:
+            logger.error(f"Gagal refresh config remote: {e}")
+        await asyncio.sleep(CONFIG_REFRESH_MINUTES * 60)
+
+# ================================
+# Lifecycle (shutdown)
+# ================================
+try:
+    SHUTDOWN_DEADLINE_SECONDS = float(os.getenv("SHUTDOWN_DEADLINE_SECONDS", "20"))
+except ValueError:
+    SHUTDOWN_DEADLINE_SECONDS = 20.0
+
+class Lifecycle:
+    """
+    Registry task latar, antrian yang perlu dikuras, dan sink persistensi.
+    SIGTERM/SIGINT memicu shutdown berurutan dalam satu deadline:
+    1) berhenti terima update (handler yang sedang jalan dibiarkan selesai)
+    2) kuras antrian (drain), mis. outbound queue
+    3) cancel semua task latar
+    4) flush semua sink ke disk (selalu jalan, walau deadline lewat)
+    5) putus dari Telegram
+    """
+
+    def __init__(self):
+        self.loop: asyncio.AbstractEventLoop | None = None
+        self.tasks: dict[str, asyncio.Task] = {}
+        self.drains: list[tuple[str, object]] = []   # (nama, async fn(timeout) -> sisa item)
+        self.sinks: list[tuple[str, object]] = []    # (nama, fn() sync/async)
+        self._stop: asyncio.Event | None = None
+        self.stopping = False
+
+    def install(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self._stop = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            try:
+                loop.add_signal_handler(sig, self.request_stop, sig.name)
+            except (NotImplementedError, RuntimeError):
+                pass   # Windows: SIGINT tetap jadi KeyboardInterrupt
+
+    def spawn(self, name: str, coro) -> asyncio.Task:
+        task = self.loop.create_task(coro, name=name)
+        self.tasks[name] = task
+        return task
+
+    def add_drain(self, name: str, fn):
+        self.drains.append((name, fn))
+
+    def add_sink(self, name: str, fn):
+        self.sinks.append((name, fn))
+
+    def request_stop(self, reason: str = "manual"):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info(f"🛑 Shutdown diminta ({reason}), deadline {SHUTDOWN_DEADLINE_SECONDS:.0f}s")
+        self._stop.set()
+
+    async def wait(self):
+        await self._stop.wait()
+
+    async def shutdown(self, client, deadline: float = SHUTDOWN_DEADLINE_SECONDS):
+        t_end = time.monotonic() + deadline
+        left = lambda: max(0.0, t_end - time.monotonic())
+
+        # 1) stop update baru; dispatcher menunggu handler yang sedang jalan
+        try:
+            await asyncio.wait_for(client.dispatcher.stop(), timeout=left())
+        except asyncio.TimeoutError:
+            logger.warning("Shutdown: handler belum selesai saat deadline.")
+        except Exception as e:
+            logger.error(f"Shutdown: gagal stop dispatcher: {e}")
+
+        # 2) drain
+        for name, fn in self.drains:
+            try:
+                rest = await asyncio.wait_for(fn(left()), timeout=left() + 0.1)
+                if rest:
+                    logger.warning(f"Shutdown: {name} masih menyisakan {rest} item.")
+            except asyncio.TimeoutError:
+                logger.warning(f"Shutdown: drain {name} melewati deadline.")
+            except Exception as e:
+                logger.error(f"Shutdown: drain {name} gagal: {e}")
+
+        # 3) cancel task latar
+        for task in self.tasks.values():
+            task.cancel()
+        await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+
+        # 4) flush sink (tanpa deadline: kehilangan data lebih buruk dari shutdown yang telat)
+        for name, fn in self.sinks:
+            try:
+                out = fn()
+                if asyncio.iscoroutine(out):
+                    await out
+            except Exception as e:
+                logger.error(f"Shutdown: flush {name} gagal: {e}")
+
+        # 5) putus dari Telegram
+        try:
+            await asyncio.wait_for(client.stop(), timeout=max(left(), 5.0))
+        except Exception as e:
+            logger.error(f"Shutdown: gagal stop client: {e}")
+        logger.info(f"👋 Shutdown selesai dalam {deadline - left():.1f}s.")
+
+lifecycle = Lifecycle()
+
+# ================================
+# Startup
+# ================================
+STARTUP_TIMINGS: dict[str, float] = {}   # langkah -> detik, diisi bootstrap()
+
+async def _startup_step(name: str, fn, *args):
+    t0 = time.perf_counter()
+    try:
+        await asyncio.to_thread(fn, *args)
+    except Exception as e:
+        logger.error(f"Startup: {name} gagal: {e}")
+    finally:
+        STARTUP_TIMINGS[name] = time.perf_counter() - t0
+
+async def bootstrap(client):
+    """
+    Muat state & config lokal secara paralel (config remote pakai cache last-known-good,
+    tanpa fetch jaringan), lalu konek ke Telegram. Refresh remote menyusul di config_refresh_worker.
+    """
+    t0 = time.perf_counter()
+    if _click_log_binary() and not CLICKS_BIN.exists() and CLICKS_JSONL.exists():
+        # sekali saja saat pindah ke format biner; trending di bawah butuh log yang sudah lengkap
+        await _startup_step("click_log_convert", convert_clicks_jsonl)
+    steps = [("stream_map", load_stream_map), (f"state_{state.name}", state.warmup)]
+    if "catalog" in features:
+        steps.append(("trending", trending.warmup))
+    if "dashboard" in features:
+        steps += [("engagement", engagement.warmup), ("funnel", funnel.warmup)]
+    if "moderation" in features:
+        steps += [("badwords", load_badwords_config, False), ("warn_db", load_warn_db),
+                  ("mod_audit", mod_audit.warmup)]
+    if "interaction" in features:
+        steps.append(("interaction", load_interaction_config, False))
+    if "polls" in features:
+        steps.append(("poll_config", load_poll_config))
+    await asyncio.gather(*(_startup_step(*step) for step in steps))
+    STARTUP_TIMINGS["load_total"] = time.perf_counter() - t0
+
+    t1 = time.perf_counter()
+    await client.start()
+    STARTUP_TIMINGS["telegram_connect"] = time.perf_counter() - t1
+    STARTUP_TIMINGS["total"] = time.perf_counter() - t0
+    logger.info("⏱️ Startup: " + ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in STARTUP_TIMINGS.items()))
+
+def startup_health_lines() -> list[str]:
+    if not STARTUP_TIMINGS:
+        return []
+    parts = ", ".join(f"{k} {v * 1000:.0f}ms" for k, v in STARTUP_TIMINGS.items() if k != "total")
+    return [f"🚦 Startup {STARTUP_TIMINGS.get('total', 0) * 1000:.0f}ms ({parts})"]
+
 # ================================
 # Main
 # ================================
 
 if __name__ == "__main__":
-    load_stream_map()
-    load_badwords_config()
-    load_interaction_config()
-    load_warn_db()
+    setup_runtime()
+    if sys.argv[1:2] == ["convert-clicks"]:
+        # python main.py convert-clicks → buat logs/clicks.bin dari logs/clicks.jsonl lalu keluar
+        convert_clicks_jsonl()
+        sys.exit(0)
+    features.configure(os.getenv("BOT_FEATURES", "all"))
+    logger.info(f"🧩 Fitur aktif: {features.summary()}")
+    logger.info(f"🗄️ State backend: {state.name}")
+    lifecycle.install(app.loop)
     try:
-        app.start()
+        instrument_client(app)
+        features.install(app)
+        app.loop.run_until_complete(bootstrap(app))
         logger.info("🚀 BOT AKTIF ✅ @BangsaBacolBot")
+        logger.info(f"⏱️ {instrument_handlers(app)} handler diinstrumentasi.")
         
-        # Tambahkan periodic tasks ke event loop milik app
-        app.loop.create_task(send_periodic_message())
-        app.loop.create_task(periodic_log_prune())
-        
-        app.loop.run_forever()
+        # Task latar didaftarkan ke lifecycle supaya di-cancel rapi saat shutdown
+        outbox.start(app.loop)
+        delete_scheduler.load()
+        lifecycle.spawn("delete_scheduler", delete_scheduler.run(app))
+        lifecycle.spawn("log_prune", periodic_log_prune())
+        lifecycle.spawn("activity_flush", activity_flush_worker())
+        lifecycle.spawn("config_refresh", config_refresh_worker())
+        lifecycle.spawn("log_sampler", log_sampler.run())
+        lifecycle.spawn("disk_budget", disk_governor.run())
+        if "interaction" in features:
+            lifecycle.spawn("periodic_message", send_periodic_message())
+        if "lapor" in features:
+            lifecycle.spawn("lapor_queue", lapor_queue_worker())
+        if "dashboard" in features:
+            lifecycle.spawn("dashboard_snapshots", dashboard_snapshots.run())
+        if "health" in features:
+            lifecycle.spawn("loop_watchdog", loop_watchdog.run())
+            if METRICS_PORT:
+                lifecycle.spawn("metrics_server", start_metrics_server())
+
+        # Urutan drain: welcome yang masih ditahan dikirim dulu, baru outbound queue dikuras
+        lifecycle.add_drain("welcome", lambda timeout: flush_pending_welcomes(app))
+        lifecycle.add_drain("outbox", outbox.drain)
+        lifecycle.add_sink("outbox", outbox.stop)
+        lifecycle.add_sink("activity", activity.flush)
+        for name, obj in (("trending", trending), ("engagement", engagement), ("funnel", funnel)):
+            lifecycle.add_sink(name, lambda obj=obj: obj.loaded and obj.flush())
+        lifecycle.add_sink("pending_deletes", delete_scheduler._save)
+        lifecycle.add_sink("state", STATE_EXECUTOR.shutdown)
+        lifecycle.add_sink("metrics_server", stop_metrics_server)
+        lifecycle.add_sink("logs", stop_logging)
+
+        app.loop.run_until_complete(lifecycle.wait())
     except KeyboardInterrupt:
         logger.info("👋 Bot dimatikan. Sampai jumpa!")
     except Exception as e:
         logger.error(f"Terjadi kesalahan fatal saat menjalankan bot: {e}")
     finally:
-        app.stop()
-
+        if app.is_connected:
+            app.loop.run_until_complete(lifecycle.shutdown(app))
+        else:
+            activity.flush()
@@ -0,0 +1,23 @@
+"""
+Fixture bersama: main.py diimport sekali per sesi (env dummy, tanpa koneksi Telegram),
+lalu tiap test jalan di folder kosong sendiri supaya path relatif bot (logs/, data/)
+tidak saling bocor.
+"""
+import pytest
+
+from bench.run import load_bot
+
+
+@pytest.fixture(scope="session")
+def bot(tmp_path_factory):
+    main = load_bot(tmp_path_factory.mktemp("bot"))
+    yield main
+    main.stop_logging()   # selagi stream capture pytest masih terbuka
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "logs").mkdir()
+    (tmp_path / "data").mkdir()
+    return tmp_path
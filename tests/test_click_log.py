@@ -0,0 +1,127 @@
+"""BinaryClickLog: format, prune dengan binary search, dan append paralel selama prune."""
+import threading
+
+import pytest
+
+
+@pytest.fixture
+def make_log(bot, workdir):
+    def make():
+        # instance terpisah = penulis terpisah (kunci flock per file descriptor)
+        return bot.BinaryClickLog(workdir / "logs" / "clicks.bin", workdir / "logs" / "clicks.codes.json")
+    return make
+
+
+def test_roundtrip_and_since(make_log):
+    log = make_log()
+    for i in range(10):
+        log.append(1000 + i, 500 + i, f"kode{i % 3}")
+    events = list(log.iter_events())
+    assert events[0] == (1000, 500, "kode0")
+    assert [e[2] for e in events[:4]] == ["kode0", "kode1", "kode2", "kode0"]
+    assert [e[0] for e in log.iter_events(since=1007)] == [1007, 1008, 1009]
+    assert log.stats()["records"] == 10
+    assert log.stats()["codes"] == 3
+
+
+def test_codes_shared_between_writers(make_log):
+    a, b = make_log(), make_log()
+    a.append(1, 1, "x")
+    b.append(2, 2, "y")
+    a.append(3, 3, "y")   # a harus melihat id yang sudah dibuat b
+    assert [e[2] for e in make_log().iter_events()] == ["x", "y", "y"]
+
+
+def test_unknown_code_id_is_placeholder(make_log):
+    log = make_log()
+    log.append(1, 1, "x")
+    assert log.code_name(7) == "#7"
+
+
+def test_truncated_tail_is_ignored(make_log):
+    log = make_log()
+    log.append(1, 1, "x")
+    log.append(2, 2, "x")
+    with open(log.path, "ab") as f:
+        f.write(b"\x00" * 5)   # record terakhir terpotong (crash saat menulis)
+    assert [e[0] for e in log.iter_events()] == [1, 2]
+
+
+def test_prune_keeps_records_at_or_after_cutoff(make_log):
+    log = make_log()
+    for ts in range(100, 200):
+        log.append(ts, ts, "k")
+    log.prune(150)
+    assert [e[0] for e in log.iter_events()] == list(range(150, 200))
+    log.prune(100)   # tidak ada yang lebih tua: file tidak disentuh
+    assert log.stats()["records"] == 50
+
+
+def test_prune_does_not_lose_concurrent_appends(make_log):
+    old = make_log()
+    for ts in range(1000):
+        old.append(ts, 0, "old")
+    cutoff = 1000
+    n_writers, per_writer = 4, 300
+    stop = threading.Event()
+
+    def writer(i):
+        log = make_log()
+        for j in range(per_writer):
+            log.append(cutoff + j, i, f"w{i}")
+
+    def pruner():
+        log = make_log()
+        while not stop.is_set():
+            log.prune(cutoff)
+
+    p = threading.Thread(target=pruner)
+    p.start()
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(n_writers)]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    stop.set()
+    p.join()
+    make_log().prune(cutoff)
+
+    events = list(make_log().iter_events())
+    assert len(events) == n_writers * per_writer
+    assert all(ts >= cutoff for ts, _, _ in events)
+    assert {uid: sum(1 for _, u, _ in events if u == uid) for uid in range(n_writers)} == \
+        {i: per_writer for i in range(n_writers)}
+
+
+def test_jsonl_prune_does_not_lose_concurrent_appends(bot, workdir, monkeypatch):
+    monkeypatch.setattr(bot, "CLICK_LOG_FORMAT", "jsonl")
+    old = (bot.datetime.now(bot.JAKARTA_TZ) - bot.timedelta(days=30)).isoformat()
+    with open(bot.CLICKS_JSONL, "w", encoding="utf-8") as f:
+        for i in range(2000):
+            f.write(bot.json.dumps({"ts": old, "user_id": i, "code": "lama"}) + "\n")
+    n_writers, per_writer = 4, 200
+    stop = threading.Event()
+
+    def writer(i):
+        for _ in range(per_writer):
+            bot.append_click_log(i, f"u{i}", "baru", "https://x")
+
+    def pruner():
+        while not stop.is_set():
+            bot.prune_clicks_log(7)
+
+    p = threading.Thread(target=pruner)
+    p.start()
+    writers = [threading.Thread(target=writer, args=(i,)) for i in range(n_writers)]
+    for t in writers:
+        t.start()
+    for t in writers:
+        t.join()
+    stop.set()
+    p.join()
+    bot.prune_clicks_log(7)
+
+    with open(bot.CLICKS_JSONL, encoding="utf-8") as f:
+        events = [bot.json.loads(line) for line in f]
+    assert len(events) == n_writers * per_writer
+    assert {e["code"] for e in events} == {"baru"}
@@ -0,0 +1,144 @@
+"""DeleteScheduler: heap jatuh tempo, batch per chat, dan persistensi antar restart."""
+import asyncio
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = []
+
+    async def delete_messages(self, chat_id, ids):
+        self.calls.append((chat_id, list(ids)))
+
+
+async def _run_until(sched, client, cond, timeout=2.0):
+    task = asyncio.create_task(sched.run(client))
+    try:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while not cond() and asyncio.get_running_loop().time() < deadline:
+            await asyncio.sleep(0.01)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+def test_due_messages_are_batched_per_chat(bot, workdir, monkeypatch):
+    monkeypatch.setattr(bot, "DELETE_BATCH_SIZE", 2)
+    sched = bot.DeleteScheduler(workdir / "data" / "pending.json")
+    client = FakeClient()
+
+    async def main():
+        sched.schedule(-1, [1, 2, 3], 0)
+        sched.schedule(-2, [9], 0)
+        sched.schedule(-1, [4], 60)   # belum jatuh tempo
+        await _run_until(sched, client, lambda: len(client.calls) >= 3)
+
+    asyncio.run(main())
+    assert sorted(client.calls) == [(-2, [9]), (-1, [1, 2]), (-1, [3])]
+    assert len(sched) == 1
+
+
+def test_schedule_wakes_a_sleeping_runner(bot, workdir):
+    sched = bot.DeleteScheduler(workdir / "data" / "pending.json")
+    client = FakeClient()
+
+    async def main():
+        sched.schedule(-1, [1], 60)
+        task = asyncio.create_task(sched.run(client))
+        await asyncio.sleep(0.05)          # runner tidur sampai 60 detik lagi
+        sched.schedule(-1, [2], 0)
+        for _ in range(100):
+            if client.calls:
+                break
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(main())
+    assert client.calls == [(-1, [2])]
+
+
+def test_pending_deletes_survive_restart(bot, workdir):
+    path = workdir / "data" / "pending.json"
+    bot.DeleteScheduler(path).schedule(-1, [5, 6], 30)
+    again = bot.DeleteScheduler(path)
+    again.load()
+    assert len(again) == 2
+    assert sorted(m for _, _, m in again._heap) == [5, 6]
+
+
+def test_delete_errors_do_not_stop_the_runner(bot, workdir):
+    sched = bot.DeleteScheduler(workdir / "data" / "pending.json")
+    calls = []
+
+    class Flaky(FakeClient):
+        async def delete_messages(self, chat_id, ids):
+            calls.append(chat_id)
+            if chat_id == -1:
+                raise RuntimeError("MESSAGE_DELETE_FORBIDDEN")
+
+    async def main():
+        sched.schedule(-1, [1], 0)
+        sched.schedule(-2, [2], 0)
+        await _run_until(sched, Flaky(), lambda: len(calls) >= 2)
+
+    asyncio.run(main())
+    assert sorted(calls) == [-2, -1]
+
+
+class FakeUser:
+    def __init__(self, uid):
+        self.id, self.is_bot, self.mention = uid, False, f"u{uid}"
+
+
+class FakeChat:
+    id, title = -100, "Grup"
+
+
+class FakeJoin:
+    chat = FakeChat()
+
+    def __init__(self, sent, *uids):
+        self.new_chat_members = [FakeUser(u) for u in uids]
+        self.sent = sent
+
+    async def reply_text(self, text, **kwargs):
+        self.sent.append(text)
+        return type("Sent", (), {"id": len(self.sent)})()
+
+
+def _direct_outbox(bot, monkeypatch):
+    async def send(chat_id, call, prio=None):
+        return await call()
+    monkeypatch.setattr(bot.outbox, "send", send)
+    monkeypatch.setattr(bot.delete_scheduler, "schedule", lambda *a: None)
+
+
+def test_welcome_joins_are_coalesced_and_tracked(bot, monkeypatch):
+    _direct_outbox(bot, monkeypatch)
+    monkeypatch.setattr(bot, "WELCOME_COALESCE_SECONDS", 0.05)
+    sent = []
+
+    async def main():
+        await bot.greet_new_member(None, FakeJoin(sent, 1, 2))
+        await bot.greet_new_member(None, FakeJoin(sent, 2, 3))
+        await asyncio.sleep(0.1)
+        assert not bot._welcome_pending
+        await asyncio.gather(*bot._welcome_tasks)   # task flush tetap direferensikan sampai selesai
+        assert not bot._welcome_tasks
+
+    asyncio.run(main())
+    assert len(sent) == 1 and "u1, u2, u3" in sent[0]
+
+
+def test_shutdown_flushes_pending_welcome_without_waiting_for_timer(bot, monkeypatch):
+    _direct_outbox(bot, monkeypatch)
+    monkeypatch.setattr(bot, "WELCOME_COALESCE_SECONDS", 60)
+    sent = []
+
+    async def main():
+        await bot.greet_new_member(None, FakeJoin(sent, 7))
+        assert await asyncio.wait_for(bot.flush_pending_welcomes(None), 1) == 0
+        assert not bot._welcome_tasks   # timer dibatalkan: tidak ada flush kedua yang menyusul
+
+    asyncio.run(main())
+    assert len(sent) == 1
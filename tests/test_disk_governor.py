@@ -0,0 +1,144 @@
+"""DiskGovernor: pengenalan segmen rotasi, kompresi, umur, dan budget (tertua dulu)."""
+import gzip
+import os
+import time
+
+import pytest
+
+
+@pytest.fixture
+def layout(workdir):
+    logs, data = workdir / "logs", workdir / "data"
+    return logs, data, logs / "activity.log", logs / "clicks_human.log"
+
+
+@pytest.fixture
+def governor(bot, layout):
+    logs, data, activity, clicks = layout
+    return bot.DiskGovernor((logs, data), 10_000, logs={activity: 30, clicks: 7})
+
+
+def _write(path, size: int, age_days: float = 0.0):
+    path.write_bytes(os.urandom(size))
+    mtime = time.time() - age_days * 86400
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+@pytest.mark.parametrize("suffix", [".1", ".12", ".20260101-120000", ".20260101-120000-2",
+                                    ".20260101-120000.gz", ".3.gz"])
+def test_segment_names_match(governor, layout, suffix):
+    activity = layout[2]
+    assert governor._segment_of(activity.with_name(activity.name + suffix)) == activity
+
+
+@pytest.mark.parametrize("name", ["activity.log", "activity.log.bak", "activity.log.1.txt",
+                                  "activity.logs.1", "activity.log.2026-01-01", "other.log.1"])
+def test_non_segments_do_not_match(governor, layout, name):
+    assert governor._segment_of(layout[0] / name) is None
+
+
+def test_segment_in_other_directory_does_not_match(governor, layout):
+    data, activity = layout[1], layout[2]
+    assert governor._segment_of(data / (activity.name + ".1")) is None
+
+
+def test_rotate_names_by_time_and_never_clobbers(governor, layout):
+    clicks = layout[3]
+    _write(clicks, 10)
+    first = governor.rotate(clicks)
+    _write(clicks, 10)
+    second = governor.rotate(clicks)
+    assert first != second and first.exists() and second.exists()
+    assert not clicks.exists()
+    assert governor._segment_of(first) == governor._segment_of(second) == clicks
+
+
+def test_enforce_compresses_segments_and_keeps_mtime(governor, layout):
+    activity = layout[2]
+    seg = _write(activity.with_name("activity.log.1"), 2000, age_days=1)
+    mtime = seg.stat().st_mtime
+    report = governor.enforce()
+    assert report["compressed"] == 1
+    assert not seg.exists()
+    (gz,) = activity.parent.glob("activity.log.*.gz")
+    assert abs(gz.stat().st_mtime - mtime) < 1
+    assert len(gzip.decompress(gz.read_bytes())) == 2000
+
+
+def test_enforce_expires_by_log_age(governor, layout):
+    clicks, activity = layout[3], layout[2]
+    old_click = _write(clicks.with_name("clicks_human.log.20250101-000000.gz"), 10, age_days=8)
+    old_activity = _write(activity.with_name("activity.log.20250101-000000.gz"), 10, age_days=8)
+    governor.enforce()
+    assert not old_click.exists()      # retensi clicks 7 hari
+    assert old_activity.exists()       # activity 30 hari
+
+
+def test_budget_deletes_oldest_segments_never_live_files(governor, layout):
+    logs, data, activity, clicks = layout
+    live = [_write(activity, 3000), _write(clicks, 1000), _write(data / "state.db", 3000)]
+    segs = [_write(activity.with_name(f"activity.log.2026010{i}-000000.gz"), 1500, age_days=5 - i)
+            for i in range(1, 5)]      # segs[0] tertua
+    report = governor.enforce()
+    # total awal 7000 + 6000 = 13000 > 10000: dua segmen tertua cukup untuk turun ke 10000
+    assert [s.exists() for s in segs] == [False, False, True, True]
+    assert all(p.exists() for p in live)
+    assert report["deleted"] == 2 and report["freed"] == 3000
+    assert report["total"] == 10000 and not report["over_budget"]
+    assert report["by_root"] == {str(logs): 7000, str(data): 3000}
+
+
+def test_over_budget_with_only_live_files_is_reported(governor, layout):
+    data = layout[1]
+    big = _write(data / "state.db", 20_000)
+    report = governor.enforce()
+    assert big.exists()
+    assert report["over_budget"] and report["deleted"] == 0
+
+
+def test_stale_tmp_files_are_removed(governor, layout):
+    data = layout[1]
+    stale = _write(data / "trending.json.tmp", 10, age_days=1)
+    fresh = _write(data / "funnel.json.tmp", 10)
+    governor.enforce()
+    assert not stale.exists() and fresh.exists()
+
+
+def _human_line(bot, days_ago: float, n: int) -> str:
+    ts = (bot.datetime.now(bot.JAKARTA_TZ) - bot.timedelta(days=days_ago)).strftime("%Y-%m-%d %H:%M:%S")
+    return f"[{ts}] User {n} (@u{n}) klik: k → https://x\n"
+
+
+def test_prune_clicks_human_keeps_recent_lines_in_live_file(bot):
+    live = bot.CLICKS_HUMAN
+    recent = [_human_line(bot, 1, i) for i in range(3)]
+    live.write_text("".join([_human_line(bot, 10, 9), _human_line(bot, 8, 8)] + recent), encoding="utf-8")
+    old_seg = _write(live.with_name("clicks_human.log.20250101-000000.gz"), 10, age_days=8)
+    assert bot.prune_clicks_human(7) == (2, 1)
+    assert live.read_text(encoding="utf-8") == "".join(recent)   # /log masih menampilkan klik terbaru
+    assert not old_seg.exists()
+
+    ino = live.stat().st_ino
+    assert bot.prune_clicks_human(7) == (0, 0)
+    assert live.stat().st_ino == ino   # tidak ada baris lama: file tidak ditulis ulang
+
+
+def test_prune_clicks_human_rotates_only_past_segment_size(bot, monkeypatch):
+    live = bot.CLICKS_HUMAN
+    live.write_text(_human_line(bot, 0, 1), encoding="utf-8")
+    bot.prune_clicks_human(7)
+    assert live.exists() and not list(live.parent.glob("clicks_human.log.*"))
+    monkeypatch.setattr(bot, "LOG_SEGMENT_MAX_BYTES", 10)
+    bot.prune_clicks_human(7)
+    (seg,) = live.parent.glob("clicks_human.log.*")
+    assert bot.disk_governor._segment_of(seg) == live
+
+
+def test_mod_log_rotates_into_governor_segments(bot, monkeypatch):
+    monkeypatch.setattr(bot, "MOD_LOG_MAX_BYTES", 10)
+    bot._write_mod_log("WARN", 1, None, None, "satu")
+    bot._write_mod_log("WARN", 1, None, None, "dua")
+    (seg,) = bot.MOD_LOG.parent.glob("mod_action.log.*")
+    assert bot.disk_governor._segment_of(seg) == bot.MOD_LOG   # nama bertanggal, bukan .1 … .N
+    assert "dua" in bot.MOD_LOG.read_text(encoding="utf-8") and "satu" in seg.read_text(encoding="utf-8")
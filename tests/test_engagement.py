@@ -0,0 +1,71 @@
+"""UserBitmaps: DAU/WAU dari OR bitmap harian dan retensi kohort user baru."""
+from datetime import date, timedelta
+
+import pytest
+
+
+@pytest.fixture
+def today(bot):
+    return date.fromisoformat(bot._today_key())
+
+
+@pytest.fixture
+def bitmaps(bot, workdir, today):
+    bm = bot.UserBitmaps(workdir / "data" / "engagement")
+    days = {10: [1, 2, 3], 9: [1, 4], 7: [2, 4, 4]}
+    for ago, users in sorted(days.items(), reverse=True):
+        for uid in users:
+            bm.mark(uid, (today - timedelta(days=ago)).isoformat())
+    bm.flush()
+    return bm
+
+
+def _checks(bm, today):
+    d = lambda ago: today - timedelta(days=ago)
+    assert bm.active(d(10)) == 3
+    assert bm.active(d(9)) == 2
+    assert bm.active(d(7), 4) == 4          # OR tiga hari: user 1-4
+    assert bm.active(d(8)) == 0             # hari tanpa aktivitas
+    assert bm.retention(d(10), 1) == (3, 1)   # dari {1,2,3} hanya 1 kembali besoknya
+    assert bm.retention(d(10), 3) == (3, 1)   # ... dan hanya 2 di D3
+    assert bm.retention(d(9), 2) == (1, 1)    # kohort {4}
+    assert bm.retention(d(8), 1) == (0, None)
+
+
+def test_active_and_retention(bitmaps, today):
+    _checks(bitmaps, today)
+
+
+def test_reload_from_disk(bot, bitmaps, today):
+    again = bot.UserBitmaps(bitmaps.root)
+    _checks(again, today)
+    again.mark(2, (today - timedelta(days=6)).isoformat())   # user lama tidak dapat index baru
+    assert len(again.users) == 4
+
+
+def test_today_is_read_from_memory_and_not_final(bot, bitmaps, today):
+    bitmaps.mark(5)
+    bitmaps.mark(1)
+    snap = bitmaps.snapshot()
+    assert bitmaps.active(today, snap=snap) == 2
+    assert bitmaps.retention(today, 1, snap) == (1, None)   # D1 belum terjadi
+    bitmaps.mark(6)                                           # snapshot tidak ikut berubah
+    assert bitmaps.active(today, snap=snap) == 2
+    assert bitmaps.active(today) == 3
+
+
+def test_rewrite_invalidates_cached_day(bot, workdir, today):
+    bm = bot.UserBitmaps(workdir / "data" / "engagement")
+    day = (today - timedelta(days=2)).isoformat()
+    bm.mark(1, day)
+    bm.flush()
+    assert bm.active(date.fromisoformat(day)) == 1   # masuk cache
+    bm.mark(2, day)
+    bm.flush()
+    assert bm.active(date.fromisoformat(day)) == 2
+
+
+def test_cohort_text_renders(bot, bitmaps, monkeypatch):
+    monkeypatch.setattr(bot, "engagement", bitmaps)
+    text = bot.build_cohort_text(10)
+    assert "DAU" in text and "3 baru" in text
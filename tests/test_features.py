@@ -0,0 +1,30 @@
+"""FeatureRegistry.lazy: objek fitur dibangun sekali saat dipakai dan ditolak kalau fiturnya nonaktif."""
+import pytest
+
+
+def test_lazy_object_is_built_once_on_first_use(bot):
+    reg = bot.FeatureRegistry(bot.FEATURES)
+    built = []
+    obj = reg.lazy("dashboard", lambda: built.append(1) or {"a": 1})
+    assert not obj.loaded and built == []
+    assert obj.keys() == {"a"} and obj.copy() == {"a": 1}   # atribut diteruskan ke objek asli
+    assert obj.loaded and built == [1]
+
+
+def test_disabled_feature_refuses_access(bot):
+    reg = bot.FeatureRegistry(bot.FEATURES)
+    reg.configure("core,catalog")
+    obj = reg.lazy("dashboard", dict)
+    with pytest.raises(RuntimeError):
+        obj.keys()
+    assert not obj.loaded   # flush/shutdown cukup cek `loaded`, tidak ikut error
+
+
+def test_unknown_feature_is_rejected(bot):
+    with pytest.raises(ValueError):
+        bot.FeatureRegistry(bot.FEATURES).lazy("ngawur", dict)
+
+
+def test_funnel_belongs_to_dashboard(bot):
+    # /start (core) dan verify_ (catalog) mencatat hanya kalau "dashboard" aktif
+    assert bot.funnel.feature == "dashboard"
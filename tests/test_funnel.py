@@ -0,0 +1,81 @@
+"""AccessFunnel: counter per (tahap, hasil, kode), histogram latensi, ring per jam, persistensi."""
+import pytest
+
+
+@pytest.fixture
+def clock(bot, monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def funnel(bot, workdir, clock, monkeypatch):
+    monkeypatch.setattr(bot, "STREAM_MAP", {"Alpha": {"link": "x"}, "beta": {"link": "y"}})
+    return bot.AccessFunnel(workdir / "data" / "funnel.json", window_hours=3)
+
+
+def test_events_are_counted_per_stage_outcome_and_code(funnel):
+    funnel.event("start", "shown", "Alpha", 0.02)
+    funnel.event("start", "shown", "beta", 0.02)
+    funnel.event("verify", "not_member", "Alpha", 0.3)
+    funnel.event("start", "unknown_code", "ngawur")
+    s = funnel.summary()
+    assert s["events"][("start", "shown")] == 2
+    assert s["by_code"]["(tidak dikenal)"] == {("start", "unknown_code"): 1}   # kode liar dikumpulkan
+    assert funnel.summary(code="Alpha")["events"] == {("start", "shown"): 1, ("verify", "not_member"): 1}
+
+
+def test_latency_percentiles_use_bucket_upper_bounds(funnel):
+    for _ in range(9):
+        funnel.event("verify", "opened", "Alpha", 0.04)
+    funnel.event("verify", "opened", "Alpha", 2.0)
+    funnel.event("verify", "not_member", "Alpha", 0.2)
+    lat = funnel.summary()["latency"]
+    assert lat[("verify", "opened")] == (10, 0.05, 2.5)
+    assert lat[("verify", "not_member")] == (1, 0.25, 0.25)   # hasil berbeda tidak tercampur
+
+
+def test_conversion_time_from_start_to_verify(bot, funnel, monkeypatch):
+    t = [100.0]
+    monkeypatch.setattr(bot.time, "monotonic", lambda: t[0])
+    funnel.started(7, "Alpha")
+    t[0] += 4.0
+    funnel.converted(7, "Alpha")
+    funnel.converted(7, "Alpha")   # verify_ kedua tanpa /start baru tidak dihitung lagi
+    assert funnel.summary()["latency"][("convert", "converted")] == (1, 5.0, 5.0)
+
+
+def test_ring_drops_hours_outside_window(funnel, clock):
+    funnel.event("start", "shown", "Alpha")
+    clock[0] += 3600
+    funnel.event("start", "shown", "Alpha")
+    assert funnel.summary(hours=3)["events"][("start", "shown")] == 2
+    assert funnel.summary(hours=1)["events"][("start", "shown")] == 1
+    clock[0] += 3 * 3600
+    funnel.event("start", "shown", "beta")
+    assert len(funnel.hours) == 1
+    assert funnel.summary(hours=3)["events"] == {("start", "shown"): 1}
+
+
+def test_flush_and_warmup_restore_ring(bot, funnel):
+    funnel.event("gate", "ok", "Alpha", 0.01)
+    funnel.flush()
+    again = bot.AccessFunnel(funnel.path, window_hours=3)
+    again.warmup()
+    assert again.summary() == funnel.summary()
+
+
+def test_changed_buckets_drop_old_histograms(bot, funnel):
+    funnel.event("gate", "ok", "Alpha", 0.01)
+    funnel.flush()
+    again = bot.AccessFunnel(funnel.path, window_hours=3, buckets=(1.0, 2.0))
+    again.warmup()
+    s = again.summary()
+    assert s["events"] == {("gate", "ok"): 1} and s["latency"] == {}
+
+
+def test_resolve_code_is_case_insensitive(bot, funnel):
+    assert bot._resolve_code("alpha") == "Alpha"
+    assert bot._resolve_code("beta") == "beta"
+    assert bot._resolve_code("gamma") == "gamma"
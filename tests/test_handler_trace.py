@@ -0,0 +1,69 @@
+"""HandlerTrace: pembagian waktu handler ke tg / io / cpu / other lewat _instrument_callback."""
+import asyncio
+import time
+
+import pytest
+
+
+def _burn(secs: float):
+    end = time.thread_time() + secs
+    while time.thread_time() < end:
+        pass
+
+
+@pytest.fixture
+def traces(bot, monkeypatch):
+    monkeypatch.setattr(bot, "RECENT_TRACES", bot.deque(maxlen=10))
+    return bot.RECENT_TRACES
+
+
+def test_cpu_counts_only_the_handlers_own_steps(bot, traces):
+    async def handler(client, update):
+        _burn(0.03)
+        await asyncio.sleep(0.08)   # selama tidur, task lain yang memakai CPU
+        _burn(0.02)
+        return "ok"
+
+    async def neighbour():
+        await asyncio.sleep(0.01)
+        _burn(0.05)
+
+    async def main():
+        wrapped = bot._instrument_callback(handler)
+        return await asyncio.gather(wrapped(None, object()), neighbour())
+
+    assert asyncio.run(main())[0] == "ok"
+    (tr,) = traces
+    assert 0.045 <= tr.cpu < 0.09
+    assert tr.other >= 0.05          # tidur + antre di belakang neighbour
+    assert "cpu=" in tr.summary()
+
+
+def test_cancellation_reaches_the_handler(bot, traces):
+    seen = []
+
+    async def handler(client, update):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            seen.append("cancelled")
+            raise
+
+    async def main():
+        task = asyncio.create_task(bot._instrument_callback(handler)(None, object()))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    asyncio.run(main())
+    assert seen == ["cancelled"] and len(traces) == 1
+
+
+def test_errors_are_recorded(bot, traces):
+    async def handler(client, update):
+        raise ValueError("x")
+
+    with pytest.raises(ValueError):
+        asyncio.run(bot._instrument_callback(handler)(None, object()))
+    assert traces[0].error == "ValueError"
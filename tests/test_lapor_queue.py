@@ -0,0 +1,96 @@
+"""LaporQueue: pemecahan laporan panjang, lanjut tanpa duplikat setelah gagal, dan digest."""
+import asyncio
+import re
+from types import SimpleNamespace
+
+import pytest
+
+
+class FakeClient:
+    def __init__(self, fail_at=None):
+        self.sent = []
+        self.fail_at = fail_at
+
+    async def send_message(self, chat_id, text, parse_mode=None):
+        if self.fail_at is not None and len(self.sent) == self.fail_at:
+            self.fail_at = None
+            raise ConnectionError("putus")
+        self.sent.append(text)
+
+    async def copy_message(self, chat_id, from_chat, message_id, caption=None, parse_mode=None):
+        self.sent.append(("copy", message_id, caption))
+
+
+def _message(mid, text=None, caption=None, media=False):
+    user = SimpleNamespace(id=42, first_name="Budi <b>", username="budi")
+    return SimpleNamespace(id=mid, from_user=user, chat=SimpleNamespace(id=42),
+                           text=text, caption=caption, media=media)
+
+
+@pytest.fixture
+def queue(bot, workdir, monkeypatch):
+    monkeypatch.setattr(bot, "LAPOR_DIGEST_MINUTES", 0)
+    return bot.LaporQueue(workdir / "data" / "lapor_queue.json")
+
+
+def _plain(html: str) -> str:
+    return re.sub(r"<[^>]+>", "", html).replace("&lt;", "<").replace("&gt;", ">").replace("&amp;", "&")
+
+
+def test_short_report_is_one_message(bot, queue):
+    client = FakeClient()
+    assert asyncio.run(queue.submit(client, _message(1), text="halo <admin> & semua")) is True
+    assert len(client.sent) == 1
+    assert "halo &lt;admin&gt; &amp; semua" in client.sent[0]
+    assert "Budi &lt;b&gt;" in client.sent[0]
+    assert queue.items == []
+
+
+def test_long_report_is_split_without_breaking_entities(bot, queue):
+    body = "\n".join(f"baris {i} <&> " + "x" * 80 for i in range(200))
+    client = FakeClient()
+    assert asyncio.run(queue.submit(client, _message(2), text=body)) is True
+    assert len(client.sent) > 1
+    assert all(len(t) <= bot.LAPOR_TEXT_LIMIT for t in client.sent)
+    assert all(not re.search(r"&[a-z]*$", t) for t in client.sent)   # entity tidak terpotong
+    joined = _plain(client.sent[0].split("Pesan:\n", 1)[1] + "".join(client.sent[1:]))
+    assert joined == body
+
+
+def test_failed_part_resumes_without_duplicates(bot, queue):
+    body = "\n".join(f"{i:03d} " + "y" * 96 for i in range(120))
+    client = FakeClient(fail_at=1)
+    assert asyncio.run(queue.submit(client, _message(3), text=body)) is False
+    assert len(client.sent) == 1
+    assert queue.items[0]["sent_parts"] == 1
+
+    # antrian dibaca ulang dari disk (restart) lalu di-flush
+    again = bot.LaporQueue(queue.path)
+    assert asyncio.run(again._deliver(client, again.items[0])) is None
+    assert len(client.sent) == len(again._parts(client, again.items[0]))
+    assert len(set(client.sent)) == len(client.sent)
+
+
+def test_media_caption_fits_in_one_copy(bot, queue):
+    client = FakeClient()
+    asyncio.run(queue.submit(client, _message(4, caption="foto", media=True)))
+    assert len(client.sent) == 1 and client.sent[0][0] == "copy"
+    assert "foto" in client.sent[0][2]
+
+
+def test_digest_coalesces_text_reports(bot, queue, monkeypatch):
+    monkeypatch.setattr(bot, "LAPOR_DIGEST_MINUTES", 5)
+    client = FakeClient()
+    for i in range(5):
+        assert asyncio.run(queue.submit(client, _message(10 + i), text=f"laporan {i}")) is False
+    assert client.sent == []
+    assert asyncio.run(queue.flush(client)) == 5
+    assert len(client.sent) == 1
+    assert all(f"laporan {i}" in client.sent[0] for i in range(5))
+    assert queue.items == []
+
+
+def test_chunk_plain_respects_escaped_length(bot):
+    chunks = bot._chunk_plain("<" * 50, 20)
+    assert "".join(chunks) == "<" * 50
+    assert all(len(bot.html_escape(c)) <= 20 for c in chunks)
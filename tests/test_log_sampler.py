@@ -0,0 +1,81 @@
+"""LogSampler: every:N, rate:N per detik, dan ringkasan log yang ditahan."""
+import logging
+
+import pytest
+
+
+@pytest.fixture
+def clock(bot, monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def summaries(bot, monkeypatch):
+    out = []
+    monkeypatch.setattr(bot.logger, "log", lambda level, msg, *a, **kw: out.append((level, msg)))
+    return out
+
+
+def _record(event: str, level=logging.INFO):
+    rec = logging.LogRecord("test", level, __file__, 1, f"{event} terjadi", None, None)
+    rec.event = event
+    return rec
+
+
+def test_every_n_passes_one_in_n(bot):
+    s = bot.LogSampler("tick=every:3")
+    passed = [s.filter(_record("tick")) for _ in range(7)]
+    assert passed == [True, False, False, True, False, False, True]
+    assert s.suppressed["tick"] == 4
+
+
+def test_events_without_rule_always_pass(bot):
+    s = bot.LogSampler("tick=every:3")
+    assert all(s.filter(_record("lain")) for _ in range(5))
+    assert s.filter(logging.LogRecord("test", logging.INFO, __file__, 1, "biasa", None, None))
+
+
+def test_rate_limit_and_summary_on_flush(bot, clock, summaries):
+    s = bot.LogSampler("click=rate:2")
+    passed = [s.filter(_record("click", logging.WARNING)) for _ in range(5)]
+    assert passed == [True, True, False, False, False]
+
+    s.flush()                  # detik yang sama: belum diringkas
+    assert summaries == []
+    clock[0] += 1
+    s.flush()                  # spike berhenti → ringkasan tetap keluar tanpa record baru
+    assert len(summaries) == 1
+    level, msg = summaries[0]
+    assert level == logging.WARNING
+    assert "3 log 'click'" in msg
+    s.flush()
+    assert len(summaries) == 1  # tidak dilaporkan dua kali
+
+
+def test_new_second_reopens_window(bot, clock, summaries):
+    s = bot.LogSampler("click=rate:1")
+    assert s.filter(_record("click"))
+    assert not s.filter(_record("click"))
+    clock[0] += 1
+    assert s.filter(_record("click"))   # ringkasan detik sebelumnya ditulis lebih dulu
+    assert len(summaries) == 1 and "1 log 'click'" in summaries[0][1]
+
+
+def test_describe_forces_flush(bot, clock, summaries):
+    s = bot.LogSampler("start=rate:1")
+    s.filter(_record("start"))
+    s.filter(_record("start"))
+    lines = s.describe()
+    assert lines == ["start=rate:1 (lihat 2, ditahan 1)"]
+    assert len(summaries) == 1
+
+
+def test_invalid_rules_rejected(bot):
+    s = bot.LogSampler("a=every:0,b=burst:3,c=rate:4")
+    assert s.rules == {"c": ("rate", 4)}
+    with pytest.raises(ValueError):
+        s.set_rule("d", "every:x")
+    s.set_rule("c", "off")
+    assert s.rules == {}
@@ -0,0 +1,85 @@
+"""ModAuditStore: query per target / username / chat, prune, dan impor log teks lama."""
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+
+def _user(uid, username=None):
+    return SimpleNamespace(id=uid, username=username)
+
+
+MOD = _user(1, "Admin")
+
+
+@pytest.fixture
+def store(bot, workdir):
+    return bot.ModAuditStore(workdir / "data" / "mod_audit.db")
+
+
+def test_for_target_by_id_newest_first(store):
+    store.record("warn", -100, MOD, _user(5, "Budi"), "spam")
+    store.record("mute", -100, MOD, _user(5, "Budi"), None, "10m")
+    store.record("warn", -100, MOD, _user(6, "Ani"), "link")
+    rows = store.for_target(5)
+    assert [r["action"] for r in rows] == ["mute", "warn"]
+    assert rows[0]["extra"] == "10m" and rows[0]["reason"] is None
+    assert rows[1]["actor_id"] == 1 and rows[1]["actor_name"] == "admin"
+
+
+def test_for_target_by_username_is_case_insensitive(store):
+    store.record("ban", -100, MOD, _user(5, "Budi"))
+    assert [r["target_id"] for r in store.for_target(username="@BUDI")] == [5]
+    assert store.for_target(username="ani") == []
+
+
+def test_users_without_username_are_not_grouped_as_unknown(store):
+    store.record("warn", -100, MOD, _user(7))
+    store.record("warn", -100, MOD, _user(8, ""))
+    assert store.for_target(username="unknown") == []
+    assert store.for_target(7)[0]["target_name"] is None
+
+
+def test_chat_filter_and_limit(store):
+    for i in range(5):
+        store.record("warn", -100, MOD, _user(5, "budi"), f"r{i}")
+    store.record("warn", -200, MOD, _user(5, "budi"), "lain")
+    assert len(store.for_target(5, chat_id=-200)) == 1
+    assert [r["reason"] for r in store.for_chat(-100, limit=2)] == ["r4", "r3"]
+
+
+def test_concurrent_records_are_all_kept(store):
+    def run(i):
+        for j in range(50):
+            store.record("warn", -100, MOD, _user(i), f"{i}-{j}")
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(store.for_chat(-100, limit=1000)) == 200
+
+
+def test_prune_by_retention(bot, store, monkeypatch):
+    store.record("warn", -100, MOD, _user(5), "lama")
+    now = bot.time.time()
+    monkeypatch.setattr(bot.time, "time", lambda: now + 10 * 86400)
+    store.record("warn", -100, MOD, _user(5), "baru")
+    assert store.prune(retention_days=7) == 1
+    assert [r["reason"] for r in store.for_target(5)] == ["baru"]
+
+
+def test_imports_text_log_once(bot, workdir):
+    bot.MOD_LOG.write_text(
+        "[2026-01-01 10:00:00] warn by 1(@admin) → 5(@budi) | reason: spam\n"
+        "[2026-01-01 11:00:00] mute by 1(@admin) → 9(@unknown) | 10m\n"
+        "baris rusak\n",
+        encoding="utf-8",
+    )
+    path = workdir / "data" / "mod_audit.db"
+    store = bot.ModAuditStore(path)
+    assert [r["reason"] for r in store.for_target(5)] == ["spam"]
+    assert store.for_target(9)[0]["target_name"] is None
+    assert store.for_target(9)[0]["chat_id"] is None
+    assert len(bot.ModAuditStore(path).for_target(5)) == 1   # tidak diimpor ulang
@@ -0,0 +1,44 @@
+"""PollStore: migrasi votes.json lama, satu vote per user per hari, dan retensi."""
+import json
+from datetime import date, timedelta
+
+
+def _day(bot, days_ago: int = 0) -> str:
+    # tanggal Jakarta, sama seperti _today_key() yang dipakai store
+    return (date.fromisoformat(bot._today_key()) - timedelta(days=days_ago)).isoformat()
+
+
+def test_migrates_legacy_votes(bot, workdir):
+    path = workdir / "votes.json"
+    path.write_text(json.dumps({
+        "1": {"date": _day(bot), "choice": "🇮🇩 Lokal"},        # label lama → id
+        "2": {"date": _day(bot), "choice": "bule"},
+        "3": {"date": _day(bot, 1), "choice": "🇮🇩 Lokal"},
+        "4": {"rusak": True},
+    }), encoding="utf-8")
+    store = bot.PollStore(path)
+    assert dict((o["id"], n) for o, n in store.results()) == {"lokal": 1, "chindo": 0, "bule": 1}
+    assert store.has_voted(3, _day(bot, 1)) and not store.has_voted(3)
+
+    saved = json.loads(path.read_text(encoding="utf-8"))
+    assert saved["version"] == 2
+    assert saved["days"][_day(bot)]["voters"] == [1, 2]
+    # format baru dibaca apa adanya
+    assert dict((o["id"], n) for o, n in bot.PollStore(path).results()) == {"lokal": 1, "chindo": 0, "bule": 1}
+
+
+def test_one_vote_per_user_per_day(bot, workdir):
+    store = bot.PollStore(workdir / "votes.json")
+    assert store.vote(9, "chindo") is True
+    assert store.vote(9, "lokal") is False
+    assert store.vote(9, "lokal", day=_day(bot, 1)) is True
+    assert dict((o["id"], n) for o, n in store.results()) == {"lokal": 0, "chindo": 1, "bule": 0}
+
+
+def test_old_days_are_pruned(bot, workdir):
+    store = bot.PollStore(workdir / "votes.json")
+    store.vote(1, "lokal", day=_day(bot, bot.POLL_RETENTION_DAYS + 5))
+    assert _day(bot, bot.POLL_RETENTION_DAYS + 5) in store.days
+    store.vote(1, "lokal", day=_day(bot, 1))   # hari baru pertama kali dipakai → retensi dijalankan
+    assert sorted(store.days) == [_day(bot, 1)]
+    assert sorted(json.loads(store.path.read_text(encoding="utf-8"))["days"]) == [_day(bot, 1)]
@@ -0,0 +1,103 @@
+"""SqliteStateStore: beberapa koneksi (≈ beberapa proses bot) pada file yang sama."""
+import asyncio
+import threading
+
+import pytest
+
+
+def _hammer(n_threads: int, fn):
+    start = threading.Barrier(n_threads)
+    errors = []
+
+    def run(i):
+        try:
+            start.wait()
+            fn(i)
+        except Exception as e:   # pragma: no cover - dilaporkan lewat assert di bawah
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert not errors
+
+
+@pytest.fixture
+def stores(bot, workdir):
+    # satu store per "proses": koneksi SQLite terpisah, kunci antar koneksi diuji sungguhan
+    path = workdir / "data" / "state.db"
+    return [bot.SqliteStateStore(path) for _ in range(4)]
+
+
+def test_quota_never_exceeds_limit_across_connections(stores):
+    granted = []
+    lock = threading.Lock()
+
+    def consume(i):
+        for _ in range(20):
+            ok, _ = stores[i % len(stores)].quota_consume("2026-01-01", 42, limit=25)
+            if ok:
+                with lock:
+                    granted.append(1)
+
+    _hammer(8, consume)
+    assert len(granted) == 25
+    assert stores[0].quota_used("2026-01-01", 42) == 25
+
+
+def test_quota_resets_on_new_day(stores):
+    s = stores[0]
+    assert s.quota_consume("2026-01-01", 1, limit=1) == (True, 1)
+    assert s.quota_consume("2026-01-01", 1, limit=1) == (False, 1)
+    assert s.quota_consume("2026-01-02", 1, limit=1) == (True, 1)
+    assert s.quota_used("2026-01-01", 1) == 0   # hari lama dibuang
+
+
+def test_update_user_is_atomic_across_connections(stores):
+    def bump(user):
+        user["xp"] = user.get("xp", 0) + 1
+
+    def run(i):
+        for _ in range(25):
+            stores[i % len(stores)].update_user(7, bump, {"xp": 0})
+
+    _hammer(8, run)
+    assert stores[1].get_user(7)["xp"] == 200
+
+
+def test_warns_count_and_clear(stores):
+    a, b = stores[0], stores[1]
+    assert a.warn_add(-100, 5, {"reason": "spam"}) == 1
+    assert b.warn_add(-100, 5, {"reason": "link"}) == 2
+    assert a.warn_count(-100, 5) == 2
+    assert a.warn_count(-100, 6) == 0
+    b.warn_clear(-100, 5)
+    assert a.warn_count(-100, 5) == 0
+
+
+def test_imports_json_state_once(bot, workdir):
+    bot.JsonStateStore().replace_users({"9": {"xp": 30, "username": "lama"}})
+    path = workdir / "data" / "state.db"
+    s = bot.SqliteStateStore(path)
+    assert s.get_user(9)["xp"] == 30
+    s.update_user(9, lambda u: u.update(xp=31), {})
+    # koneksi baru tidak mengimpor ulang JSON di atas data yang sudah berubah
+    assert bot.SqliteStateStore(path).get_user(9)["xp"] == 31
+
+
+def test_state_call_keeps_handler_trace(bot):
+    @bot.timed_persist("user_data")
+    def slow_write():
+        bot.time.sleep(0.05)
+        return "ok"
+
+    async def main():
+        tr = bot.HandlerTrace("test", object())
+        bot._current_trace.set(tr)
+        assert await bot.state_call(slow_write) == "ok"
+        return tr
+
+    tr = asyncio.run(main())
+    assert tr.io >= 0.04   # waktu disk di thread state tetap masuk io, bukan other/loop
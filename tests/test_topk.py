@@ -0,0 +1,51 @@
+"""TopK dan ActivityCounter: leaderboard /top tetap sama dengan sort penuh."""
+import random
+
+
+def test_topk_matches_full_sort(bot):
+    rng = random.Random(3)
+    counts = {}
+    top = bot.TopK(5)
+    for _ in range(5000):
+        key = f"u{rng.randrange(200)}"
+        counts[key] = counts.get(key, 0) + 1
+        top.offer(key, counts[key])
+    expected = sorted(counts.values(), reverse=True)[:5]
+    assert [n for _, n in top.ranked()] == expected
+    assert all(counts[k] == n for k, n in top.ranked())
+
+
+def test_topk_keeps_first_k_and_replaces_minimum(bot):
+    top = bot.TopK(2)
+    top.offer("a", 1)
+    top.offer("b", 2)
+    top.offer("c", 1)          # tidak lebih besar dari minimum → diabaikan
+    assert dict(top.ranked()) == {"b": 2, "a": 1}
+    top.offer("c", 3)
+    assert top.ranked() == [("c", 3), ("b", 2)]
+    top.offer("b", 5)          # update entri yang sudah ada
+    assert top.ranked() == [("b", 5), ("c", 3)]
+
+
+def test_activity_leaderboard_periods_and_reload(bot, workdir):
+    act = bot.ActivityCounter(workdir / "data" / "activity.json", workdir / "data" / "periods.json", k=2)
+    for uid, n in ((1, 3), (2, 5), (3, 1)):
+        for _ in range(n):
+            act.increment(uid, f"user{uid}")
+    act.increment(3, "baru")   # username ikut diperbarui
+    assert act.leaderboard() == [("2", "user2", 5), ("1", "user1", 3)]
+    assert [n for _, _, n in act.leaderboard("daily")] == [5, 3]
+    act.flush()
+
+    again = bot.ActivityCounter(act.path, act.periods_path, k=2)
+    assert again.leaderboard() == act.leaderboard()
+    assert again.leaderboard("weekly") == act.leaderboard("weekly")
+    assert again.counts["3"] == {"username": "baru", "count": 2}
+
+
+def test_stale_period_starts_empty(bot, workdir):
+    act = bot.ActivityCounter(workdir / "data" / "activity.json", workdir / "data" / "periods.json", k=3)
+    act.increment(1, "a")
+    act.periods["daily"]["key"] = "2000-01-01"   # data kemarin
+    act.flush()
+    assert bot.ActivityCounter(act.path, act.periods_path, k=3).leaderboard("daily") == []
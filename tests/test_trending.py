@@ -0,0 +1,80 @@
+"""TrendingEngine: peluruhan eksponensial, top-K, persistensi, dan ganti half-life."""
+import math
+
+import pytest
+
+
+@pytest.fixture
+def clock(bot, monkeypatch):
+    now = [1_700_000_000.0]
+    monkeypatch.setattr(bot.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def engine(bot, workdir, clock):
+    e = bot.TrendingEngine(workdir / "data" / "trending.json", half_life_hours=6, k=5)
+    e.warmup()
+    return e
+
+
+def test_score_halves_every_half_life(engine, clock):
+    engine.record("a", clock[0])
+    clock[0] += 6 * 3600
+    (code, score), = engine.ranked()
+    assert code == "a" and score == pytest.approx(0.5)
+
+
+def test_recent_clicks_outrank_older_bursts(engine, clock):
+    for _ in range(4):
+        engine.record("lama", clock[0] - 12 * 3600)   # 4 klik, dua half-life lalu → setara 1
+    for _ in range(2):
+        engine.record("baru", clock[0])
+    ranked = dict(engine.ranked())
+    assert list(ranked) == ["baru", "lama"]
+    assert ranked["lama"] == pytest.approx(1.0) and ranked["baru"] == pytest.approx(2.0)
+
+
+def test_faded_and_removed_codes_are_skipped(bot, engine, clock):
+    engine.record("x", clock[0])
+    engine.record("y", clock[0])
+    assert [c for c, _ in engine.ranked(valid={"y"})] == ["y"]
+    clock[0] += 6 * 3600 * math.log2(1 / bot.TRENDING_MIN_SCORE) + 60
+    assert engine.ranked() == []
+    assert engine.pick({"x", "y"}) is None
+
+
+def test_topk_tracks_highest_scores(engine, clock):
+    for i in range(20):
+        for _ in range(i + 1):
+            engine.record(f"k{i}", clock[0])
+    assert [c for c, _ in engine.ranked()] == [f"k{i}" for i in range(19, 14, -1)]
+
+
+def test_flush_and_reload_keep_scores(bot, engine, clock):
+    engine.record("a", clock[0])
+    engine.flush()
+    clock[0] += 3600
+    again = bot.TrendingEngine(engine.path, half_life_hours=6, k=5)
+    assert again.ranked() == engine.ranked()
+
+
+def test_changed_half_life_keeps_current_score(bot, engine, clock):
+    engine.record("a", clock[0] - 3600)
+    engine.flush()
+    before = dict(engine.ranked())["a"]
+    again = bot.TrendingEngine(engine.path, half_life_hours=1, k=5)
+    assert dict(again.ranked())["a"] == pytest.approx(before)
+    clock[0] += 3600
+    assert dict(again.ranked())["a"] == pytest.approx(before / 2)   # lalu meluruh dengan laju baru
+
+
+def test_prune_keeps_strongest_codes(bot, workdir, clock):
+    e = bot.TrendingEngine(workdir / "data" / "trending.json", k=3, max_codes=10)
+    e.warmup()
+    for i in range(11):
+        for _ in range(11 - i):   # k0 paling ramai
+            e.record(f"k{i}", clock[0])
+    # kode ke-11 melewati max_codes → separuh terlemah dibuang
+    assert set(e.scores) == {f"k{i}" for i in range(5)}
+    assert [c for c, _ in e.ranked()] == ["k0", "k1", "k2"]
@@ -0,0 +1,119 @@
+"""TTLCache: TTL/LRU dan single-flight get_or_load (termasuk error & cancel)."""
+import asyncio
+import itertools
+
+import pytest
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def cache(bot):
+    return bot.TTLCache(f"test_{next(_names)}", maxsize=3, ttl=60)
+
+
+def test_lru_eviction_and_ttl(bot, cache, monkeypatch):
+    for k in "abc":
+        cache.set(k, k.upper())
+    assert cache.get("a") == "A"   # a jadi paling baru
+    cache.set("d", "D")
+    assert cache.get("b") is None
+    assert cache.stats["evictions"] == 1
+
+    now = bot.time.monotonic()
+    monkeypatch.setattr(bot.time, "monotonic", lambda: now + 61)
+    assert cache.get("a") is None
+    assert cache.stats["expired"] == 1
+
+
+def test_single_flight_calls_loader_once(cache):
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(20)))
+
+    assert asyncio.run(main()) == [1] * 20
+    assert calls == 1
+    assert cache.stats["loads"] == 1
+    assert cache.get("k") == 1
+
+
+def test_loader_error_reaches_all_waiters_and_is_not_cached(cache):
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        raise RuntimeError("gagal")
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("k", loader) for _ in range(5)),
+                                    return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert calls == 1
+    assert cache.get("k") is None
+    assert not cache._inflight
+
+
+def test_cancelled_owner_does_not_cancel_waiters(cache):
+    calls = 0
+
+    async def loader():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return calls
+
+    async def main():
+        owner = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(cache.get_or_load("k", loader)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        owner.cancel()
+        return await asyncio.gather(owner, *waiters, return_exceptions=True)
+
+    owner, *waiters = asyncio.run(main())
+    assert isinstance(owner, asyncio.CancelledError)
+    assert waiters == [2, 2, 2]   # satu waiter mengambil alih load, sisanya ikut hasilnya
+    assert calls == 2
+
+
+def test_cancelled_waiter_does_not_cancel_loader(cache):
+    async def loader():
+        await asyncio.sleep(0.05)
+        return "ok"
+
+    async def main():
+        owner = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0.01)
+        waiter = asyncio.create_task(cache.get_or_load("k", loader))
+        await asyncio.sleep(0.01)
+        waiter.cancel()
+        return await asyncio.gather(owner, waiter, return_exceptions=True)
+
+    owner, waiter = asyncio.run(main())
+    assert owner == "ok"
+    assert isinstance(waiter, asyncio.CancelledError)
+    assert cache.get("k") == "ok"
+
+
+def test_cache_if_shares_but_does_not_store(cache):
+    async def loader():
+        await asyncio.sleep(0.01)
+        return None
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_load("k", loader, cache_if=lambda v: v is not None)
+                                      for _ in range(3)))
+
+    assert asyncio.run(main()) == [None] * 3
+    assert "k" not in cache._data